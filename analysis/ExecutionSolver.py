@@ -38,6 +38,22 @@ class ExecutionSolver:
     raise NotImplementedError("must be implemented in subclass");
   #end: encodeObsYes
   
+  """
+  encodeObsYesBatch(): Encode the constraints for many yes-executed
+  observations at once.  By default, this simply encodes each observation in
+  turn; solvers that benefit from a particular order (or from seeing all
+  observations up front) should override this.
+  @param obsYes a collection of yes-executed observations, each in the format
+                expected by encodeObsYes()
+            => {[{G.nodes}]}
+  """
+  def encodeObsYesBatch(self, obsYes):
+    for (i, possibleYes) in enumerate(obsYes):
+      print(str(i+1) + "/" + str(len(obsYes)));
+      self.encodeObsYes(possibleYes);
+    #end for
+  #end: encodeObsYesBatch
+  
   """
   encodeObsNo(): Encode the constraint for a not-executed observation.
   @param possibleYes a set of possible matches to the true entry
@@ -48,14 +64,52 @@ class ExecutionSolver:
     raise NotImplementedError("must be implemented in subclass");
   #end: encodeObsNo
   
+  """
+  encodeObsNoBatch(): Encode the constraints for many not-executed observations
+  at once.  By default, this simply encodes each observation in turn; solvers
+  that can do better (e.g., with a single pass over their constraints) should
+  override this.
+  @param obsNo a collection of not-executed observations, each in the format
+               expected by encodeObsNo()
+            => [{G.nodes}]
+  """
+  def encodeObsNoBatch(self, obsNo):
+    for possibleNo in obsNo:
+      self.encodeObsNo(possibleNo);
+    #end for
+  #end: encodeObsNoBatch
+  
+  """
+  encodeFailureReport(): Encode all constraints from a failure report: the
+  crash, then all obsNo observations, then all obsYes observations.  Solvers
+  that can reuse earlier work for the same report may override this.
+  @param crashStack see encodeCrash()
+  @param obsYes a collection of observations, as for encodeObsYesBatch()
+  @param obsNo a collection of observations, as for encodeObsNoBatch()
+  """
+  def encodeFailureReport(self, crashStack, obsYes, obsNo):
+    print("Adding crash constraint...");
+    self.encodeCrash(crashStack);
+    print("Adding obsNo constraints...");
+    self.encodeObsNoBatch(obsNo);
+    print("Adding obsYes constraints...");
+    self.encodeObsYesBatch(obsYes);
+  #end: encodeFailureReport
+  
   """
   findKnownExecution(): Figure out which nodes in the CFG (a) are known to have
   executed at least once, (b) are known to have not executed, and (c) may or may
   not have executed given the crash location.
+  @param queryNodes the nodes to classify (by default, all of them); other
+                    nodes are left out of the result
+                    => {G.nodes}
+  @param monitor a ProbeMonitor told about each node as it is classified
+                 (or None); if it stops probing early, or interrupts a probe,
+                 the nodes not probed are left out of the result
   @return (defYes, defNo, maybe)
              => ({G.nodes}, {G.nodes}, {G.nodes})
   """
-  def findKnownExecution(self):
+  def findKnownExecution(self, queryNodes=None, monitor=None):
     raise NotImplementedError("must be implemented in subclass");
   #end: findKnownExecution
 #end: class ExecutionSolver
@@ -0,0 +1,382 @@
+#!/s/python-2.7.1/bin/python
+
+from socket import socket, AF_UNIX, SOCK_STREAM, error as SocketError
+from hashlib import sha1
+from subprocess import Popen, PIPE
+from sys import stderr, stdout
+
+import os
+import struct
+import time
+
+from ExecutionSolver import ExecutionSolver
+from ProbeMonitor import ProbeMonitor
+from PexpectSvpaExecutionSolver import EXPECTED_PROMPT, getSvpaCfgEdges
+
+# text command switching the server to the framed protocol (and its
+# acknowledgement); see SVPAServer.serveFramed() for the protocol itself
+FRAMED_COMMAND = "framed";
+
+OP_CFG = 1;
+OP_STACK = 2;
+OP_OBSYES = 3;
+OP_OBSNO = 4;
+OP_EMPTY = 5;
+OP_PROBE = 6;
+OP_WITNESS = 7;
+OP_CFG_CACHED = 8;
+STATUS_OK = 0;
+STATUS_ERROR = 1;
+
+# no node (e.g., the "to" of the entry edge)
+NO_NODE = -1;
+
+# the number of nodes to probe per request
+PROBE_CHUNK_SIZE = 256;
+
+class FramedSvpaExecutionSolver(ExecutionSolver):
+  __slots__ = "__process", "__socket", "__input", "__output", \
+              "__nodeIds", "__nodeNames", "__graphNodes";
+
+  """
+  __readExactly(): Read exactly the requested number of bytes from the server.
+  @param size the number of bytes
+  @param errorMessage the message to print if the server's output ends early
+  @return the bytes read
+  """
+  def __readExactly(self, size, errorMessage):
+    data = self.__input.read(size);
+    if(len(data) != size):
+      print >> stderr, ("ERROR: EOF reached while reading SVPA output: " + \
+                        errorMessage);
+      exit(1);
+    #end if
+    return(data);
+  #end: __readExactly
+
+  """
+  __request(): Send one framed request to the server, and read its response.
+  @param opcode the request's opcode
+  @param payload the request's payload
+  @param errorMessage the message to print if the request fails
+  @return the response payload
+  """
+  def __request(self, opcode, payload, errorMessage):
+    self.__output.write(struct.pack(">iB", len(payload) + 1, opcode));
+    self.__output.write(payload);
+    self.__output.flush();
+
+    (length,) = struct.unpack(">i", self.__readExactly(4, errorMessage));
+    response = self.__readExactly(length, errorMessage);
+    if(ord(response[0]) != STATUS_OK):
+      (messageLength,) = struct.unpack(">H", response[1:3]);
+      print >> stderr, ("ERROR: SVPA server failed: " + errorMessage + ": " + \
+                        response[3:3+messageLength]);
+      exit(1);
+    #end if
+    return(response[1:]);
+  #end: __request
+
+  """
+  __connect(): Start up a process for the Java SVPA server (talking through
+               plain pipes), or, if the SVPA_SERVER_SOCKET environment variable
+               is set, connect to an already-running server daemon there.
+               Then, switch the session to the framed protocol.
+  """
+  def __connect(self):
+    self.__process = None;
+    self.__socket = None;
+    socketPath = os.environ.get("SVPA_SERVER_SOCKET", None);
+    if(socketPath):
+      self.__socket = socket(AF_UNIX, SOCK_STREAM);
+      try:
+        self.__socket.connect(socketPath);
+      except SocketError as e:
+        print >> stderr, ("ERROR: could not connect to SVPA server at " + \
+                          socketPath + ": " + str(e));
+        exit(1);
+      #end try
+      self.__input = self.__socket.makefile("rb");
+      self.__output = self.__socket.makefile("wb");
+    else:
+      # maxMemory is in MegaBytes.
+      # We need to set this here (if used in experiments), because OS-level
+      # rlimit settings mess up the JVM memory allocator
+      try:
+        maxMemory = int(os.environ.get("MAX_MEMORY", 32768));
+        maxMemory = max(maxMemory, 1024);
+      except:
+        maxMemory = 32768;
+
+      self.__process = Popen(["java", \
+                              "-Xmx" + str(int(maxMemory * 0.65625)) + "m", \
+                              "-jar", \
+                              "../SVPAServer/SVPAServer.jar"], \
+                             stdin=PIPE, stdout=PIPE);
+      self.__input = self.__process.stdout;
+      self.__output = self.__process.stdin;
+    #end if
+
+    self.__readExactly(len(EXPECTED_PROMPT), "server could not be started");
+    self.__output.write(FRAMED_COMMAND + "\n");
+    self.__output.flush();
+    acknowledgement = self.__readExactly(len(FRAMED_COMMAND) + 1,
+                                         "server could not switch protocols");
+    if(acknowledgement.strip() != FRAMED_COMMAND):
+      print >> stderr, ("ERROR: unexpected response switching SVPA server " + \
+                        "protocols: " + acknowledgement);
+      exit(1);
+    #end if
+  #end: __connect
+
+  """
+  __getNodeId(): Get the integer id for a node name (including the special
+                 entry and return site names), adding it if it is new.
+  @param name the node name (or None)
+  @return the node's id (or NO_NODE for None)
+  """
+  def __getNodeId(self, name):
+    if(name == None):
+      return(NO_NODE);
+    elif(name not in self.__nodeIds):
+      self.__nodeIds[name] = len(self.__nodeNames);
+      self.__nodeNames.append(name);
+    #end if
+    return(self.__nodeIds[name]);
+  #end: __getNodeId
+
+  """
+  @override
+  __init__(): Start up (or connect to) the Java SVPA server.  Then, process
+              the graph, encoding its structure as a (binary) CFG request.
+  @param G the graph
+  """
+  def __init__(self, G):
+    self.__nodeIds = {};
+    self.__nodeNames = [];
+    self.__connect();
+
+    (cfgEdges, self.__graphNodes) = getSvpaCfgEdges(G);
+    payload = [struct.pack(">i", len(cfgEdges))];
+    for (edgeType, source, target, onStack) in cfgEdges:
+      payload.append(struct.pack(">ciii", edgeType,
+                                 self.__getNodeId(source),
+                                 self.__getNodeId(target),
+                                 self.__getNodeId(onStack)));
+    #end for
+    payload = "".join(payload);
+
+    # a server with an SVPA_CACHE_DIR may already have built this CFG;
+    # otherwise, it builds it from the payload (and caches it for next time)
+    fingerprint = sha1(payload).hexdigest();
+    response = self.__request(OP_CFG_CACHED,
+                              struct.pack(">H", len(fingerprint)) + fingerprint,
+                              "cached CFG query failed");
+    if(ord(response[0]) == 0):
+      self.__request(OP_CFG, payload, "failure on generated CFG input");
+    #end if
+
+    # assert that the encoded CFG has legal executions
+    assert(self.isSat());
+  #end: __init__
+
+  """
+  __del__(): We do explicit clean-up of the connection to the Java-based SVPA
+             server: closing it ends our session (and, for a server process
+             of our own, the server).
+  """
+  def __del__(self):
+    if(self.__socket != None):
+      self.__socket.close();
+    elif(self.__process != None):
+      self.__output.close();
+      self.__process.wait();
+    #end if
+  #end: __del__
+
+  """
+  @override
+  isSat(): Check if the language recognized by the SVPA is empty.
+  @return whether or not the language accepted by the SVPA is empty
+  """
+  def isSat(self):
+    response = self.__request(OP_EMPTY, "", "emptiness query failed");
+    return(ord(response[0]) == 0);
+  #end: isSat
+
+  """
+  @override
+  encodeObsYes(): Encode the constraint for a yes-executed observation.
+  @param possibleYes a sequence of sets of possible matches to the true entry
+                    (usually a singleton)
+            => [{G.nodes}]
+  """
+  def encodeObsYes(self, possibleYes):
+    payload = [struct.pack(">i", len(possibleYes))];
+    for group in possibleYes:
+      # verify that all nodes are in the graph
+      for n in group:
+        if(n not in self.__graphNodes):
+          print >> stderr, ("ERROR: invalid YES observation node: " + str(n));
+          exit(1);
+        #end if
+      #end for
+
+      payload.append(struct.pack(">i", len(group)));
+      for n in group:
+        payload.append(struct.pack(">i", self.__getNodeId(n)));
+      #end for
+    #end for
+
+    self.__request(OP_OBSYES, "".join(payload), "error encoding obsYes entry");
+  #end: encodeObsYes
+
+  """
+  @override
+  encodeCrash(): Encode the constraint for the crashing location.
+  @param crashStack a representation of possible crashes in the stack trace,
+                    ending in the final possible crashing nodes
+            => [({G.nodes}, {G.nodes}), ..., ({G.nodes}, None)]
+  """
+  def encodeCrash(self, crashStack):
+    payload = [struct.pack(">i", len(crashStack))];
+    for (callNodes, entryNodes) in crashStack:
+      if(len(callNodes) != 1 or \
+         (entryNodes != None and len(entryNodes) != 1)):
+        print >> stderr, ("ERROR: SVPA solver can currently only handle " + \
+                          "unambiguous crash data");
+        exit(1);
+      #end if
+      entryNode = list(entryNodes)[0] if entryNodes != None else None;
+      payload.append(struct.pack(">ii", self.__getNodeId(list(callNodes)[0]),
+                                        self.__getNodeId(entryNode)));
+    #end for
+
+    self.__request(OP_STACK, "".join(payload),
+                   "error encoding crash stack data");
+
+    # assert that the encoded CFG still has legal executions (i.e. the crash
+    # is reachable)
+    assert(self.isSat());
+  #end: encodeCrash
+
+  """
+  @override
+  encodeObsNo(): Encode the constraint for a not-executed observation.
+  @param possibleNo a set of possible matches to the false entry
+                    (NOTE: currently only supports a singleton)
+            => {G.nodes}
+  """
+  def encodeObsNo(self, possibleNo):
+    # we currently only handle singleton "no" observations
+    if(len(possibleNo) != 1):
+      print >> stderr, ("ERROR: SVPA solver can currently only handle " + \
+                        "unambiguous FALSE observations");
+      exit(1);
+    #end if
+    obsNo = list(possibleNo)[0];
+
+    if(obsNo not in self.__graphNodes):
+      print >> stderr, ("ERROR: invalid obsNo entry (not in graph)");
+      exit(1);
+    #end if
+
+    self.__request(OP_OBSNO, struct.pack(">i", self.__getNodeId(obsNo)),
+                   "error encoding obsNo entry");
+  #end: encodeObsNo
+
+  """
+  @override
+  findKnownExecution(): Figure out which nodes in the CFG (a) are known to have
+  executed at least once, (b) are known to have not executed, and (c) may or may
+  not have executed given the crash location.
+  Nodes are probed in chunks; the server answers each chunk with a bitset
+  giving, for each node, whether it may have executed and whether it may not
+  have.
+  @param queryNodes the nodes to classify (by default, all of them); other
+                    nodes are left out of the result
+                    => {G.nodes}
+  @param monitor a ProbeMonitor told about each node as it is classified
+                 (or None)
+  @return (defYes, defNo, maybe)
+             => ({G.nodes}, {G.nodes}, {G.nodes})
+  """
+  def findKnownExecution(self, queryNodes=None, monitor=None):
+    if(monitor == None):
+      monitor = ProbeMonitor();
+    #end if
+    defYes = set([]);
+    defNo = set([]);
+    maybe = set([]);
+
+    nodeList = [n for n in self.__graphNodes \
+                  if queryNodes == None or n in queryNodes];
+
+    total = len(nodeList);
+    soFar = 0;
+    for start in xrange(0, total, PROBE_CHUNK_SIZE):
+      if(monitor.stopped()):
+        break;
+      #end if
+      chunk = nodeList[start:start+PROBE_CHUNK_SIZE];
+      payload = struct.pack(">i", len(chunk)) + \
+                "".join([struct.pack(">i", self.__getNodeId(n)) \
+                         for n in chunk]);
+      chunkStart = time.time();
+      response = self.__request(OP_PROBE, payload, "probe failed");
+      (count,) = struct.unpack(">i", response[0:4]);
+      assert(count == len(chunk));
+      bits = [ord(b) for b in response[4:]];
+      # (a chunk's nodes are probed together, so share its time)
+      chunkTime = (time.time() - chunkStart) / len(chunk);
+
+      for (k, n) in enumerate(chunk):
+        possibleYes = (bits[(2*k) / 8] >> ((2*k) % 8)) & 1;
+        possibleNo = (bits[(2*k+1) / 8] >> ((2*k+1) % 8)) & 1;
+
+        if(not possibleYes and not possibleNo):
+          print >> stderr, ("ERROR: graph node " + n + " neither executed " + \
+                            "nor didn't execute!");
+          exit(1);
+        elif(possibleYes and possibleNo):
+          maybe.add(n);
+        elif(possibleYes):
+          defYes.add(n);
+        else:
+          defNo.add(n);
+
+        monitor.probed(n, possibleYes, possibleNo);
+        monitor.timed(n, chunkTime, {"chunk size" : len(chunk)});
+
+        soFar += 1;
+        if(soFar % 10 == 0):
+          stdout.write("\r" + ("%.2f" % ((1.0*soFar)/(1.0*total)*100)) + \
+                       "%: " + str(soFar) + " / " + str(total));
+          stdout.flush();
+        #end if
+      #end for
+    #end for
+    print("");
+
+    return(defYes, defNo, maybe);
+  #end: findKnownExecution
+
+  """
+  printWitness(): Print an accepted execution from the current SVPA
+  """
+  def printWitness(self):
+    response = self.__request(OP_WITNESS, "", "witness query failed");
+    (length,) = struct.unpack(">i", response[0:4]);
+    witness = [];
+    for token in response[4:4+length].decode("utf-8").split():
+      # node ids come back as numbers, possibly marked as a call/return
+      prefix = "<" if token.startswith("<") else "";
+      suffix = ">" if token.endswith(">") else "";
+      node = token.strip("<>");
+      if(node.isdigit()):
+        node = self.__nodeNames[int(node)];
+      witness.append(prefix + node + suffix);
+    #end for
+    print(" ".join(witness));
+  #end: printWitness
+#end: class FramedSvpaExecutionSolver
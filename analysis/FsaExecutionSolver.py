@@ -2,12 +2,33 @@
 
 from sys import stderr, stdout
 
-from fst import Acceptor
+from fst import Acceptor, read_std
+
+from hashlib import sha1
 
 from ExecutionSolver import ExecutionSolver
-from utils import findEntryForNode, findGraphEntry
+from ProbeMonitor import MEMORY_CHECK_INTERVAL, ProbeMonitor
+from utils import failureReportDigest, findEntryForNode, findGraphEntry
+from csilibs.clock import addStat, countStat
+from csilibs.memory import overMemoryLimit
 from csilibs.graphlibs import is_cfg_node
 
+import os
+import time
+
+# rough per-state and per-arc footprints (in bytes) of an OpenFst VectorFst,
+# used to estimate the memory held by intermediate products
+FSA_STATE_BYTES = 48;
+FSA_ARC_BYTES = 16;
+
+# compaction (determinize + minimize) is considered once the automaton has
+# grown by this factor since it was last compacted, or once its estimated size
+# reaches this fraction of the memory budget
+COMPACT_GROWTH_FACTOR = 4.0;
+COMPACT_BUDGET_FRACTION = 0.5;
+# never bother compacting automata smaller than this
+COMPACT_MIN_STATES = 10000;
+
 """
 fsaIsEmpty(): Check if the language recognized by the FSA is empty.
 @param fsa the Finite-State Automaton
@@ -31,6 +52,120 @@ def fsaIsEmpty(fsa, safeCopy=True):
   return(len(cFsa) == 0);
 #end: fsaIsEmpty
 
+"""
+fsaSize(): Measure the size of the FSA.
+@param fsa the Finite-State Automaton
+@return (number of states, number of arcs)
+"""
+def fsaSize(fsa):
+  return(len(fsa), sum(len(state) for state in fsa.states));
+#end: fsaSize
+
+"""
+getMemoryBudget(): Get the memory budget for intermediate FSA products.  This
+is FSA_MEMORY_BUDGET (in MegaBytes) if set, and otherwise half of MAX_MEMORY
+(the same limit used to size the SVPA solvers' JVMs).
+@return the budget, in bytes
+"""
+def getMemoryBudget():
+  try:
+    maxMemory = int(os.environ.get("MAX_MEMORY", 32768));
+    maxMemory = max(maxMemory, 1024);
+  except:
+    maxMemory = 32768;
+
+  try:
+    budget = int(os.environ.get("FSA_MEMORY_BUDGET", maxMemory / 2));
+    budget = max(budget, 64);
+  except:
+    budget = maxMemory / 2;
+
+  return(budget * 1024 * 1024);
+#end: getMemoryBudget
+
+"""
+getCfgSuccessors(): Number the CFG nodes and find the successors of each, as
+used for the FSA encodings.  Every node gets a dense integer id (starting with
+the entry node at 1); id 0 is the special "pre-entry" node, whose only
+successor is the entry.
+@param G the graph
+@return (node->id dictionary, id->node list, id->[successor ids] list)
+             => ({G.nodes : int}, [G.nodes], [[int]])
+"""
+def getCfgSuccessors(G):
+  # first, create the node dictionary (and its inverse; id 0 is reserved for
+  # the pre-entry node, i.e. epsilon)
+  nodeIds = {};
+  nodeNames = [None];
+  
+  # begin with the entry node
+  (entryNode, isInterprocedural) = findGraphEntry(G);
+  nodeIds[entryNode] = 1;
+  nodeNames.append(entryNode);
+  
+  for (n, attr) in G.nodes(True):
+    # don't export SDG-only nodes
+    if(n == entryNode or not is_cfg_node(G, n)):
+      continue;
+    #end if
+    
+    nodeIds[n] = len(nodeNames);
+    nodeNames.append(n);
+  #end for
+  
+  # then, find all edges in the CFG
+  successors = [[] for nodeId in xrange(len(nodeNames))];
+  successors[0].append(1);
+  for (n, nodeId) in nodeIds.iteritems():
+    if(isInterprocedural and G.node[n].get("kind", "") == "call-site"):
+      foundOne = False;
+      for (source, target, attr) in G.out_edges_iter([n], data=True):
+        if(attr.get("type", "flow") == "control" and \
+           attr.get("scope", "") == "interprocedural"):
+          successors[nodeId].append(nodeIds[target]);
+          foundOne = True;
+        #end if
+      #end for
+      
+      # add appropriate intraprocedural edges: only if
+      # (a) the called function is not in the graphml, or
+      # (b) the target is a crash point (which is essentially ambiguity
+      #     nonsensemeaning that we crashed trying to make the call itself)
+      for (source, target, attr) in G.out_edges_iter([n], data=True):
+        if(attr.get("type", "flow") == "flow" and \
+           attr.get("scope", "") != "interprocedural" and \
+           (not foundOne or G.node[target].get("kind", "") == "crash")):
+          successors[nodeId].append(nodeIds[target]);
+        #end if
+      #end for
+    elif(isInterprocedural and G.node[n].get("kind", "") == "exit"):
+      entryForExit = findEntryForNode(G, n);
+      for (source, target, attr) in G.in_edges_iter([entryForExit], data=True):
+        if(attr.get("type", "flow") == "control" and \
+           attr.get("scope", "") == "interprocedural"):
+          # edge from exit -> all successors of the call to this function
+          for (call, callTarget, attr) in G.out_edges_iter([source], data=True):
+            if(attr.get("type", "flow") == "flow" and \
+               attr.get("scope", "") != "interprocedural" and \
+               G.node[callTarget].get("kind", "") != "crash"):
+              successors[nodeId].append(nodeIds[callTarget]);
+            #end if
+          #end for
+        #end if
+      #end for
+    else:
+      for (source, target, attr) in G.out_edges_iter([n], data=True):
+        if(attr.get("type", "flow") == "flow" and \
+           attr.get("scope", "") != "interprocedural"):
+          successors[nodeId].append(nodeIds[target]);
+        #end if
+      #end for
+    #end if
+  #end for
+  
+  return(nodeIds, nodeNames, successors);
+#end: getCfgSuccessors
+
 """
 getComplementFsm(): Return the FSA that is the complement of the provided FSA.
 The function will not determinize the FSA; you must do that first.
@@ -49,96 +184,173 @@ def getComplementFsm(fsm):
 #end: getComplementFsm
 
 class FsaExecutionSolver(ExecutionSolver):
-  __slots__ = "__solver, __solverVars, __nextCompact";
+  __slots__ = "__solver, __solverVars, __nodeNames, __successors, " + \
+              "__memoryBudget, __compactedStates, __growthFactor, " + \
+              "__graphDigest, __probeStates, __lastMemoryCheck";
   
   """
   @override
   __init__(): Process the graph, encoding its structure as a Finite-State
   Automata (FSA).
+  NOTE: every node gets a dense integer id, which is both its state in the CFG
+        automaton and the label on all arcs into that state.  All automata are
+        built directly on these integer labels (no symbol tables); node names
+        are only looked up again for debugging output.
   @param G the graph
   """
   def __init__(self, G):
     self.__solver = Acceptor();
-    self.__nextCompact = 0;
+    self.__memoryBudget = getMemoryBudget();
+    self.__growthFactor = COMPACT_GROWTH_FACTOR;
+    self.__lastMemoryCheck = 0;
     
-    # first, create the node dictionary
-    self.__solverVars = {};
+    (self.__solverVars, self.__nodeNames, cfgSuccessors) = \
+                                                        getCfgSuccessors(G);
     
-    # begin with the entry node; also create the special "pre-entry" node
-    # (necessary prior to entry because we put labels on edges)
-    (entryNode, isInterprocedural) = findGraphEntry(G);
+    # state 0 is the special "pre-entry" state (necessary prior to entry
+    # because we put labels on edges); initially, all other nodes are legal
+    # stopping points
     self.__solver[0].initial = True;
-    self.__solverVars[entryNode] = 1;
-    self.__solver[1].final = True;
-    self.__solver.add_arc(0, 1, entryNode);
-    
-    i = 2;
-    for (n, attr) in G.nodes(True):
-      # don't export SDG-only nodes
-      if(n == entryNode or not is_cfg_node(G, n)):
-        continue;
-      #end if
-      
-      self.__solverVars[n] = i;
-      
-      # initially, all nodes are legal stopping points
-      self.__solver[i].final = True;
-      
-      i += 1;
+    for nodeId in xrange(1, len(self.__nodeNames)):
+      self.__solver[nodeId].final = True;
+    #end for
+    for (nodeId, targets) in enumerate(cfgSuccessors):
+      for targetId in targets:
+        self.__solver.add_arc(nodeId, targetId, targetId);
+      #end for
     #end for
     
-    # then, encode all edges in the CFG
-    for (n, nodeId) in self.__solverVars.iteritems():
-      if(isInterprocedural and G.node[n].get("kind", "") == "call-site"):
-        foundOne = False;
-        for (source, target, attr) in G.out_edges_iter([n], data=True):
-          if(attr.get("type", "flow") == "control" and \
-             attr.get("scope", "") == "interprocedural"):
-            self.__solver.add_arc(nodeId, self.__solverVars[target], target);
-            foundOne = True;
-          #end if
-        #end for
-        
-        # add appropriate intraprocedural edges: only if
-        # (a) the called function is not in the graphml, or
-        # (b) the target is a crash point (which is essentially ambiguity
-        #     nonsensemeaning that we crashed trying to make the call itself)
-        for (source, target, attr) in G.out_edges_iter([n], data=True):
-          if(attr.get("type", "flow") == "flow" and \
-             attr.get("scope", "") != "interprocedural" and \
-             (not foundOne or G.node[target].get("kind", "") == "crash")):
-            self.__solver.add_arc(nodeId, self.__solverVars[target], target);
-          #end if
-        #end for
-      elif(isInterprocedural and G.node[n].get("kind", "") == "exit"):
-        entryForExit = findEntryForNode(G, n);
-        for (source, target, attr) in G.in_edges_iter([entryForExit], data=True):
-          if(attr.get("type", "flow") == "control" and \
-             attr.get("scope", "") == "interprocedural"):
-            # edge from exit -> all successors of the call to this function
-            for (call, callTarget, attr) in G.out_edges_iter([source], data=True):
-              if(attr.get("type", "flow") == "flow" and \
-                 attr.get("scope", "") != "interprocedural" and \
-                 G.node[callTarget].get("kind", "") != "crash"):
-                self.__solver.add_arc(nodeId, self.__solverVars[callTarget], callTarget);
-              #end if
-            #end for
-          #end if
-        #end for
-      else:
-        for (source, target, attr) in G.out_edges_iter([n], data=True):
-          if(attr.get("type", "flow") == "flow" and \
-             attr.get("scope", "") != "interprocedural"):
-            self.__solver.add_arc(nodeId, self.__solverVars[target], target);
-          #end if
-        #end for
-      #end if
+    # keep the CFG's successor relation (by state id) for estimating how
+    # constraining each observation is; also fingerprint the encoded CFG
+    # (including the node->label assignment) for keying snapshots
+    self.__successors = {};
+    digest = sha1();
+    for state in self.__solver.states:
+      self.__successors[state.stateid] = set([arc.nextstate \
+                                              for arc in state.arcs]);
+      digest.update(str(state.stateid) + ":" + \
+                    ",".join(sorted(map(str, self.__successors[state.stateid]))) + \
+                    "\n");
+    #end for
+    for n in self.__nodeNames[1:]:
+      digest.update(n.encode("utf-8") + "\n");
     #end for
+    self.__graphDigest = digest.hexdigest();
+    self.__compactedStates = len(self.__solver);
     
     # assert that the encoded CFG has legal executions
     assert(self.isSat());
   #end: __init__
   
+  """
+  __regionSize(): Estimate how much of the CFG an execution through any of the
+  provided nodes may cover: the number of states forward-reachable from them
+  plus the number of states backward-reachable to them.
+  @param group a set of possible matches for one observed entry
+            => {G.nodes}
+  @param predecessors the inverse of self.__successors
+  @return the size of the region
+  """
+  def __regionSize(self, group, predecessors):
+    size = 0;
+    for edges in (self.__successors, predecessors):
+      reached = set([]);
+      worklist = [self.__solverVars[n] for n in group \
+                                       if n in self.__solverVars];
+      while(worklist):
+        current = worklist.pop();
+        if(current in reached):
+          continue;
+        reached.add(current);
+        worklist.extend(edges.get(current, ()));
+      #end while
+      size += len(reached);
+    #end for
+    
+    return(size);
+  #end: __regionSize
+  
+  """
+  __orderBySelectivity(): Order obsYes observations so that the most
+  constraining come first.  A vector is estimated to be as constraining as its
+  most constraining entry (i.e., the one with the smallest reachable region in
+  the CFG); ties go to longer vectors.
+  @param obsYes the obsYes observations
+            => {[{G.nodes}]}
+  @return the observations as a sorted list
+  """
+  def __orderBySelectivity(self, obsYes):
+    predecessors = {};
+    for (source, targets) in self.__successors.iteritems():
+      for target in targets:
+        predecessors.setdefault(target, set([])).add(source);
+      #end for
+    #end for
+    
+    groupSizes = {};
+    def selectivityKey(vector):
+      smallest = None;
+      for group in vector:
+        group = frozenset(group);
+        if(group not in groupSizes):
+          groupSizes[group] = self.__regionSize(group, predecessors);
+        #end if
+        if(smallest == None or groupSizes[group] < smallest):
+          smallest = groupSizes[group];
+        #end if
+      #end for
+      return(smallest, -len(vector), sorted(map(sorted, vector)));
+    #end: selectivityKey
+    
+    return(sorted(obsYes, key=selectivityKey));
+  #end: __orderBySelectivity
+  
+  """
+  __compactIfNeeded(): Determinize and minimize the FSA if it has grown enough
+  since it was last compacted, if it is approaching the memory budget, or if
+  it has grown at all and the soft memory limit (see
+  csilibs.memory.setMemoryLimit()) is exceeded (which is only checked every
+  so often).  If compacting barely helps, wait for more growth before trying
+  again.
+  """
+  def __compactIfNeeded(self):
+    states = len(self.__solver);
+    if(states < COMPACT_MIN_STATES):
+      return;
+    #end if
+    
+    # (arcs count towards the budget too, so measure both)
+    (states, arcs) = fsaSize(self.__solver);
+    estimate = states * FSA_STATE_BYTES + arcs * FSA_ARC_BYTES;
+    grown = (states > self.__compactedStates * self.__growthFactor);
+    if(not grown and states > self.__compactedStates and \
+       time.time() - self.__lastMemoryCheck >= MEMORY_CHECK_INTERVAL):
+      self.__lastMemoryCheck = time.time();
+      grown = overMemoryLimit();
+    #end if
+    if(not grown and estimate < self.__memoryBudget * COMPACT_BUDGET_FRACTION):
+      return;
+    #end if
+    
+    self.__solver = self.__solver.determinize();
+    self.__solver.minimize();
+    
+    (newStates, newArcs) = fsaSize(self.__solver);
+    newEstimate = newStates * FSA_STATE_BYTES + newArcs * FSA_ARC_BYTES;
+    if(newEstimate > 0.9 * estimate):
+      self.__growthFactor *= 2;
+    else:
+      self.__growthFactor = COMPACT_GROWTH_FACTOR;
+    #end if
+    self.__compactedStates = newStates;
+    
+    if(newEstimate > self.__memoryBudget):
+      print >> stderr, ("WARNING: FSA (" + str(newStates) + " states, " + \
+                        str(newArcs) + " arcs) exceeds its memory budget " + \
+                        "even after compaction");
+    #end if
+  #end: __compactIfNeeded
+  
   """
   @override
   isSat(): Check if the language recognized by the FSA is empty.
@@ -157,10 +369,12 @@ class FsaExecutionSolver(ExecutionSolver):
   @return the FSA representing the execution constraint
   """
   def getObsYesFsa(self, possibleYes, crash=False):
-    fsm = Acceptor(self.__solver.isyms);
+    fsm = Acceptor();
+    allLabels = xrange(1, len(self.__nodeNames));
     
     # at least one each of the possibleYes executed in order
     totalNodes = 0;
+    groupLabels = set([]);
     for group in possibleYes:
       # verify that all nodes are in the graph
       for n in group:
@@ -169,30 +383,31 @@ class FsaExecutionSolver(ExecutionSolver):
           exit(1);
         #end if
       #end for
+      groupLabels = set([self.__solverVars[n] for n in group]);
       
       # add outgoing edges for this entry=node
-      for n in self.__solverVars:
-        if(n in group):
-          fsm.add_arc(totalNodes, totalNodes+1, n);
+      for label in allLabels:
+        if(label in groupLabels):
+          fsm.add_arc(totalNodes, totalNodes+1, label);
         else:
-          fsm.add_arc(totalNodes, totalNodes, n);
+          fsm.add_arc(totalNodes, totalNodes, label);
       #end for
       totalNodes += 1;
     #end for
     
     if(crash):
       # if we crashed here: need to end on crash node
-      for n in self.__solverVars:
-        if(n in possibleYes[-1]):
-          fsm.add_arc(totalNodes, totalNodes, n);
+      for label in allLabels:
+        if(label in groupLabels):
+          fsm.add_arc(totalNodes, totalNodes, label);
         else:
-          fsm.add_arc(totalNodes, totalNodes-1, n);
+          fsm.add_arc(totalNodes, totalNodes-1, label);
         #end if
       #end for
     else:
       # if we didn't crash here: after that, no constraints
-      for n in self.__solverVars:
-        fsm.add_arc(totalNodes, totalNodes, n);
+      for label in allLabels:
+        fsm.add_arc(totalNodes, totalNodes, label);
       #end for
     #end if
     
@@ -222,15 +437,26 @@ class FsaExecutionSolver(ExecutionSolver):
     # intersect in the observation FSM
     self.__solver &= fsm;
     
-    # if the FSA is getting really big, trade off some time to save space
-    self.__nextCompact -= 1;
-    if(self.__nextCompact < 0 and len(self.__solver) > 1000000):
-      self.__solver = self.__solver.determinize();
-      self.__solver.minimize();
-      self.__nextCompact = 2;
-    #end if
+    # if the FSA is getting big, trade off some time to save space
+    self.__compactIfNeeded();
   #end: encodeObsYes
   
+  """
+  @override
+  encodeObsYesBatch(): Encode the constraints for many yes-executed
+  observations at once.  The most constraining observations (estimated from
+  the CFG) are intersected first, so that intermediate products stay small.
+  @param obsYes a collection of yes-executed observations
+            => {[{G.nodes}]}
+  """
+  def encodeObsYesBatch(self, obsYes):
+    ordered = self.__orderBySelectivity(obsYes);
+    for (i, possibleYes) in enumerate(ordered):
+      print(str(i+1) + "/" + str(len(ordered)));
+      self.encodeObsYes(possibleYes);
+    #end for
+  #end: encodeObsYesBatch
+  
   """
   @override
   encodeCrash(): Encode the constraint for the crashing location.
@@ -253,6 +479,72 @@ class FsaExecutionSolver(ExecutionSolver):
     assert(self.isSat());
   #end: encodeCrash
   
+  """
+  __snapshotPath(): Get the path of the snapshot file for the constrained FSA
+  for this graph and failure report.  Snapshots are only used if the
+  FSA_SNAPSHOT_DIR environment variable names a directory.
+  @param crashStack the crashing stack
+  @param obsYes the obsYes observations
+  @param obsNo the obsNo observations
+  @return the path, or None if snapshots are disabled
+  """
+  def __snapshotPath(self, crashStack, obsYes, obsNo):
+    snapshotDir = os.environ.get("FSA_SNAPSHOT_DIR", None);
+    if(not snapshotDir):
+      return(None);
+    elif(not os.path.isdir(snapshotDir)):
+      print >> stderr, ("WARNING: FSA_SNAPSHOT_DIR '" + snapshotDir + \
+                        "' is not a directory.  Not using snapshots.");
+      return(None);
+    #end if
+    
+    reportDigest = failureReportDigest(crashStack, obsYes, obsNo);
+    return(os.path.join(snapshotDir, self.__graphDigest + "-" + \
+                                     reportDigest + ".fst"));
+  #end: __snapshotPath
+  
+  """
+  @override
+  encodeFailureReport(): Encode all constraints from a failure report.  If a
+  snapshot of the constrained FSA already exists for this graph and report,
+  load it instead of re-doing all intersections.  Otherwise, encode normally
+  and save a snapshot (in OpenFst binary format) for later runs.
+  @param crashStack see encodeCrash()
+  @param obsYes a collection of observations, as for encodeObsYesBatch()
+  @param obsNo a collection of observations, as for encodeObsNoBatch()
+  """
+  def encodeFailureReport(self, crashStack, obsYes, obsNo):
+    snapshotPath = self.__snapshotPath(crashStack, obsYes, obsNo);
+    if(snapshotPath and os.path.exists(snapshotPath)):
+      print("Loading constrained FSA snapshot " + snapshotPath + "...");
+      try:
+        self.__solver = read_std(snapshotPath);
+        # (later compaction decisions start from the loaded automaton)
+        self.__compactedStates = len(self.__solver);
+        self.__growthFactor = COMPACT_GROWTH_FACTOR;
+        return;
+      except Exception as e:
+        print >> stderr, ("WARNING: could not read FSA snapshot " + \
+                          snapshotPath + ": " + str(e));
+      #end try
+    #end if
+    
+    ExecutionSolver.encodeFailureReport(self, crashStack, obsYes, obsNo);
+    
+    if(snapshotPath):
+      print("Saving constrained FSA snapshot " + snapshotPath + "...");
+      # write then rename, so concurrent runs never see a partial snapshot
+      tempPath = snapshotPath + "." + str(os.getpid()) + ".tmp";
+      try:
+        self.__solver.write(tempPath);
+        os.rename(tempPath, snapshotPath);
+      except Exception as e:
+        print >> stderr, ("WARNING: could not write FSA snapshot " + \
+                          snapshotPath + ": " + str(e));
+      #end try
+    #end if
+  #end: encodeFailureReport
+  
   """
   getObsNoFsa: Get the FSA for encoding the not-executed observation.
   @param possibleNo a set of possible matches to the true entry
@@ -269,13 +561,26 @@ class FsaExecutionSolver(ExecutionSolver):
     #end if
     obsNo = list(possibleNo)[0];
     
-    fsm = Acceptor(self.__solver.isyms);
+    return(self.getForbiddenFsa(set([obsNo])));
+  #end: getObsNoFsa
+  
+  """
+  getForbiddenFsa: Get the FSA accepting exactly those executions that never
+  visit any of the forbidden nodes.
+  @param forbidden the set of nodes that may not execute
+            => {G.nodes}
+  @return the FSA representing the execution constraint
+  """
+  def getForbiddenFsa(self, forbidden):
+    fsm = Acceptor();
+    forbiddenLabels = set([self.__solverVars[n] for n in forbidden \
+                                                if n in self.__solverVars]);
     
-    # all nodes except obsNo are fine
-    for n in self.__solverVars:
-      if(n == obsNo):
+    # all nodes except those forbidden are fine
+    for label in xrange(1, len(self.__nodeNames)):
+      if(label in forbiddenLabels):
         continue;
-      fsm.add_arc(0, 0, n);
+      fsm.add_arc(0, 0, label);
     #end for
     
     # sort the arcs (this is required for intersecting FSMs)
@@ -283,7 +588,7 @@ class FsaExecutionSolver(ExecutionSolver):
     fsm.arc_sort_input();
     fsm.arc_sort_output();
     return(fsm);
-  #end: getObsNoFsa
+  #end: getForbiddenFsa
   
   """
   @override
@@ -299,38 +604,133 @@ class FsaExecutionSolver(ExecutionSolver):
     self.__solver &= fsm;
   #end: encodeObsNo
   
+  """
+  @override
+  encodeObsNoBatch(): Encode the constraints for many not-executed observations
+  at once.  Rather than intersecting one |V|-arc acceptor per observation, all
+  arcs labeled with any forbidden node are dropped in a single pass (by
+  intersecting with one single-state filter), followed by a single connect().
+  @param obsNo a collection of not-executed observations
+                    (NOTE: each currently only supports a singleton)
+            => [{G.nodes}]
+  """
+  def encodeObsNoBatch(self, obsNo):
+    forbidden = set([]);
+    for possibleNo in obsNo:
+      # we currently only handle singleton "no" observations
+      if(len(possibleNo) != 1):
+        print >> stderr, ("ERROR: FSA solver can currently only handle " + \
+                          "unambiguous FALSE observations");
+        exit(1);
+      #end if
+      forbidden.add(list(possibleNo)[0]);
+    #end for
+    
+    if(not forbidden):
+      return;
+    #end if
+    
+    self.__solver &= self.getForbiddenFsa(forbidden);
+    self.__solver.connect();
+  #end: encodeObsNoBatch
+  
+  """
+  __probeNode(): Check whether a node may have executed, and whether it may
+  not have executed, given the encoded constraints.  The size of the larger
+  product is left in __probeStates.
+  @param n the node
+  @return (possibleYes, possibleNo)
+  """
+  def __probeNode(self, n):
+    self.__probeStates = 0;
+    testSolve = self.__solver & self.getObsYesFsa([[n]]);
+    self.__probeStates = len(testSolve);
+    possibleYes = not fsaIsEmpty(testSolve, False);
+    
+    testSolve = self.__solver & self.getObsNoFsa([n]);
+    self.__probeStates = max(self.__probeStates, len(testSolve));
+    possibleNo = not fsaIsEmpty(testSolve, False);
+    return(possibleYes, possibleNo);
+  #end: __probeNode
+  
   """
   @override
   findKnownExecution(): Figure out which nodes in the CFG (a) are known to have
   executed at least once, (b) are known to have not executed, and (c) may or may
   not have executed given the crash location.
+  @param queryNodes the nodes to classify (by default, all of them); other
+                    nodes are left out of the result
+                    => {G.nodes}
+  @param monitor a ProbeMonitor told about each node as it is classified
+                 (or None)
   @return (defYes, defNo, maybe)
              => ({G.nodes}, {G.nodes}, {G.nodes})
   """
-  def findKnownExecution(self):
+  def findKnownExecution(self, queryNodes=None, monitor=None):
+    if(monitor == None):
+      monitor = ProbeMonitor();
+    #end if
     defYes = set([]);
     defNo = set([]);
     maybe = set([]);
     
-    total = len(self.__solverVars);
-    soFar = 0;
-    for (n, nodeId) in self.__solverVars.iteritems():
-      testSolve = self.__solver & self.getObsYesFsa([[n]]);
-      possibleYes = not fsaIsEmpty(testSolve, False);
-      
-      testSolve = self.__solver & self.getObsNoFsa([n]);
-      possibleNo = not fsaIsEmpty(testSolve, False);
+    probeVars = [(n, nodeId) for (n, nodeId) in self.__solverVars.iteritems() \
+                             if queryNodes == None or n in queryNodes];
+    
+    (states, arcs) = fsaSize(self.__solver);
+    countStat("FsaExecutionSolver.states", states);
+    countStat("FsaExecutionSolver.arcs", arcs);
+    
+    # nodes that label no arc of the trimmed automaton are on no accepted
+    # execution, so they need no probes of their own: they come first (and
+    # are classified even if probing stops early)
+    trivial = set([]);
+    trimmed = self.__solver.copy();
+    trimmed.connect();
+    if(len(trimmed) > 0):
+      labels = set([arc.ilabel for state in trimmed.states \
+                               for arc in state.arcs]);
+      for (n, nodeId) in probeVars:
+        if(nodeId not in labels):
+          trivial.add(n);
+          defNo.add(n);
+          monitor.probed(n, False, True);
+        #end if
+      #end for
+      countStat("FsaExecutionSolver.trivial", len(trivial));
+    #end if
+    del trimmed;
+    
+    total = len(probeVars);
+    soFar = len(trivial);
+    for (n, nodeId) in [(m, mId) for (m, mId) in probeVars \
+                                 if m not in trivial]:
+      if(monitor.stopped()):
+        break;
+      #end if
+      start = time.time();
+      probe = monitor.probe(n, self.__probeNode, n);
+      addStat("FsaExecutionSolver.probes");
+      # (an interrupted probe may not have measured its product)
+      monitor.timed(n, time.time() - start,
+                    {"product states" : self.__probeStates} \
+                    if probe != None else {"interrupted" : True});
       
-      if(not possibleYes and not possibleNo):
-        print >> stderr, ("ERROR: graph node " + n + " neither executed nor " +\
-                          "didn't execute!");
-        exit(1);
-      elif(possibleYes and possibleNo):
-        maybe.add(n);
-      elif(possibleYes):
-        defYes.add(n);
-      else:
-        defNo.add(n);
+      # (interrupted probes leave the node unclassified)
+      if(probe != None):
+        (possibleYes, possibleNo) = probe;
+        if(not possibleYes and not possibleNo):
+          print >> stderr, ("ERROR: graph node " + n + " neither executed " + \
+                            "nor didn't execute!");
+          exit(1);
+        elif(possibleYes and possibleNo):
+          maybe.add(n);
+        elif(possibleYes):
+          defYes.add(n);
+        else:
+          defNo.add(n);
+        monitor.probed(n, possibleYes, possibleNo);
+      #end if
       
       soFar += 1;
       if(soFar % 10 == 0):
@@ -352,7 +752,7 @@ class FsaExecutionSolver(ExecutionSolver):
     for state in self.__solver.states:
       for arc in state.arcs:
           print("{} -> {} / {} / {}".format(state.stateid, arc.nextstate,
-                                        self.__solver.isyms.find(arc.ilabel),
+                                        self.__nodeNames[arc.ilabel],
                                         self.__solver[arc.nextstate].final));
       #end for
     #end for
@@ -368,7 +768,7 @@ class FsaExecutionSolver(ExecutionSolver):
         break;
       else:
         q += 1;
-      path_istring = ','.join(self.__solver.isyms.find(arc.ilabel) \
+      path_istring = ','.join(self.__nodeNames[arc.ilabel] \
                               for arc in path);
       print("[{}]".format(path_istring));
     #end for
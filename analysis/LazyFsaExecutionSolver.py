@@ -0,0 +1,508 @@
+#!/s/python-2.7.1/bin/python
+
+from sys import stderr, stdout
+
+import os
+import time
+
+from collections import OrderedDict
+
+from ExecutionSolver import ExecutionSolver
+from FsaExecutionSolver import getCfgSuccessors, getMemoryBudget
+from ProbeMonitor import ProbeMonitor
+from csilibs.clock import addStat, countStat
+
+# rough per-state footprint (in bytes) of a product state remembered by the
+# lazy solver (the state tuple plus its dictionary entry), used to size the
+# cache of dead product states
+LAZY_STATE_BYTES = 256;
+
+"""
+getDeadStateCacheSize(): Get the maximum number of dead (i.e., not
+co-reachable) product states to remember while exploring.  This is
+LAZY_FSA_CACHE_STATES if set, and otherwise derived from the FSA memory budget.
+When the cache is full, the least recently reached dead state is forgotten; if
+it is reached again, it (and any forgotten dead states behind it) is
+re-explored and found dead again, so too small a cache can make exploration
+very slow.  Only this cache is bounded: the live product states and the states
+of the SCC traversal in progress are always kept.
+@return the number of states
+"""
+def getDeadStateCacheSize():
+  cacheSize = getMemoryBudget() / LAZY_STATE_BYTES;
+  setting = os.environ.get("LAZY_FSA_CACHE_STATES", None);
+  if(setting):
+    try:
+      cacheSize = int(setting);
+    except ValueError:
+      print >> stderr, ("WARNING: LAZY_FSA_CACHE_STATES '" + setting + \
+                        "' is not an integer.  Using " + str(cacheSize) + \
+                        " states.");
+    #end try
+  #end if
+  
+  return(max(cacheSize, 1024));
+#end: getDeadStateCacheSize
+
+class LazyFsaExecutionSolver(ExecutionSolver):
+  __slots__ = "__solverVars, __nodeNames, __cfgSuccessors, __observations, " + \
+              "__forbidden, __product, __cacheSize, __searchedStates";
+  
+  """
+  @override
+  __init__(): Process the graph, encoding its structure as a deterministic
+  Finite-State Automaton (FSA) over the same integer labels as the FSA solver
+  (each node's id is both its state and the label on all arcs into it).
+  Unlike the FSA solver, observations are not intersected in as they are
+  encoded: the CFG automaton and all observation automata are kept separate,
+  and only the part of their product that lies on some accepted execution is
+  kept.  It is built (in full) the first time it is needed after a constraint
+  is encoded.
+  @param G the graph
+  """
+  def __init__(self, G):
+    (self.__solverVars, self.__nodeNames, cfgSuccessors) = \
+                                                        getCfgSuccessors(G);
+    self.__cfgSuccessors = [tuple(sorted(set(targets))) \
+                            for targets in cfgSuccessors];
+    
+    # each observation is (sequence of sets of labels, crash?)
+    self.__observations = [];
+    self.__forbidden = set([]);
+    self.__product = None;
+    self.__cacheSize = getDeadStateCacheSize();
+    
+    # assert that the encoded CFG has legal executions
+    assert(self.isSat());
+  #end: __init__
+  
+  """
+  __observationStep(): Advance the automaton for one obsYes observation.  The
+  automaton is the same as the one built by FsaExecutionSolver.getObsYesFsa():
+  state j means the first j entries have been seen (in order).
+  @param observation (sequence of sets of labels, crash?)
+  @param j the current state
+  @param label the label just read
+  @return the next state
+  """
+  def __observationStep(self, observation, j, label):
+    (groups, crash) = observation;
+    if(j < len(groups)):
+      return(j+1 if label in groups[j] else j);
+    elif(crash):
+      # if we crashed here: need to end on crash node
+      return(j if label in groups[j-1] else j-1);
+    else:
+      # if we didn't crash here: after that, no constraints
+      return(j);
+    #end if
+  #end: __observationStep
+  
+  """
+  __isFinal(): Check whether a product state is accepting: every state but
+  the pre-entry state is a legal stopping point in the CFG, and every
+  observation must have been completed.
+  @param state the product state
+            => (int, (int))
+  @return whether or not the state is accepting
+  """
+  def __isFinal(self, state):
+    (cfgState, observationStates) = state;
+    if(cfgState == 0):
+      return(False);
+    #end if
+    for (observation, j) in zip(self.__observations, observationStates):
+      if(j != len(observation[0])):
+        return(False);
+      #end if
+    #end for
+    return(True);
+  #end: __isFinal
+  
+  """
+  __productSuccessors(): Compute the successors of a product state.
+  @param state the product state
+            => (int, (int))
+  @return the list of successor product states
+  """
+  def __productSuccessors(self, state):
+    (cfgState, observationStates) = state;
+    successors = [];
+    for label in self.__cfgSuccessors[cfgState]:
+      if(label in self.__forbidden):
+        continue;
+      #end if
+      nextStates = tuple([self.__observationStep(observation, j, label) \
+                          for (observation, j) in \
+                              zip(self.__observations, observationStates)]);
+      successors.append((label, nextStates));
+    #end for
+    return(successors);
+  #end: __productSuccessors
+  
+  """
+  __explore(): Build the trimmed product of the CFG and all observations: the
+  product states that are both reachable from the initial state and
+  co-reachable to an accepting state.  This is a single (iterative) Tarjan
+  SCC traversal, computing successors on the fly; since SCCs are completed in
+  reverse topological order, each one can be classified as live or dead as
+  soon as it is complete, and dead states are dropped right away (except for
+  a bounded, least-recently-used cache, to avoid re-exploring them).
+  @return (initial state id or None if no execution is accepted,
+           id->CFG state list, id->[successor ids] list, {accepting ids})
+             => (int, [int], [[int]], {int})
+  """
+  def __explore(self):
+    initial = (0, tuple([0] * len(self.__observations)));
+    live = {};
+    liveSuccessors = {};
+    # (dead states, least recently reached first)
+    dead = OrderedDict();
+    
+    index = {};
+    lowlink = {};
+    successors = {};
+    sccStack = [];
+    callStack = [];
+    counter = [0];
+    
+    def push(state):
+      index[state] = lowlink[state] = counter[0];
+      counter[0] += 1;
+      successors[state] = self.__productSuccessors(state);
+      sccStack.append(state);
+      callStack.append([state, 0]);
+    #end: push
+    
+    push(initial);
+    while(callStack):
+      frame = callStack[-1];
+      state = frame[0];
+      if(frame[1] < len(successors[state])):
+        nextState = successors[state][frame[1]];
+        frame[1] += 1;
+        if(nextState in live):
+          continue;
+        elif(nextState in dead):
+          dead[nextState] = dead.pop(nextState);
+          continue;
+        elif(nextState in index):
+          # still on the SCC stack
+          lowlink[state] = min(lowlink[state], index[nextState]);
+        else:
+          push(nextState);
+        #end if
+        continue;
+      #end if
+      
+      callStack.pop();
+      if(callStack):
+        parent = callStack[-1][0];
+        lowlink[parent] = min(lowlink[parent], lowlink[state]);
+      #end if
+      if(lowlink[state] != index[state]):
+        continue;
+      #end if
+      
+      # state is the root of a complete SCC
+      scc = [];
+      while(True):
+        member = sccStack.pop();
+        scc.append(member);
+        if(member == state):
+          break;
+      #end while
+      sccMembers = set(scc);
+      isLive = False;
+      for member in scc:
+        if(self.__isFinal(member) or \
+           any(s in live for s in successors[member])):
+          isLive = True;
+          break;
+        #end if
+      #end for
+      
+      for member in scc:
+        if(isLive):
+          live[member] = len(live);
+          liveSuccessors[member] = [s for s in successors[member] \
+                                    if s in live or s in sccMembers];
+        else:
+          if(len(dead) >= self.__cacheSize):
+            dead.popitem(last=False);
+          #end if
+          dead[member] = True;
+        #end if
+        del index[member];
+        del lowlink[member];
+        del successors[member];
+      #end for
+    #end while
+    
+    if(initial not in live):
+      return(None, [], [], set([]));
+    #end if
+    
+    # renumber on ints, keeping only the CFG component of each state
+    cfgStates = [None] * len(live);
+    adjacency = [None] * len(live);
+    accepting = set([]);
+    for (state, stateId) in live.iteritems():
+      cfgStates[stateId] = state[0];
+      adjacency[stateId] = [live[s] for s in liveSuccessors[state]];
+      if(self.__isFinal(state)):
+        accepting.add(stateId);
+      #end if
+    #end for
+    return(live[initial], cfgStates, adjacency, accepting);
+  #end: __explore
+  
+  """
+  __getProduct(): Get the trimmed product, building it if any constraints were
+  encoded since it was last built.
+  @return see __explore()
+  """
+  def __getProduct(self):
+    if(self.__product == None):
+      self.__product = self.__explore();
+    #end if
+    return(self.__product);
+  #end: __getProduct
+  
+  """
+  __findWitness(): Find one accepted execution in the trimmed product that
+  never enters the given CFG state.  The number of product states searched is
+  left in __searchedStates.
+  @param avoid the CFG state (i.e. label) to avoid, or None
+  @return the set of CFG states on the execution, or None if there is none
+  """
+  def __findWitness(self, avoid=None):
+    self.__searchedStates = 0;
+    (initial, cfgStates, adjacency, accepting) = self.__getProduct();
+    if(initial == None):
+      return(None);
+    #end if
+    
+    # (any accepting state will do, so a plain DFS suffices)
+    parent = {initial : None};
+    worklist = [initial];
+    while(worklist):
+      current = worklist.pop();
+      self.__searchedStates += 1;
+      if(current in accepting):
+        path = set([]);
+        while(current != None):
+          path.add(cfgStates[current]);
+          current = parent[current];
+        #end while
+        path.discard(0);
+        return(path);
+      #end if
+      for nextId in adjacency[current]:
+        if(nextId in parent or cfgStates[nextId] == avoid):
+          continue;
+        #end if
+        parent[nextId] = current;
+        worklist.append(nextId);
+      #end for
+    #end while
+    
+    return(None);
+  #end: __findWitness
+  
+  """
+  @override
+  isSat(): Check if any execution satisfies all encoded constraints.
+  @return whether or not the current constraints are satisfiable
+  """
+  def isSat(self):
+    return(self.__getProduct()[0] != None);
+  #end: isSat
+  
+  """
+  @override
+  encodeObsYes(): Encode the constraint for a yes-executed observation.
+  @param possibleYes a sequence of sets of possible matches to the true entry
+                    (usually a singleton)
+            => [{G.nodes}]
+  @param crash a boolean specifying whether this is a crashing observation
+  """
+  def encodeObsYes(self, possibleYes, crash=False):
+    groups = [];
+    for group in possibleYes:
+      # verify that all nodes are in the graph
+      for n in group:
+        if(n not in self.__solverVars):
+          print >> stderr, ("ERROR: invalid YES observation: " + str(n));
+          exit(1);
+        #end if
+      #end for
+      groups.append(frozenset([self.__solverVars[n] for n in group]));
+    #end for
+    
+    self.__observations.append((tuple(groups), crash));
+    self.__product = None;
+  #end: encodeObsYes
+  
+  """
+  @override
+  encodeCrash(): Encode the constraint for the crashing location.
+  @param crashStack a representation of possible crashes in the stack trace,
+                    ending in the final possible crashing nodes
+            => [({G.nodes}, {G.nodes}), ..., ({G.nodes}, None)]
+  """
+  def encodeCrash(self, crashStack):
+    obsCrash = [];
+    for (callNodes, entryNodes) in crashStack:
+      obsCrash.append(callNodes);
+      if(entryNodes):
+        obsCrash.append(entryNodes);
+    #end for
+    
+    self.encodeObsYes(obsCrash, True);
+    
+    # assert that the encoded CFG still has legal executions (i.e. the crash
+    # is reachable)
+    assert(self.isSat());
+  #end: encodeCrash
+  
+  """
+  @override
+  encodeObsNo(): Encode the constraint for a not-executed observation.  These
+  are not kept as separate automata: the forbidden labels are simply never
+  followed when exploring the product.
+  @param possibleNo a set of possible matches to the true entry
+                    (NOTE: currently only supports a singleton)
+            => {G.nodes}
+  """
+  def encodeObsNo(self, possibleNo):
+    # we currently only handle singleton "no" observations
+    if(len(possibleNo) != 1):
+      print >> stderr, ("ERROR: LazyFSA solver can currently only handle " + \
+                        "unambiguous FALSE observations");
+      exit(1);
+    #end if
+    obsNo = list(possibleNo)[0];
+    
+    if(obsNo in self.__solverVars):
+      self.__forbidden.add(self.__solverVars[obsNo]);
+      self.__product = None;
+    #end if
+  #end: encodeObsNo
+  
+  """
+  __probeNode(): Search for an accepted execution that avoids a node, and
+  record every node that execution avoids as possibly not executed.
+  @param nodeId the node's label
+  @param possibleNo the labels of nodes that may not have executed (updated)
+  @return (possibleYes, possibleNo) for the node
+  """
+  def __probeNode(self, nodeId, possibleNo):
+    witness = self.__findWitness(nodeId);
+    if(witness != None):
+      possibleNo.update(set(xrange(1, len(self.__nodeNames))) - witness);
+    #end if
+    return(True, nodeId in possibleNo);
+  #end: __probeNode
+  
+  """
+  @override
+  findKnownExecution(): Figure out which nodes in the CFG (a) are known to have
+  executed at least once, (b) are known to have not executed, and (c) may or may
+  not have executed given the crash location.
+  Since the trimmed product only contains states on accepted executions, a node
+  may have executed iff some product state enters it.  Whether it may also have
+  not executed needs a search for an execution avoiding it; each execution
+  found along the way shows that every node not on it may not have executed,
+  so most nodes never need a search of their own.
+  @param queryNodes the nodes to classify (by default, all of them); other
+                    nodes are left out of the result
+                    => {G.nodes}
+  @param monitor a ProbeMonitor told about each node as it is classified
+                 (or None)
+  @return (defYes, defNo, maybe)
+             => ({G.nodes}, {G.nodes}, {G.nodes})
+  """
+  def findKnownExecution(self, queryNodes=None, monitor=None):
+    if(monitor == None):
+      monitor = ProbeMonitor();
+    #end if
+    defYes = set([]);
+    defNo = set([]);
+    maybe = set([]);
+    
+    (initial, cfgStates, adjacency, accepting) = self.__getProduct();
+    if(initial == None):
+      print >> stderr, ("ERROR: no execution satisfies the failure report");
+      exit(1);
+    #end if
+    countStat("LazyFsaExecutionSolver.states", len(cfgStates));
+    countStat("LazyFsaExecutionSolver.arcs",
+              sum([len(successors) for successors in adjacency]));
+    
+    possibleYes = set(cfgStates);
+    possibleNo = set([]);
+    
+    probeVars = [(n, nodeId) for (n, nodeId) in self.__solverVars.iteritems() \
+                             if queryNodes == None or n in queryNodes];
+    
+    # nodes that need no search of their own come first (so that, if probing
+    # stops early, as many nodes as possible are classified): those every
+    # execution avoids, then those an earlier search's witness avoids
+    ready = [(n, nodeId) for (n, nodeId) in probeVars \
+                         if nodeId not in possibleYes];
+    pending = [(n, nodeId) for (n, nodeId) in probeVars \
+                           if nodeId in possibleYes];
+    
+    total = len(probeVars);
+    soFar = 0;
+    while(ready or pending):
+      if(monitor.stopped()):
+        break;
+      #end if
+      
+      if(ready):
+        (n, nodeId) = ready.pop();
+        if(nodeId not in possibleYes):
+          # every execution avoids this node
+          possibleNo.add(nodeId);
+        #end if
+        probe = (nodeId in possibleYes, nodeId in possibleNo);
+      else:
+        (n, nodeId) = pending.pop();
+        start = time.time();
+        probe = monitor.probe(n, self.__probeNode, nodeId, possibleNo);
+        addStat("LazyFsaExecutionSolver.probes");
+        # (an interrupted probe may not have measured its search)
+        monitor.timed(n, time.time() - start,
+                      {"product states" : self.__searchedStates} \
+                      if probe != None else {"interrupted" : True});
+        ready = [(m, mId) for (m, mId) in pending if mId in possibleNo];
+        pending = [(m, mId) for (m, mId) in pending if mId not in possibleNo];
+      #end if
+      
+      # (interrupted probes leave the node unclassified)
+      if(probe != None):
+        (nodePossibleYes, nodePossibleNo) = probe;
+        if(nodePossibleYes and nodePossibleNo):
+          maybe.add(n);
+        elif(nodePossibleYes):
+          defYes.add(n);
+        else:
+          defNo.add(n);
+        #end if
+        monitor.probed(n, nodePossibleYes, nodePossibleNo);
+      #end if
+      
+      soFar += 1;
+      if(soFar % 10 == 0):
+        stdout.write("\r" + ("%.2f" % ((1.0*soFar)/(1.0*total)*100)) + "%: " + \
+                     str(soFar) + " / " + str(total));
+        stdout.flush();
+      #end if
+    #end while
+    print("");
+    
+    return(defYes, defNo, maybe);
+  #end: findKnownExecution
+#end: class LazyFsaExecutionSolver
@@ -1,20 +1,146 @@
 #!/s/python-2.7.1/bin/python
 
 from pexpect import spawn, EOF
+from pexpect.fdpexpect import fdspawn
+from collections import deque
+from hashlib import sha1
+from select import select
+from socket import socket, AF_UNIX, SOCK_STREAM, error as SocketError
 from sys import stderr, stdout
 
 from ExecutionSolver import ExecutionSolver
+from ProbeMonitor import ProbeMonitor
 from utils import findEntryForNode, findGraphEntry
 from csilibs.graphlibs import is_cfg_node
 
 import os
+import time
 
 EXPECTED_PROMPT = ">> ";
 ENTRY_PREFIX="entry_"
 RETURN_PREFIX="ret_"
 
+# the default number of nodes whose probes may be in flight at once
+DEFAULT_PROBE_WINDOW = 32;
+
+# the smallest heap (in MegaBytes) to give any one worker JVM
+MIN_WORKER_MEMORY = 256;
+
+"""
+getWorkerCount(): Get the number of SVPA servers to run.  This is SVPA_WORKERS
+if set, and 1 otherwise.  Every server receives all encoded constraints, and
+the probes in findKnownExecution() are split between them.
+@return the number of servers
+"""
+def getWorkerCount():
+  try:
+    workers = int(os.environ.get("SVPA_WORKERS", 1));
+    workers = max(workers, 1);
+  except:
+    workers = 1;
+
+  return(workers);
+#end: getWorkerCount
+
+"""
+getProbeWindow(): Get the number of nodes whose probes may be sent to the
+server before reading their results.  This is SVPA_PROBE_WINDOW if set, and
+DEFAULT_PROBE_WINDOW otherwise.  A small window bounds the data buffered on
+both sides of the connection; a larger one keeps the server busier while we
+process results.
+@return the window size (in nodes)
+"""
+def getProbeWindow():
+  try:
+    window = int(os.environ.get("SVPA_PROBE_WINDOW", DEFAULT_PROBE_WINDOW));
+    window = max(window, 1);
+  except:
+    window = DEFAULT_PROBE_WINDOW;
+
+  return(window);
+#end: getProbeWindow
+
+"""
+getSvpaCfgEdges(): Find all edges of the CFG, in the form used to encode the
+CFG for the SVPA server: (type, from, to, onStack), where type is "e" (the
+entry, with only "from"), "i" (internal), "c" (call) or "r" (return, with the
+call node as "onStack").  Calls and returns go through special "entry site" and
+"return site" nodes, which allow constraints to ignore call and return edges
+for matching.
+@param G the graph
+@return (edges, all CFG nodes)
+             => ([(str, G.node, G.node, G.node)], {G.nodes})
+"""
+def getSvpaCfgEdges(G):
+  (entryNode, isInterprocedural) = findGraphEntry(G);
+  edges = [("e", entryNode, None, None)];
+  graphNodes = set([]);
+
+  for (n, attr) in G.nodes(True):
+    # don't export SDG-only nodes
+    if(not is_cfg_node(G, n)):
+      continue;
+    graphNodes.add(n);
+
+    if(isInterprocedural and attr.get("kind", "") == "call-site"):
+      foundOne = False;
+      for (source, target, eAttr) in G.out_edges_iter([n], data=True):
+        if(eAttr.get("type", "flow") == "control" and \
+           eAttr.get("scope", "") == "interprocedural"):
+          # add special automata state for the "entry site":
+          # allows constraints to ignore call edges for matching
+          entrySite = ENTRY_PREFIX+target;
+          edges.append(("c", n, entrySite, None));
+          edges.append(("i", entrySite, target, None));
+          foundOne = True;
+        #end if
+      #end for
+
+      # add appropriate intraprocedural edges: only if
+      # (a) the called function is not in the graphml, or
+      # (b) the target is a crash point (which is essentially ambiguity
+      #     nonsensemeaning that we crashed trying to make the call itself)
+      for (source, target, attr) in G.out_edges_iter([n], data=True):
+        if(attr.get("type", "flow") == "flow" and \
+           attr.get("scope", "") != "interprocedural" and \
+           (not foundOne or G.node[target].get("kind", "") == "crash")):
+          edges.append(("i", n, target, None));
+        #end if
+      #end for
+    elif(isInterprocedural and attr.get("kind", "") == "exit"):
+      entryForExit = findEntryForNode(G, n);
+      for (source, target, eAttr) in G.in_edges_iter([entryForExit], data=True):
+        if(eAttr.get("type", "flow") == "control" and \
+           eAttr.get("scope", "") == "interprocedural"):
+          # edge from exit -> all successors of the call to this function
+          for (call, callTarget, eAttr) in G.out_edges_iter([source], data=True):
+            if(eAttr.get("type", "flow") == "flow" and \
+               eAttr.get("scope", "") != "interprocedural" and \
+               G.node[callTarget].get("kind", "") != "crash"):
+              # add special automata state for the "return site":
+              # allows constraints to ignore return edges for matching
+              retSite = RETURN_PREFIX+call;
+              edges.append(("r", n, retSite, call));
+              edges.append(("i", retSite, callTarget, None));
+            #end if
+          #end for
+        #end if
+      #end for
+    else:
+      for (source, target, eAttr) in G.out_edges_iter([n], data=True):
+        if(eAttr.get("type", "flow") == "flow" and \
+           eAttr.get("scope", "") != "interprocedural"):
+          edges.append(("i", n, target, None));
+        #end if
+      #end for
+    #end if
+  #end for
+
+  return(edges, graphNodes);
+#end: getSvpaCfgEdges
+
 class PexpectSvpaExecutionSolver(ExecutionSolver):
-  __slots__ = "__server", "__graphNodes";
+  __slots__ = "__servers", "__sockets", "__graphNodes";
 
   """
   __findEntry(): Search through the graph for its "entry" node.  If the graph is
@@ -59,127 +185,154 @@ class PexpectSvpaExecutionSolver(ExecutionSolver):
               if it encounters EOF.
   @param values a list of expected values to pass to expect()
   @param errorMessage the message to print before termination of EOF is found
+  @param server the server to read from (by default, the first one)
   @return the index from "values" that is first matched
   """
-  def __expect(self, values, errorMessage):
-    if(not self.__server.isalive()):
+  def __expect(self, values, errorMessage, server=None):
+    if(server == None):
+      server = self.__servers[0];
+    #end if
+
+    if(not server.isalive()):
       print >> stderr, ("ERROR: server is already dead: " + errorMessage);
       exit(1);
     #end if
 
-    result = self.__server.expect(values + [EOF]);
+    result = server.expect(values + [EOF]);
     if(result == len(values) or result < 0):
       print >> stderr, ("ERROR: EOF reached while checking SVPA output:" + \
                         errorMessage);
       print >> stderr, ("Full data read:");
-      print >> stderr, self.__server.before;
-      print >> stderr, self.__server.after;
+      print >> stderr, server.before;
+      print >> stderr, server.after;
       exit(1);
     #end if
 
     return(result);
   #end: __expect
 
+  """
+  __sendToAll(): Send a command to every server, and wait for all of them to
+                 finish it.  (The servers work on it concurrently.)
+  @param command the command to send
+  @param errorMessage the message to print if any server fails
+  @param servers the servers to send to (by default, all of them)
+  """
+  def __sendToAll(self, command, errorMessage, servers=None):
+    if(servers == None):
+      servers = self.__servers;
+    for server in servers:
+      server.sendline(command);
+    #end for
+    for server in servers:
+      self.__expect([EXPECTED_PROMPT], errorMessage, server);
+    #end for
+  #end: __sendToAll
+
+  """
+  __connect(): Open a session on a long-running SVPA server daemon (started
+               with "SVPAServer.jar -daemon socket_path").  This avoids JVM
+               startup and warmup costs for each analysis.
+  @param socketPath the path of the daemon's Unix domain socket
+  @return the pexpect object for the session
+  """
+  def __connect(self, socketPath):
+    serverSocket = socket(AF_UNIX, SOCK_STREAM);
+    try:
+      serverSocket.connect(socketPath);
+    except SocketError as e:
+      print >> stderr, ("ERROR: could not connect to SVPA server at " + \
+                        socketPath + ": " + str(e));
+      exit(1);
+    #end try
+
+    self.__sockets.append(serverSocket);
+    return(fdspawn(serverSocket.fileno(), timeout=None));
+  #end: __connect
+
+  """
+  __startServer(): Start up a process for the Java SVPA server.
+  @param maxMemory the server's maximum heap size (in MegaBytes)
+  @return the pexpect object for the server
+  """
+  def __startServer(self, maxMemory):
+    server = spawn("java", \
+                   args=["-Xmx" + str(maxMemory) + "m", \
+                         "-jar", \
+                         "../SVPAServer/SVPAServer.jar"], \
+                   timeout=None);
+    server.setecho(False);
+    return(server);
+  #end: __startServer
+
   """
   @override
-  __init__(): Start up a process for the Java SVPA server.  Then, process the
+  __init__(): Start up a process for the Java SVPA server (or, if the
+              SVPA_SERVER_SOCKET environment variable is set, connect to an
+              already-running server daemon there).  Then, process the
               graph, encoding its structure as appropriate commands to the
               server.
+              With SVPA_WORKERS > 1, start (or connect to) that many servers,
+              which share the memory budget; all of them receive the same
+              commands, so that any of them can answer probes.
   @param G the graph
   """
   def __init__(self, G):
-    # maxMemory is in MegaBytes.
-    # We need to set this here (if used in experiments), because OS-level
-    # rlimit settings mess up the JVM memory allocator
-    try:
-      maxMemory = int(os.environ.get("MAX_MEMORY", 32768));
-      maxMemory = max(maxMemory, 1024);
-    except:
-      maxMemory = 32768;
-
-    self.__server = spawn("java", \
-                          args=["-Xmx" + str(int(maxMemory * 0.65625)) + "m", \
-                                "-jar", \
-                                "../SVPAServer/SVPAServer.jar"], \
-                          timeout=None);
-    self.__server.setecho(False);
-    self.__graphNodes = set([]);
-
-    self.__expect([EXPECTED_PROMPT], "server could not be started");
-
-    # special extraction/encoding for entry node
-    (entryNode, isInterprocedural) = findGraphEntry(G);
-    toSend = "cfg\n";
-    toSend += "e," + entryNode + "\n";
+    self.__servers = [];
+    self.__sockets = [];
+    workers = getWorkerCount();
+    socketPath = os.environ.get("SVPA_SERVER_SOCKET", None);
+    if(socketPath):
+      for i in xrange(workers):
+        self.__servers.append(self.__connect(socketPath));
+      #end for
+    else:
+      # maxMemory is in MegaBytes.
+      # We need to set this here (if used in experiments), because OS-level
+      # rlimit settings mess up the JVM memory allocator
+      try:
+        maxMemory = int(os.environ.get("MAX_MEMORY", 32768));
+        maxMemory = max(maxMemory, 1024);
+      except:
+        maxMemory = 32768;
+
+      workerMemory = max(int(maxMemory * 0.65625 / workers), MIN_WORKER_MEMORY);
+      for i in xrange(workers):
+        self.__servers.append(self.__startServer(workerMemory));
+      #end for
+    #end if
 
-    # then, encode all edges in the CFG
-    for (n, attr) in G.nodes(True):
-      # don't export SDG-only nodes
-      if(not is_cfg_node(G, n)):
-        continue;
-      self.__graphNodes.add(n);
-
-      if(isInterprocedural and attr.get("kind", "") == "call-site"):
-        foundOne = False;
-        for (source, target, eAttr) in G.out_edges_iter([n], data=True):
-          if(eAttr.get("type", "flow") == "control" and \
-             eAttr.get("scope", "") == "interprocedural"):
-            # add special automata state for the "entry site":
-            # allows constraints to ignore call edges for matching
-            entrySite = ENTRY_PREFIX+target;
-            toSend += "c," + n + "," + entrySite + "\n";
-            toSend += "i," + entrySite + "," + target + "\n";
-            foundOne = True;
-          #end if
-        #end for
-
-        # add appropriate intraprocedural edges: only if
-        # (a) the called function is not in the graphml, or
-        # (b) the target is a crash point (which is essentially ambiguity
-        #     nonsensemeaning that we crashed trying to make the call itself)
-        for (source, target, attr) in G.out_edges_iter([n], data=True):
-          if(attr.get("type", "flow") == "flow" and \
-             attr.get("scope", "") != "interprocedural" and \
-             (not foundOne or G.node[target].get("kind", "") == "crash")):
-            toSend += "i," + n + "," + target + "\n";
-          #end if
-        #end for
-      elif(isInterprocedural and attr.get("kind", "") == "exit"):
-        entryForExit = findEntryForNode(G, n);
-        for (source, target, eAttr) in G.in_edges_iter([entryForExit], data=True):
-          if(eAttr.get("type", "flow") == "control" and \
-             eAttr.get("scope", "") == "interprocedural"):
-            # edge from exit -> all successors of the call to this function
-            for (call, callTarget, eAttr) in G.out_edges_iter([source], data=True):
-              if(eAttr.get("type", "flow") == "flow" and \
-                 eAttr.get("scope", "") != "interprocedural" and \
-                 G.node[callTarget].get("kind", "") != "crash"):
-                # add special automata state for the "return site":
-                # allows constraints to ignore return edges for matching
-                retSite = RETURN_PREFIX+call;
-                toSend += "r," + n + "," + retSite + "," + call + "\n";
-                toSend += "i," + retSite + "," + callTarget + "\n";
-              #end if
-            #end for
-          #end if
-        #end for
-      else:
-        for (source, target, eAttr) in G.out_edges_iter([n], data=True):
-          if(eAttr.get("type", "flow") == "flow" and \
-             eAttr.get("scope", "") != "interprocedural"):
-            toSend += "i," + n + "," + target + "\n";
-          #end if
-        #end for
-      #end if
+    for server in self.__servers:
+      self.__expect([EXPECTED_PROMPT], "server could not be started", server);
+    #end for
+
+    # special extraction/encoding for entry node, then all edges in the CFG
+    (cfgEdges, self.__graphNodes) = getSvpaCfgEdges(G);
+    toSend = "cfg\n";
+    for edge in cfgEdges:
+      toSend += ",".join([part for part in edge if part != None]) + "\n";
     #end for
 
     toSend += "END";
 
-    self.__server.sendline(toSend);
+    # servers with an SVPA_CACHE_DIR may already have built this CFG; the
+    # others build it from the text (and cache it for next time)
+    fingerprint = sha1(toSend).hexdigest();
+    for server in self.__servers:
+      server.sendline("cfgcached " + fingerprint);
+    #end for
+    missed = [];
+    for server in self.__servers:
+      result = self.__expect(["hit", "miss"],
+                             "unexpected result for cached CFG query", server);
+      self.__expect([EXPECTED_PROMPT], "cached CFG query failed", server);
+      if(result == 1):
+        missed.append(server);
+    #end for
 
-    # assert that the server didn't fail, and that the encoded CFG has
+    # assert that the servers didn't fail, and that the encoded CFG has
     # legal executions
-    self.__expect([EXPECTED_PROMPT], "failure on generated CFG input");
+    self.__sendToAll(toSend, "failure on generated CFG input", missed);
     assert(self.isSat());
   #end: __init__
 
@@ -187,24 +340,35 @@ class PexpectSvpaExecutionSolver(ExecutionSolver):
   __del__(): We do explicit clean-up of the opened stream to the Java-based
              SVPA server.  While using __del__ is frowned-upon in Python, cyclic
              references shouldn't be a problem, so we should be OK.
+             For a server daemon, closing the connection ends our session
+             (but leaves the daemon running).
   """
   def __del__(self):
-    self.__server.sendeof();
-    self.__server.terminate(force=True);
+    if(self.__sockets):
+      for serverSocket in self.__sockets:
+        serverSocket.close();
+      #end for
+    else:
+      for server in self.__servers:
+        server.sendeof();
+        server.terminate(force=True);
+      #end for
+    #end if
   #end: __del__
 
   """
   checkEmptyResult(): Parse the output for an emptiness query to the SVPA
                       server.  Should be called after sending the appropriate
                       query.
+  @param server the server the query was sent to (by default, the first one)
   @return whether or not the SVPA's language is empty
   """
-  def checkEmptyResult(self):
+  def checkEmptyResult(self, server=None):
     result = self.__expect(["true", "false"],
-                           "unexpected result for emptiness query");
+                           "unexpected result for emptiness query", server);
     assert(0 <= result <= 1);
 
-    self.__expect([EXPECTED_PROMPT], "no prompt after emptiness query");
+    self.__expect([EXPECTED_PROMPT], "no prompt after emptiness query", server);
     return(result == 0);
   #end: checkEmptyResult
 
@@ -214,7 +378,7 @@ class PexpectSvpaExecutionSolver(ExecutionSolver):
   @return whether or not the language accepted by the SVPA is empty
   """
   def isSat(self):
-    self.__server.sendline("empty");
+    self.__servers[0].sendline("empty");
     return(not self.checkEmptyResult());
   #end: isSat
 
@@ -269,11 +433,10 @@ class PexpectSvpaExecutionSolver(ExecutionSolver):
             => [{G.nodes}]
   """
   def encodeObsYes(self, possibleYes):
-    self.__server.sendline("constraint\n" + \
-                           self.genObsYesSVPA(possibleYes) + \
-                           "END");
-
-    self.__expect([EXPECTED_PROMPT], "error encoding obsYes entry");
+    self.__sendToAll("constraint\n" + \
+                     self.genObsYesSVPA(possibleYes) + \
+                     "END",
+                     "error encoding obsYes entry");
   #end: encodeObsYes
 
   """
@@ -307,11 +470,10 @@ class PexpectSvpaExecutionSolver(ExecutionSolver):
     #end for
 
     toSend += "END";
-    self.__server.sendline(toSend);
+    self.__sendToAll(toSend, "error encoding crash stack data");
 
     # assert that the encoded CFG still has legal executions (i.e. the crash
     # is reachable)
-    self.__expect([EXPECTED_PROMPT], "error encoding crash stack data");
     assert(self.isSat());
   #end: encodeCrash
 
@@ -346,45 +508,131 @@ class PexpectSvpaExecutionSolver(ExecutionSolver):
       exit(1);
     #end if
 
-    self.__server.sendline("constraint\n" + \
-                           self.genObsNoSVPA(obsNo) + \
-                           "END");
-
-    self.__expect([EXPECTED_PROMPT], "error encoding obsNo entry");
+    self.__sendToAll("constraint\n" + \
+                     self.genObsNoSVPA(obsNo) + \
+                     "END",
+                     "error encoding obsNo entry");
   #end: encodeObsNo
 
+  """
+  sendProbes(): Send the two emptiness probes (yes-executed and not-executed)
+                for one node, without waiting for their results.
+  @param n the node to probe
+  @param server the server to send to (by default, the first one)
+  """
+  def sendProbes(self, n, server=None):
+    if(server == None):
+      server = self.__servers[0];
+    #end if
+
+    server.send("probe empty\n" + \
+                self.genObsYesSVPA([[n]]) + \
+                "END\n" + \
+                "probe empty\n" + \
+                self.genObsNoSVPA(n) + \
+                "END\n");
+  #end: sendProbes
+
+  """
+  __nextReadyServer(): Find a server with results to read, waiting for one if
+  none has any yet.
+  @param inFlight each server's unanswered nodes, with the times their probes
+                  were sent (at least one server has some)
+  @return the server's index
+  """
+  def __nextReadyServer(self, inFlight):
+    busy = [w for w in xrange(len(self.__servers)) if inFlight[w]];
+    if(len(busy) == 1):
+      return(busy[0]);
+    #end if
+    # (output already read into a server's buffer is not seen by select)
+    for w in busy:
+      if(self.__servers[w].buffer):
+        return(w);
+      #end if
+    #end for
+    ready = select([self.__servers[w].child_fd for w in busy], [], [])[0];
+    for w in busy:
+      if(self.__servers[w].child_fd in ready):
+        return(w);
+      #end if
+    #end for
+    assert(False);
+  #end: __nextReadyServer
+
   """
   @override
   findKnownExecution(): Figure out which nodes in the CFG (a) are known to have
   executed at least once, (b) are known to have not executed, and (c) may or may
   not have executed given the crash location.
+  Probes are streamed: up to a window of nodes' probes is in flight at once
+  (per server), and each time a node's results are read, the next node's
+  probes are sent (before the results are processed, so the server keeps
+  working meanwhile).  With several servers, nodes are dealt out round-robin;
+  each server answers its own nodes in order, but results are read from
+  whichever server is ready first (so a slow server does not hold up the
+  others).  Each node's probe time runs from when its server could start on
+  it (when its probes were sent, or when the server's previous node was
+  answered, whichever is later) until its results are read, and so includes
+  the time spent waiting for the server.
+  @param queryNodes the nodes to classify (by default, all of them); other
+                    nodes are left out of the result
+                    => {G.nodes}
+  @param monitor a ProbeMonitor told about each node as it is classified
+                 (or None)
   @return (defYes, defNo, maybe)
              => ({G.nodes}, {G.nodes}, {G.nodes})
   """
-  def findKnownExecution(self):
+  def findKnownExecution(self, queryNodes=None, monitor=None):
+    if(monitor == None):
+      monitor = ProbeMonitor();
+    #end if
     defYes = set([]);
     defNo = set([]);
     maybe = set([]);
 
-    nodeList = list(self.__graphNodes);
-
-    # send all queries at once (saves immensely on communication time)
-    toSend = "";
-    for n in nodeList:
-      toSend += "probe empty\n";
-      toSend += self.genObsYesSVPA([[n]]);
-      toSend += "END\n";
-      toSend += "probe empty\n";
-      toSend += self.genObsNoSVPA(n);
-      toSend += "END\n";
+    nodeList = [n for n in self.__graphNodes \
+                  if queryNodes == None or n in queryNodes];
+    total = len(nodeList);
+    workers = len(self.__servers);
+    shards = [nodeList[w::workers] for w in xrange(workers)];
+
+    # fill the windows (inFlight holds each server's unanswered nodes, in
+    # the order it answers them, with the times their probes were sent)
+    sent = [];
+    inFlight = [];
+    for (server, shard) in zip(self.__servers, shards):
+      sent.append(min(getProbeWindow(), len(shard)));
+      inFlight.append(deque());
+      for n in shard[:sent[-1]]:
+        self.sendProbes(n, server);
+        inFlight[-1].append((n, time.time()));
+      #end for
     #end for
-    self.__server.send(toSend);
+    # (when each server last answered; none has yet)
+    answered = [0] * workers;
 
-    total = len(nodeList);
     soFar = 0;
-    for n in nodeList:
-      possibleYes = not self.checkEmptyResult();
-      possibleNo = not self.checkEmptyResult();
+    while(any(inFlight)):
+      # (probes still in flight are dropped along with the servers)
+      if(monitor.stopped()):
+        break;
+      #end if
+      w = self.__nextReadyServer(inFlight);
+      server = self.__servers[w];
+      (n, sendTime) = inFlight[w].popleft();
+      possibleYes = not self.checkEmptyResult(server);
+      possibleNo = not self.checkEmptyResult(server);
+      now = time.time();
+      monitor.timed(n, now - max(sendTime, answered[w]));
+      answered[w] = now;
+
+      # keep the window full
+      if(sent[w] < len(shards[w])):
+        self.sendProbes(shards[w][sent[w]], server);
+        inFlight[w].append((shards[w][sent[w]], time.time()));
+        sent[w] += 1;
+      #end if
 
       if(not possibleYes and not possibleNo):
         print >> stderr, ("ERROR: graph node " + n + " neither executed nor " +\
@@ -397,13 +645,13 @@ class PexpectSvpaExecutionSolver(ExecutionSolver):
       else:
         defNo.add(n);
 
+      monitor.probed(n, possibleYes, possibleNo);
+
       soFar += 1;
-      if(soFar % 10 == 0):
-        stdout.write("\r" + ("%.2f" % ((1.0*soFar)/(1.0*total)*100)) + "%: " + \
-                     str(soFar) + " / " + str(total));
-        stdout.flush();
-      #end if
-    #end for
+      stdout.write("\r" + ("%.2f" % ((1.0*soFar)/(1.0*total)*100)) + "%: " + \
+                   str(soFar) + " / " + str(total));
+      stdout.flush();
+    #end while
     print("");
 
     return(defYes, defNo, maybe);
@@ -413,9 +661,9 @@ class PexpectSvpaExecutionSolver(ExecutionSolver):
   printWitness(): Print an accepted execution from the current SVPA
   """
   def printWitness(self):
-    self.__server.sendline("witness");
+    self.__servers[0].sendline("witness");
 
     self.__expect([EXPECTED_PROMPT], "no prompt after witness query");
-    print self.__server.before;
+    print self.__servers[0].before;
   #end: printWitness
 #end: class PexpectSvpaExecutionSolver
@@ -0,0 +1,561 @@
+from bisect import bisect_left
+from heapq import heappush, heappushpop
+from signal import ITIMER_REAL, SIGALRM, setitimer, signal
+from sys import stderr
+import json
+import os
+import time
+
+from ResultCache import analysisBaseKey, analysisDigest
+from csilibs.clock import addReport
+from csilibs.graphlibs import function_id
+from csilibs.memory import currentMemory, getMemoryLimit, overMemoryLimit
+
+# by default, save checkpoints at most this often (in seconds)
+DEFAULT_CHECKPOINT_INTERVAL = 60;
+# check the memory limit at most this often (in seconds)
+MEMORY_CHECK_INTERVAL = 0.5;
+# by default, log this many of the slowest probes
+DEFAULT_SLOW_PROBES = 10;
+# the upper bounds (in seconds) of the probe latency histogram's buckets (the
+# last bucket has none)
+LATENCY_BUCKETS = [0.001, 0.01, 0.1, 1, 10];
+
+# raised (by a timer signal) when a probe runs out of time
+class ProbeTimeout(Exception):
+  pass;
+#end: class ProbeTimeout
+
+class ProbeMonitor:
+  """
+  resume(): Get the nodes that were classified already, e.g., by an earlier
+  (interrupted) run of the same analysis.
+  @return the classified nodes, each mapped to (possibleYes, possibleNo)
+             => {G.nodes : (bool, bool)}
+  """
+  def resume(self):
+    return({});
+  #end: resume
+
+  """
+  stopped(): Check whether findKnownExecution() should stop probing, leaving
+  the remaining nodes unclassified.
+  @return whether to stop
+  """
+  def stopped(self):
+    return(False);
+  #end: stopped
+
+  """
+  probe(): Run one node's probe(s).  Solvers whose probes can safely be
+  interrupted at any point run them through here.
+  @param node the node (of the solver's graph)
+  @param probeFunction the function computing (possibleYes, possibleNo)
+  @param args the arguments to probeFunction
+  @return (possibleYes, possibleNo), or None if the probe was interrupted
+  """
+  def probe(self, node, probeFunction, *args):
+    return(probeFunction(*args));
+  #end: probe
+
+  """
+  probed(): Called by findKnownExecution() each time it classifies a node.
+  @param node the node (of the solver's graph)
+  @param possibleYes whether the node may have executed
+  @param possibleNo whether the node may not have executed
+  """
+  def probed(self, node, possibleYes, possibleNo):
+    pass;
+  #end: probed
+
+  """
+  timed(): Called by findKnownExecution() with the time taken by each node's
+  (yes and no) probes.
+  @param node the node (of the solver's graph)
+  @param seconds the time taken
+  @param details what the solver knows about the probes' cost (a dictionary,
+                 e.g. the size of the node's SCC, or of the product searched),
+                 or {"interrupted" : True} if the probes were interrupted
+  """
+  def timed(self, node, seconds, details={}):
+    pass;
+  #end: timed
+
+  """
+  finished(): Called once all nodes are classified.
+  """
+  def finished(self):
+    pass;
+  #end: finished
+
+  """
+  completed(): Called after finished() if the result is complete (i.e., not
+  partial).
+  """
+  def completed(self):
+    pass;
+  #end: completed
+
+  """
+  isPartial(): Check whether some nodes were left unclassified (because
+  probing stopped, or probes were interrupted).
+  @return whether the result is partial
+  """
+  def isPartial(self):
+    return(False);
+  #end: isPartial
+#end: class ProbeMonitor
+
+class ProbeMonitors(ProbeMonitor):
+  __slots__ = "__monitors";
+
+  """
+  __init__(): Combine several monitors into one.
+  @param monitors the monitors
+  """
+  def __init__(self, monitors):
+    self.__monitors = list(monitors);
+  #end: __init__
+
+  """
+  @override
+  resume(): Get the nodes any of the monitors has classified already.
+  """
+  def resume(self):
+    done = {};
+    for monitor in self.__monitors:
+      done.update(monitor.resume());
+    #end for
+    return(done);
+  #end: resume
+
+  """
+  @override
+  stopped(): Stop if any of the monitors says to.
+  """
+  def stopped(self):
+    return(any([monitor.stopped() for monitor in self.__monitors]));
+  #end: stopped
+
+  """
+  @override
+  probe(): Run the probe through each of the monitors in turn.
+  """
+  def probe(self, node, probeFunction, *args):
+    for monitor in reversed(self.__monitors):
+      (probeFunction, args) = (monitor.probe, (node, probeFunction) + args);
+    #end for
+    return(probeFunction(*args));
+  #end: probe
+
+  """
+  @override
+  probed(): Tell each of the monitors about the node.
+  """
+  def probed(self, node, possibleYes, possibleNo):
+    for monitor in self.__monitors:
+      monitor.probed(node, possibleYes, possibleNo);
+    #end for
+  #end: probed
+
+  """
+  @override
+  timed(): Tell each of the monitors about the node's probe time.
+  """
+  def timed(self, node, seconds, details={}):
+    for monitor in self.__monitors:
+      monitor.timed(node, seconds, details);
+    #end for
+  #end: timed
+
+  """
+  @override
+  finished(): Tell each of the monitors that probing is done.
+  """
+  def finished(self):
+    for monitor in self.__monitors:
+      monitor.finished();
+    #end for
+  #end: finished
+
+  """
+  @override
+  completed(): Tell each of the monitors that the result is complete.
+  """
+  def completed(self):
+    for monitor in self.__monitors:
+      monitor.completed();
+    #end for
+  #end: completed
+
+  """
+  @override
+  isPartial(): The result is partial if any of the monitors says so.
+  """
+  def isPartial(self):
+    return(any([monitor.isPartial() for monitor in self.__monitors]));
+  #end: isPartial
+#end: class ProbeMonitors
+
+class ProbeBudget(ProbeMonitor):
+  __slots__ = "__deadline", "__probeTimeout", "__partial";
+
+  """
+  __init__(): Set up a time budget for one analysis, starting now.
+  @param budget the time for the whole analysis (in seconds), or None
+  @param probeTimeout the time for each node's probes (in seconds), or None
+  """
+  def __init__(self, budget=None, probeTimeout=None):
+    self.__deadline = (time.time() + budget) if budget != None else None;
+    self.__probeTimeout = probeTimeout;
+    self.__partial = False;
+  #end: __init__
+
+  """
+  @override
+  stopped(): Stop once the analysis' time is up.
+  """
+  def stopped(self):
+    if(self.__deadline != None and time.time() >= self.__deadline):
+      self.__partial = True;
+      return(True);
+    #end if
+    return(False);
+  #end: stopped
+
+  """
+  @override
+  probe(): Run a probe, interrupting it when either its own time or the
+  analysis' time is up.
+  """
+  def probe(self, node, probeFunction, *args):
+    timeout = self.__probeTimeout;
+    if(self.__deadline != None):
+      remaining = max(self.__deadline - time.time(), 0.001);
+      timeout = min(timeout, remaining) if timeout != None else remaining;
+    #end if
+    if(timeout == None):
+      return(probeFunction(*args));
+    #end if
+
+    def interrupt(signalNumber, frame):
+      raise ProbeTimeout();
+    #end: interrupt
+
+    previousHandler = signal(SIGALRM, interrupt);
+    try:
+      try:
+        setitimer(ITIMER_REAL, timeout);
+        return(probeFunction(*args));
+      finally:
+        setitimer(ITIMER_REAL, 0);
+      #end try
+    except ProbeTimeout:
+      self.__partial = True;
+      return(None);
+    finally:
+      signal(SIGALRM, previousHandler);
+    #end try
+  #end: probe
+
+  """
+  @override
+  isPartial(): The result is partial if probing stopped early, or some probe
+  was interrupted.
+  """
+  def isPartial(self):
+    return(self.__partial);
+  #end: isPartial
+#end: class ProbeBudget
+
+class ProbeMemoryLimit(ProbeMonitor):
+  __slots__ = "__lastCheck", "__partial";
+
+  """
+  __init__(): Stop probing once the soft memory limit (see
+  csilibs.memory.setMemoryLimit()) is exceeded.
+  """
+  def __init__(self):
+    self.__lastCheck = 0;
+    self.__partial = False;
+  #end: __init__
+
+  """
+  @override
+  stopped(): Stop once the analysis (with any processes it started) uses more
+  memory than the limit.  (Memory use is only checked every so often.)
+  """
+  def stopped(self):
+    if(self.__partial):
+      return(True);
+    elif(time.time() - self.__lastCheck < MEMORY_CHECK_INTERVAL):
+      return(False);
+    #end if
+
+    self.__lastCheck = time.time();
+    if(overMemoryLimit()):
+      print >> stderr, ("WARNING: memory use (" + \
+                        str(currentMemory() / 1024) + " MB) exceeds the " + \
+                        "limit (" + str(getMemoryLimit()) + " MB); " + \
+                        "stopping");
+      self.__partial = True;
+    #end if
+    return(self.__partial);
+  #end: stopped
+
+  """
+  @override
+  isPartial(): The result is partial if probing stopped early.
+  """
+  def isPartial(self):
+    return(self.__partial);
+  #end: isPartial
+#end: class ProbeMemoryLimit
+
+class ProbeLatency(ProbeMonitor):
+  __slots__ = "__name", "__functionInfo", "__slowCount", "__histogram", \
+              "__slowest", "__count", "__total", "__interrupted";
+
+  """
+  __init__(): Set up a histogram of one analysis' probe times, and a log of its
+  slowest probes.
+  @param name the analysis' name (e.g., its stage and solver)
+  @param functionInfo the file and name of each function, by id (as from
+                      ResultWriter.getFunctionInfo())
+  @param slowCount the number of slowest probes to log
+  """
+  def __init__(self, name, functionInfo={}, slowCount=DEFAULT_SLOW_PROBES):
+    self.__name = name;
+    self.__functionInfo = functionInfo;
+    self.__slowCount = slowCount;
+    self.__histogram = [0] * (len(LATENCY_BUCKETS) + 1);
+    self.__slowest = [];  # a min-heap of (seconds, node, details)
+    self.__count = 0;
+    self.__total = 0.0;
+    self.__interrupted = 0;
+  #end: __init__
+
+  """
+  @override
+  timed(): Add a node's probe time to the histogram, and to the log if it is
+  one of the slowest so far.  Interrupted probes are only counted (their
+  times are cut short).
+  """
+  def timed(self, node, seconds, details={}):
+    if(details.get("interrupted", False)):
+      self.__interrupted += 1;
+      return;
+    #end if
+    self.__histogram[bisect_left(LATENCY_BUCKETS, seconds)] += 1;
+    self.__count += 1;
+    self.__total += seconds;
+    if(len(self.__slowest) < self.__slowCount):
+      heappush(self.__slowest, (seconds, node, details));
+    elif(self.__slowCount > 0):
+      heappushpop(self.__slowest, (seconds, node, details));
+    #end if
+  #end: timed
+
+  """
+  getReport(): Get the histogram and the log of slowest probes.
+  @return {"probes" : int, "seconds" : float, "interrupted" : int,
+           "histogram" : [[upper bound (or None), count]],
+           "slowest" : [{"node" : str, "seconds" : float, "file" : str,
+                         "function" : str, ...details}]}
+  """
+  def getReport(self):
+    slowest = [];
+    for (seconds, node, details) in sorted(self.__slowest, reverse=True):
+      (fileName, procedure) = self.__functionInfo.get(function_id(node),
+                                                      (None, None));
+      entry = dict(details);
+      entry.update({"node" : node, "seconds" : round(seconds, 6),
+                    "file" : fileName, "function" : procedure});
+      slowest.append(entry);
+    #end for
+    return({"probes" : self.__count, "seconds" : round(self.__total, 6),
+            "interrupted" : self.__interrupted,
+            "histogram" : [list(bucket) for bucket \
+                           in zip(LATENCY_BUCKETS + [None], self.__histogram)],
+            "slowest" : slowest});
+  #end: getReport
+
+  """
+  @override
+  finished(): Print the histogram and the slowest probes, and record them for
+  the run's statistics (see csilibs.clock.writeStats()).
+  """
+  def finished(self):
+    report = self.getReport();
+    addReport(self.__name + ".probe latency", report);
+    if(not self.__count):
+      return;
+    #end if
+
+    print(self.__name + " probe latency (" + str(self.__count) + \
+          " probes, %0.3f s" % self.__total + \
+          ((", " + str(self.__interrupted) + " interrupted") \
+           if self.__interrupted else "") + "):");
+    lower = "0";
+    for (upper, count) in report["histogram"]:
+      label = ("<" + str(upper) + " s") if upper != None \
+                                       else (">=" + lower + " s");
+      print("  %-9s %d" % (label, count));
+      lower = str(upper);
+    #end for
+    print(self.__name + " slowest probes:");
+    for entry in report["slowest"]:
+      details = ", ".join([key + " " + str(value) for (key, value) \
+                           in sorted(entry.iteritems()) \
+                           if key not in ("node", "seconds", "file",
+                                          "function")]);
+      print("  %0.3f s: %s (%s in %s)%s" % \
+            (entry["seconds"], entry["node"], entry["function"],
+             entry["file"], (": " + details) if details else ""));
+    #end for
+  #end: finished
+#end: class ProbeLatency
+
+class ProbeCheckpoint(ProbeMonitor):
+  __slots__ = "__path", "__interval", "__results", "__lastSave", "__dirty";
+
+  """
+  __init__(): Set up a checkpoint file for the node classifications of one
+  analysis.
+  @param path the checkpoint file
+  @param interval the minimum time between saves (in seconds)
+  """
+  def __init__(self, path, interval=DEFAULT_CHECKPOINT_INTERVAL):
+    self.__path = path;
+    self.__interval = interval;
+    self.__results = {};
+    self.__lastSave = time.time();
+    self.__dirty = False;
+  #end: __init__
+
+  """
+  @override
+  resume(): Read the classifications saved by an earlier (interrupted) run of
+  the same analysis, if there was one.
+  """
+  def resume(self):
+    if(not os.path.exists(self.__path)):
+      return({});
+    #end if
+
+    try:
+      with open(self.__path, 'r') as openFile:
+        data = json.load(openFile);
+      #end with
+      self.__results = dict([(str(n), (bool(yes), bool(no))) \
+                             for (n, yes, no) in data["probed"]]);
+    except Exception as e:
+      print >> stderr, ("WARNING: ignoring unreadable checkpoint " + \
+                        self.__path + ": " + str(e));
+      self.__results = {};
+    #end try
+    return(dict(self.__results));
+  #end: resume
+
+  """
+  save(): Write all classifications so far to the checkpoint file.  Failing to
+  save is not an error.
+  """
+  def save(self):
+    data = {"probed" : [[n, yes, no] for (n, (yes, no)) \
+                                     in sorted(self.__results.iteritems())]};
+
+    # write then rename, so an interrupted save never loses the checkpoint
+    tempPath = self.__path + "." + str(os.getpid()) + ".tmp";
+    try:
+      with open(tempPath, 'w') as openFile:
+        json.dump(data, openFile, separators=(",", ":"));
+      #end with
+      os.rename(tempPath, self.__path);
+    except Exception as e:
+      print >> stderr, ("WARNING: could not write checkpoint " + \
+                        self.__path + ": " + str(e));
+    #end try
+    self.__lastSave = time.time();
+    self.__dirty = False;
+  #end: save
+
+  """
+  @override
+  probed(): Record a node's classification, saving the checkpoint if the last
+  save was long enough ago.
+  """
+  def probed(self, node, possibleYes, possibleNo):
+    self.__results[node] = (bool(possibleYes), bool(possibleNo));
+    self.__dirty = True;
+    if(time.time() - self.__lastSave >= self.__interval):
+      self.save();
+    #end if
+  #end: probed
+
+  """
+  @override
+  finished(): Save any classifications not saved yet.
+  """
+  def finished(self):
+    if(self.__dirty):
+      self.save();
+    #end if
+  #end: finished
+
+  """
+  @override
+  completed(): Delete the checkpoint file, which a complete result no longer
+  needs.  Failing to delete it is not an error.
+  """
+  def completed(self):
+    try:
+      if(os.path.exists(self.__path)):
+        os.remove(self.__path);
+      #end if
+    except OSError as e:
+      print >> stderr, ("WARNING: could not delete checkpoint " + \
+                        self.__path + ": " + str(e));
+    #end try
+  #end: completed
+#end: class ProbeCheckpoint
+
+class CheckpointDirectory:
+  __slots__ = "__checkpointDir", "__baseKey", "__interval";
+
+  """
+  __init__(): Set up a directory of checkpoints for analyses of the given graph
+  file with the given analysis options.
+  @param checkpointDir the checkpoint directory (which must exist)
+  @param graphFile the graph file
+  @param options the analysis options that affect results (a dictionary)
+  @param interval the minimum time between saves of a checkpoint (in seconds)
+  """
+  def __init__(self, checkpointDir, graphFile, options,
+               interval=DEFAULT_CHECKPOINT_INTERVAL):
+    if(not os.path.isdir(checkpointDir)):
+      print >> stderr, ("ERROR: checkpoint directory '" + checkpointDir + \
+                        "' is not a directory");
+      exit(1);
+    #end if
+    self.__checkpointDir = checkpointDir;
+    self.__baseKey = analysisBaseKey(graphFile, options);
+    self.__interval = interval;
+  #end: __init__
+
+  """
+  getCheckpoint(): Get the checkpoint for one analysis of one failure report.
+  @param solverName the solver (and the graph it analyzes, if that can differ)
+  @param crashStack the crashing stack
+  @param obsYes the obsYes observations
+  @param obsNo the obsNo observations
+  @return the checkpoint
+  """
+  def getCheckpoint(self, solverName, crashStack, obsYes, obsNo):
+    keyDigest = analysisDigest(self.__baseKey, solverName, crashStack, obsYes,
+                               obsNo);
+    return(ProbeCheckpoint(os.path.join(self.__checkpointDir,
+                                        keyDigest + ".checkpoint.json"),
+                           self.__interval));
+  #end: getCheckpoint
+#end: class CheckpointDirectory
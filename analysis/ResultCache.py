@@ -0,0 +1,181 @@
+from sys import stderr
+from hashlib import sha1
+import gzip
+import json
+import os
+
+from utils import failureReportDigest
+
+# the file holding the tool version (at the top of the source tree)
+VERSION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), \
+                            "..", "version");
+
+"""
+getToolVersion(): Get the version of this tool, as recorded in the "version"
+file.
+@return the version string (or "unknown" if the file is missing)
+"""
+def getToolVersion():
+  try:
+    with open(VERSION_FILE, 'r') as openFile:
+      return(openFile.read().strip());
+    #end with
+  except IOError:
+    return("unknown");
+#end: getToolVersion
+
+"""
+fileDigest(): Compute a content hash of a file.
+@param path the file
+@return the hex digest
+"""
+def fileDigest(path):
+  digest = sha1();
+  with open(path, 'rb') as openFile:
+    for block in iter(lambda: openFile.read(1 << 20), ""):
+      digest.update(block);
+    #end for
+  #end with
+  return(digest.hexdigest());
+#end: fileDigest
+
+"""
+analysisBaseKey(): Get the part of an analysis' key that is shared by all
+analyses of one graph file with the same options.
+@param graphFile the graph file
+@param options the analysis options that affect results (a dictionary)
+@return the base key (a dictionary)
+"""
+def analysisBaseKey(graphFile, options):
+  baseKey = dict(options);
+  baseKey["graph"] = fileDigest(graphFile);
+  baseKey["version"] = getToolVersion();
+  return(baseKey);
+#end: analysisBaseKey
+
+"""
+analysisDigest(): Compute a content hash identifying one analysis of one
+failure report.
+@param baseKey the base key (see analysisBaseKey())
+@param solverName the solver (as given on the command line)
+@param crashStack the crashing stack
+@param obsYes the obsYes observations
+@param obsNo the obsNo observations
+@return the hex digest
+"""
+def analysisDigest(baseKey, solverName, crashStack, obsYes, obsNo):
+  key = dict(baseKey);
+  key["solver"] = solverName;
+  key["report"] = failureReportDigest(crashStack, obsYes, obsNo);
+  return(sha1(json.dumps(key, sort_keys=True)).hexdigest());
+#end: analysisDigest
+
+class ResultCache:
+  __slots__ = "__cacheDir", "__baseKey";
+
+  """
+  __init__(): Set up a result cache in the given directory, for results of the
+  given graph file and analysis options.
+  @param cacheDir the cache directory (which must exist)
+  @param graphFile the graph file
+  @param options the analysis options that affect results (a dictionary)
+  """
+  def __init__(self, cacheDir, graphFile, options):
+    if(not os.path.isdir(cacheDir)):
+      print >> stderr, ("ERROR: result cache '" + cacheDir + "' is not a " + \
+                        "directory");
+      exit(1);
+    #end if
+    self.__cacheDir = cacheDir;
+    self.__baseKey = analysisBaseKey(graphFile, options);
+  #end: __init__
+
+  """
+  __cachePath(): Get the cache file for one analysis of one failure report.
+  @param solverName the solver (as given on the command line)
+  @param crashStack the crashing stack
+  @param obsYes the obsYes observations
+  @param obsNo the obsNo observations
+  @return the path of the cache file
+  """
+  def __cachePath(self, solverName, crashStack, obsYes, obsNo):
+    keyDigest = analysisDigest(self.__baseKey, solverName, crashStack, obsYes,
+                               obsNo);
+    return(os.path.join(self.__cacheDir, keyDigest + ".json.gz"));
+  #end: __cachePath
+
+  """
+  lookup(): Get the cached result of an analysis, if there is one.
+  @param solverName the solver (as given on the command line)
+  @param crashStack the crashing stack
+  @param obsYes the obsYes observations
+  @param obsNo the obsNo observations
+  @return the cached (defYes, defNo, maybe), or None
+             => ({G.nodes}, {G.nodes}, {G.nodes})
+  """
+  def lookup(self, solverName, crashStack, obsYes, obsNo):
+    entry = self.lookupEntry(solverName, crashStack, obsYes, obsNo);
+    return(entry[0] if entry != None else None);
+  #end: lookup
+
+  """
+  lookupEntry(): Get the cached result of an analysis, if there is one, along
+  with the details stored with it (see store()).
+  @param solverName the solver (as given on the command line)
+  @param crashStack the crashing stack
+  @param obsYes the obsYes observations
+  @param obsNo the obsNo observations
+  @return ((defYes, defNo, maybe), details), or None
+             => (({G.nodes}, {G.nodes}, {G.nodes}), {str : value})
+  """
+  def lookupEntry(self, solverName, crashStack, obsYes, obsNo):
+    path = self.__cachePath(solverName, crashStack, obsYes, obsNo);
+    if(not os.path.exists(path)):
+      return(None);
+    #end if
+
+    try:
+      with gzip.open(path, 'rb') as openFile:
+        data = json.load(openFile);
+      #end with
+      return((set(map(str, data["defYes"])), set(map(str, data["defNo"])), \
+              set(map(str, data["maybe"]))), data.get("details", {}));
+    except Exception as e:
+      print >> stderr, ("WARNING: ignoring unreadable cached result " + \
+                        path + ": " + str(e));
+      return(None);
+    #end try
+  #end: lookupEntry
+
+  """
+  store(): Save the result of an analysis in the cache.  Failing to save is not
+  an error.
+  @param solverName the solver (as given on the command line)
+  @param crashStack the crashing stack
+  @param obsYes the obsYes observations
+  @param obsNo the obsNo observations
+  @param result the (defYes, defNo, maybe) result
+  @param details other details of the analysis to store with the result (e.g.,
+                 which solver won a portfolio)
+  """
+  def store(self, solverName, crashStack, obsYes, obsNo, result, details={}):
+    path = self.__cachePath(solverName, crashStack, obsYes, obsNo);
+    (defYes, defNo, maybe) = result;
+    data = {"defYes" : sorted(defYes), \
+            "defNo" : sorted(defNo), \
+            "maybe" : sorted(maybe), \
+            "details" : details};
+
+    # write then rename, so concurrent runs never see a partial result
+    tempPath = path + "." + str(os.getpid()) + ".tmp";
+    try:
+      with gzip.open(tempPath, 'wb') as openFile:
+        json.dump(data, openFile, separators=(",", ":"));
+      #end with
+      os.rename(tempPath, path);
+    except Exception as e:
+      print >> stderr, ("WARNING: could not write cached result " + path + \
+                        ": " + str(e));
+    #end try
+  #end: store
+#end: class ResultCache
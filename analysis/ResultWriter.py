@@ -0,0 +1,148 @@
+from struct import pack
+from sys import stderr
+import json
+
+from csilibs.graphlibs import function_id, lines_from_node
+
+# the result styles written by this module (rather than printed by grissom)
+STREAMED_RESULT_STYLES = ["json", "binary"];
+
+# the binary format: a header (magic, version, flags), then one record per
+# function, then an end marker (see writeBinaryResult())
+BINARY_MAGIC = "CSIR";
+BINARY_VERSION = 1;
+BINARY_FLAG_PARTIAL = 1;
+BINARY_FLAG_UNQUERIED = 2;
+BINARY_END_MARKER = 0xFFFFFFFF;
+
+"""
+getFunctionInfo(): Find the file and name of each function in the graph.
+@param G the graph
+@return a map from function ids to (file, procedure), either of which may be
+        None if the graph doesn't say
+           => {int : (str, str)}
+"""
+def getFunctionInfo(G):
+  funcInfo = {};
+  for (n, attr) in G.nodes_iter(data=True):
+    if(attr.get("kind", "") == "entry"):
+      funcInfo[function_id(n)] = (attr.get("file", None) or None,
+                                  attr.get("procedure", None) or None);
+    #end if
+  #end for
+  return(funcInfo);
+#end: getFunctionInfo
+
+"""
+iterFunctionResults(): Group a result by function, and generate the lines of
+each function that are yes, no, maybe (and unqueried).  Functions are generated
+in order of file, then name, then id, and each function's nodes are only
+looked at when it is generated.
+@param data the (defYes, defNo, maybe) result
+@param G the graph (collapsed or not)
+@param unqueried the unqueried nodes (or None)
+@param lineTable the lines of each uncollapsed node (or None, to use G's)
+@return a generator of (file, procedure, funcId, lineSets), where lineSets are
+        the sorted yes, no, maybe, and unqueried lines
+"""
+def iterFunctionResults(data, G, unqueried=None, lineTable=None):
+  nodeSets = list(data) + ([unqueried] if unqueried != None else [set([])]);
+  funcNodes = {};  # {funcId : ([yesNodes], [noNodes], ...)}
+  for (i, nodeSet) in enumerate(nodeSets):
+    for n in nodeSet:
+      funcNodes.setdefault(function_id(n), ([], [], [], []))[i].append(n);
+    #end for
+  #end for
+
+  # (sort keys are computed once per function; None sorts first)
+  funcInfo = getFunctionInfo(G);
+  funcOrder = sorted([(funcInfo.get(funcId, (None, None)), funcId) \
+                      for funcId in funcNodes]);
+  for ((fileName, procedure), funcId) in funcOrder:
+    lineSets = [];
+    for nodes in funcNodes.pop(funcId):
+      lines = set([]);
+      for n in nodes:
+        nodeLines = lineTable.get(n, None) if lineTable != None \
+                                           else lines_from_node(G, n);
+        lines.update(nodeLines or []);
+      #end for
+      lines.discard(0);
+      lineSets.append(sorted(lines));
+    #end for
+    yield(fileName, procedure, funcId, lineSets);
+  #end for
+#end: iterFunctionResults
+
+"""
+writeJsonResult(): Write a result as a JSON document, one function at a time:
+  {"partial" : bool,
+   "functions" : [{"file" : str, "function" : str, "id" : int,
+                   "yes" : [int], "no" : [int], "maybe" : [int]
+                   (, "unqueried" : [int])}, ...]}
+@param data the (defYes, defNo, maybe) result
+@param G the graph (collapsed or not)
+@param outStream where to write
+@param unqueried the unqueried nodes (or None)
+@param partial whether the result is partial
+@param lineTable the lines of each uncollapsed node (or None, to use G's)
+"""
+def writeJsonResult(data, G, outStream, unqueried=None, partial=False,
+                    lineTable=None):
+  outStream.write("{\"partial\": " + json.dumps(partial) + \
+                  ", \"functions\": [");
+  separator = "\n";
+  for (fileName, procedure, funcId, lineSets) \
+      in iterFunctionResults(data, G, unqueried, lineTable):
+    record = {"file" : fileName, "function" : procedure, "id" : funcId,
+              "yes" : lineSets[0], "no" : lineSets[1], "maybe" : lineSets[2]};
+    if(unqueried != None):
+      record["unqueried"] = lineSets[3];
+    #end if
+    outStream.write(separator + json.dumps(record, sort_keys=True));
+    separator = ",\n";
+  #end for
+  outStream.write("\n]}\n");
+#end: writeJsonResult
+
+# Pack a string as a 32-bit length and its UTF-8 bytes (None is empty).
+def packString(value):
+  encoded = (value or "").encode("utf-8");
+  if(len(encoded) >= BINARY_END_MARKER):
+    print >> stderr, ("ERROR: name too long for a binary result (" + \
+                      str(len(encoded)) + " bytes)");
+    exit(1);
+  #end if
+  return(pack(">I", len(encoded)) + encoded);
+#end: packString
+
+"""
+writeBinaryResult(): Write a result in a compact binary format, one function
+at a time.  All numbers are big-endian.  The header is BINARY_MAGIC, then the
+version and flags (one byte each).  Each function's record is its file and
+name (packString()), its id (32 bits, signed), and then its yes, no, maybe,
+and unqueried lines, each as a 32-bit count followed by 32-bit (signed) line
+numbers.  The records end with a 32-bit BINARY_END_MARKER (in place of a file
+name length).
+@param data the (defYes, defNo, maybe) result
+@param G the graph (collapsed or not)
+@param outStream where to write (opened in binary mode)
+@param unqueried the unqueried nodes (or None)
+@param partial whether the result is partial
+@param lineTable the lines of each uncollapsed node (or None, to use G's)
+"""
+def writeBinaryResult(data, G, outStream, unqueried=None, partial=False,
+                      lineTable=None):
+  flags = (BINARY_FLAG_PARTIAL if partial else 0) | \
+          (BINARY_FLAG_UNQUERIED if unqueried != None else 0);
+  outStream.write(BINARY_MAGIC + pack(">BB", BINARY_VERSION, flags));
+  for (fileName, procedure, funcId, lineSets) \
+      in iterFunctionResults(data, G, unqueried, lineTable):
+    record = [packString(fileName), packString(procedure), pack(">i", funcId)];
+    for lines in lineSets:
+      record.append(pack(">I%di" % len(lines), len(lines), *lines));
+    #end for
+    outStream.write("".join(record));
+  #end for
+  outStream.write(pack(">I", BINARY_END_MARKER));
+#end: writeBinaryResult
@@ -1,6 +1,30 @@
 package svpaserver;
 
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.ByteArrayInputStream;
+import java.io.ByteArrayOutputStream;
+import java.io.DataInputStream;
+import java.io.DataOutputStream;
+import java.io.EOFException;
+import java.io.File;
+import java.io.FileInputStream;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.InputStream;
+import java.io.PrintStream;
 import java.lang.UnsupportedOperationException;
+import java.net.StandardProtocolFamily;
+import java.net.UnixDomainSocketAddress;
+import java.nio.channels.Channels;
+import java.nio.channels.ServerSocketChannel;
+import java.nio.channels.SocketChannel;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.nio.file.Paths;
+import java.nio.file.StandardCopyOption;
+import java.util.ArrayList;
 import java.util.Arrays;
 import java.util.Collection;
 import java.util.HashMap;
@@ -32,6 +56,26 @@ import utilities.Pair;
 
 public class SVPAServer {
   private static final String PROMPT = ">> ";
+
+  // text command switching a session to the framed binary protocol (see
+  // serveFramed())
+  private static final String FRAMED_COMMAND = "framed";
+  private static final byte OP_CFG = 1;
+  private static final byte OP_STACK = 2;
+  private static final byte OP_OBSYES = 3;
+  private static final byte OP_OBSNO = 4;
+  private static final byte OP_EMPTY = 5;
+  private static final byte OP_PROBE = 6;
+  private static final byte OP_WITNESS = 7;
+  private static final byte OP_CFG_CACHED = 8;
+  private static final byte STATUS_OK = 0;
+  private static final byte STATUS_ERROR = 1;
+
+  // cached CFG automata (see loadCachedCFGAutomaton()) live in the directory
+  // named by this environment variable (if set)
+  private static final String CACHE_DIR_VARIABLE = "SVPA_CACHE_DIR";
+  private static final String CACHE_FILE_SUFFIX = ".svpacfg";
+  private static final int CACHE_FORMAT_VERSION = 1;
   private static final String[] KEYREGEXES = {"end", "true", "false",
                                               "e", "i", "c", "r", "\\*",
                                               "obsno.*", "~.*"};
@@ -43,6 +87,20 @@ public class SVPAServer {
                                                         CharPred.MAX_CHAR,
                                                         true);
 
+  // when serving a single client on stdin/stdout, any error ends the process;
+  // in daemon mode, an error only ends the session that caused it
+  private static volatile boolean errorsAreFatal = true;
+
+  /**
+   * SessionAbortedException is thrown (instead of exiting) on errors in
+   * daemon mode.  It ends the current session only.
+   */
+  public static class SessionAbortedException extends RuntimeException {
+    public SessionAbortedException(String message, Throwable cause){
+      super(message, cause);
+    }
+  }
+
   // tracking the current automaton (all constraints so far are intersected in)
   // also keep a backup for probing
   private SVPA<ICharPred, Character> automaton;
@@ -59,14 +117,32 @@ public class SVPAServer {
   // meaningless outside of that context
   private Map<Character, Integer> nodeStateMap;
   private Integer nextState;
+  private Integer cfgInitialState;
+  // each CFG transition as {type, from, to, node, onStack node}, for caching
+  private List<int[]> cfgRecords;
+  // where to save the CFG automaton once it is built (if anywhere)
+  private String pendingCFGFingerprint;
 
   private boolean includesCFG;
   private boolean includesCrashStack;
 
+  // where results (and prompts) for this session are written
+  private PrintStream out;
+
   /**
    * SVPAServer() is the construtor.  It constructs.
    */
   public SVPAServer(){
+    this(System.out);
+  }
+
+  /**
+   * SVPAServer() constructs a server whose results go to the given stream.
+   *
+   * @param out the stream to write results to
+   */
+  public SVPAServer(PrintStream out){
+    this.out = out;
     automaton = null;
     stashedAutomaton = null;
     ba = new EqualitySolver();
@@ -77,62 +153,404 @@ public class SVPAServer {
 
     nodeStateMap = null;
     nextState = null;
+    cfgInitialState = null;
+    cfgRecords = null;
+    pendingCFGFingerprint = null;
 
     includesCFG = false;
     includesCrashStack = false;
   }
 
   public static void main(String[] args){
+    if(args.length == 2 && args[0].equals("-daemon")){
+      SVPAServer.errorsAreFatal = false;
+      SVPAServer.runDaemon(Paths.get(args[1]));
+      return;
+    }
+    else if(args.length != 0){
+      errorAndAbort("usage: SVPAServer [-daemon socket_path]");
+    }
+
     SVPAServer runner = new SVPAServer();
 
-    try(Scanner s = new Scanner(System.in)){
-      System.out.print(SVPAServer.PROMPT);
+    try{
+      runner.serve(System.in);
+    }
+    catch(Exception e){
+      errorAndAbort("something went terribly wrong", e);
+    }
+  }
 
-      while(s.hasNextLine()){
-        String command = s.nextLine().trim();
+  /**
+   * runDaemon() listens on a Unix domain socket, serving each connection as
+   * an independent session (with its own CFG and constraints) on its own
+   * thread.  A session lasts until its client closes the connection; the
+   * daemon runs until killed.
+   * NOTE: Unix domain socket channels require Java 16 or later.
+   *
+   * @param socketPath the path of the socket to create
+   */
+  private static void runDaemon(Path socketPath){
+    try(ServerSocketChannel listener =
+           ServerSocketChannel.open(StandardProtocolFamily.UNIX)){
+      // a leftover socket from an earlier daemon would make bind() fail
+      Files.deleteIfExists(socketPath);
+      listener.bind(UnixDomainSocketAddress.of(socketPath));
+      socketPath.toFile().deleteOnExit();
+      System.err.println("SVPA server listening on " + socketPath);
+
+      while(true){
+        final SocketChannel client = listener.accept();
+        Thread session = new Thread(() -> SVPAServer.runSession(client));
+        session.setDaemon(true);
+        session.start();
+      }
+    }
+    catch(IOException e){
+      System.err.println("ERROR: cannot serve on socket " + socketPath);
+      e.printStackTrace();
+      System.exit(1);
+    }
+  }
 
-        switch(command){
-          case "":
-            break;
-          case "cfg":
-            runner.readCFGAutomaton(s);
-            break;
-          case "stack":
-            runner.readStackAutomaton(s);
-            break;
-          case "constraint":
-            runner.readGenericAutomaton(s);
-            break;
-          case "witness":
-            runner.getAndPrintWitness();
-            break;
-          case "empty":
-            runner.getAndPrintEmpty();
-            break;
+  /**
+   * runSession() serves one daemon client until it disconnects (or until an
+   * error in its input, which is reported to the client before
+   * disconnecting).
+   *
+   * @param client the client's connection
+   */
+  private static void runSession(SocketChannel client){
+    try(SocketChannel channel = client;
+        InputStream in = Channels.newInputStream(channel);
+        PrintStream out = new PrintStream(Channels.newOutputStream(channel))){
+      try{
+        new SVPAServer(out).serve(in);
+      }
+      catch(SessionAbortedException e){
+        out.println("ERROR: " + e.getMessage());
+        out.flush();
+      }
+      catch(Exception e){
+        out.println("ERROR: something went terribly wrong: " + e);
+        out.flush();
+        e.printStackTrace();
+      }
+    }
+    catch(IOException e){
+      // nothing more to tell a client that is already gone
+    }
+  }
 
-          case "probe witness":
-            runner.stash();
-            runner.readGenericAutomaton(s);
-            runner.getAndPrintWitness();
-            runner.restore();
-            break;
-          case "probe empty":
-            runner.stash();
-            runner.readGenericAutomaton(s);
-            runner.getAndPrintEmpty();
-            runner.restore();
+  /**
+   * serve() runs the command loop for one session: read commands from the
+   * input, printing a prompt before each one, until the input is exhausted.
+   * The "framed" command switches the rest of the session to the framed
+   * binary protocol.
+   *
+   * @param in the input stream to read commands from
+   * @throws IOException if reading or writing framed data fails
+   */
+  public void serve(InputStream in) throws IOException {
+    Scanner s = new Scanner(in);
+    this.out.print(SVPAServer.PROMPT);
+    this.out.flush();
+
+    while(s.hasNextLine()){
+      String command = s.nextLine().trim();
+
+      switch(command){
+        case "":
+          break;
+        case "cfg":
+          this.readCFGAutomaton(s);
+          break;
+        case "stack":
+          this.readStackAutomaton(s);
+          break;
+        case "constraint":
+          this.readGenericAutomaton(s);
+          break;
+        case "witness":
+          this.getAndPrintWitness();
+          break;
+        case "empty":
+          this.getAndPrintEmpty();
+          break;
+
+        case "probe witness":
+          this.stash();
+          this.readGenericAutomaton(s);
+          this.getAndPrintWitness();
+          this.restore();
+          break;
+        case "probe empty":
+          this.stash();
+          this.readGenericAutomaton(s);
+          this.getAndPrintEmpty();
+          this.restore();
+          break;
+
+        case SVPAServer.FRAMED_COMMAND:
+          // the client sends nothing more until it reads this
+          // acknowledgement, so the Scanner has not buffered any framed data
+          this.out.println(SVPAServer.FRAMED_COMMAND);
+          this.out.flush();
+          this.serveFramed(in);
+          return;
+
+        default:
+          if(command.startsWith("cfgcached ")){
+            boolean hit = this.loadCachedCFGAutomaton(
+                             command.substring("cfgcached ".length()).trim());
+            this.out.println(hit ? "hit" : "miss");
             break;
+          }
+          errorAndAbort("invalid command '" + command + "'");
+      }
 
-          default:
-            errorAndAbort("invalid command '" + command + "'");
-        }
+      this.out.print(SVPAServer.PROMPT);
+      this.out.flush();
+    }
+  }
+
+  /**
+   * serveFramed() runs the command loop for a session using the framed binary
+   * protocol, until the input is exhausted.  Each request is
+   *   int32 length, byte opcode, payload
+   * and gets exactly one response
+   *   int32 length, byte status, payload
+   * where length counts the bytes that follow it, and all integers are
+   * big-endian.  Nodes are named by non-negative integer ids (chosen by the
+   * client); -1 stands for "no node".  Payloads by opcode are:
+   *   OP_CFG:     int32 count, then count * (byte type, int32 from, int32 to,
+   *               int32 onStack), with types as for the text CFG format
+   *               (unused nodes are -1)
+   *   OP_STACK:   int32 count, then count * (int32 call, int32 entry)
+   *   OP_OBSYES:  int32 groups, then groups * (int32 count, count * int32)
+   *   OP_OBSNO:   int32 node
+   *   OP_EMPTY:   (nothing); responds with byte 1 if empty, 0 if not
+   *   OP_PROBE:   int32 count, then count * int32 node; responds with
+   *               int32 count, then a bitset of 2*count bits (LSB first in
+   *               each byte), where bit 2k is set iff node k may have
+   *               executed and bit 2k+1 is set iff node k may not have
+   *   OP_WITNESS: (nothing); responds with int32 length, then that many
+   *               bytes of UTF-8 text (which, unlike a UTF string, may be
+   *               longer than 64KB)
+   *   OP_CFG_CACHED: UTF fingerprint; responds with byte 1 if the CFG was
+   *               loaded from the cache, 0 if it must be sent with OP_CFG
+   *               (see loadCachedCFGAutomaton())
+   * An error yields a response with STATUS_ERROR and a UTF message, and ends
+   * the session.
+   *
+   * @param rawIn the input stream to read requests from
+   * @throws IOException if reading requests or writing responses fails
+   */
+  public void serveFramed(InputStream rawIn) throws IOException {
+    DataInputStream in = new DataInputStream(new BufferedInputStream(rawIn));
+    DataOutputStream out =
+       new DataOutputStream(new BufferedOutputStream(this.out));
+
+    while(true){
+      int length;
+      try{
+        length = in.readInt();
+      }
+      catch(EOFException e){
+        return;
+      }
+      if(length < 1)
+        errorAndAbort("invalid framed request length " + length);
+      byte[] request = new byte[length];
+      in.readFully(request);
+
+      ByteArrayOutputStream responseBytes = new ByteArrayOutputStream();
+      DataOutputStream response = new DataOutputStream(responseBytes);
+      byte status = SVPAServer.STATUS_OK;
+      try{
+        this.handleFramedRequest(
+           new DataInputStream(new ByteArrayInputStream(request)), response);
+      }
+      catch(SessionAbortedException e){
+        responseBytes.reset();
+        response.writeUTF(e.getMessage());
+        status = SVPAServer.STATUS_ERROR;
+      }
+
+      out.writeInt(responseBytes.size() + 1);
+      out.writeByte(status);
+      responseBytes.writeTo(out);
+      out.flush();
+      if(status != SVPAServer.STATUS_OK)
+        return;
+    }
+  }
 
-        System.out.print(SVPAServer.PROMPT);
+  /**
+   * handleFramedRequest() carries out one framed request.
+   *
+   * @param request the request (starting at the opcode)
+   * @param response where to write the response payload
+   * @throws IOException if the request is truncated
+   */
+  private void handleFramedRequest(DataInputStream request,
+                                   DataOutputStream response)
+                                   throws IOException {
+    byte opcode = request.readByte();
+    switch(opcode){
+      case SVPAServer.OP_CFG: {
+        this.startCFGAutomaton();
+        Collection<SVPAMove<ICharPred, Character>> transitions =
+           new LinkedList<SVPAMove<ICharPred, Character>>();
+        int count = request.readInt();
+        for(int k = 0; k < count; k++){
+          String type = String.valueOf((char)request.readByte());
+          Character from = this.getNodeForId(request.readInt());
+          Character to = this.getNodeForId(request.readInt());
+          Character onStack = this.getNodeForId(request.readInt());
+          this.addCFGTransition(transitions, type, from, to, onStack,
+                                "framed CFG edge " + k);
+        }
+        if(this.cfgInitialState == null)
+          errorAndAbort("no entry node in framed CFG data");
+        this.finishCFGAutomaton(transitions);
+        break;
+      }
+      case SVPAServer.OP_STACK: {
+        this.startStackAutomaton();
+        List<Pair<Character, Character>> crashStack =
+               new LinkedList<Pair<Character, Character>>();
+        int count = request.readInt();
+        for(int k = 0; k < count; k++){
+          Character call = this.getNodeForId(request.readInt());
+          Character entry = this.getNodeForId(request.readInt());
+          if(call == null || ((entry == null) != (k == count-1)))
+            errorAndAbort("invalid framed crash stack frame " + k);
+          crashStack.add(new Pair<Character, Character>(call, entry));
+        }
+        this.finishStackAutomaton(crashStack);
+        break;
       }
+      case SVPAServer.OP_OBSYES:
+        this.updateAutomaton(this.readFramedObsYes(request));
+        break;
+      case SVPAServer.OP_OBSNO:
+        this.updateAutomaton(this.getObsNoAutomaton(
+                                this.readFramedNode(request)));
+        break;
+      case SVPAServer.OP_EMPTY:
+        response.writeByte(this.isEmpty() ? 1 : 0);
+        break;
+      case SVPAServer.OP_PROBE: {
+        int count = request.readInt();
+        List<Character> nodes = new ArrayList<Character>(count);
+        for(int k = 0; k < count; k++)
+          nodes.add(this.readFramedNode(request));
+
+        boolean[] empty = this.probeNodes(nodes);
+        byte[] bits = new byte[(2*count + 7) / 8];
+        for(int k = 0; k < 2*count; k++){
+          if(!empty[k])
+            bits[k / 8] |= 1 << (k % 8);
+        }
+        response.writeInt(count);
+        response.write(bits);
+        break;
+      }
+      case SVPAServer.OP_WITNESS: {
+        byte[] witness = this.getWitness().getBytes(StandardCharsets.UTF_8);
+        response.writeInt(witness.length);
+        response.write(witness);
+        break;
+      }
+      case SVPAServer.OP_CFG_CACHED:
+        response.writeByte(
+           this.loadCachedCFGAutomaton(request.readUTF()) ? 1 : 0);
+        break;
+      default:
+        errorAndAbort("invalid framed opcode " + opcode);
     }
-    catch(Exception e){
-      errorAndAbort("something went terribly wrong", e);
+  }
+
+  /**
+   * readFramedNode() reads a (required) node id from a framed constraint
+   * request.
+   *
+   * @param request the request
+   * @return the node
+   * @throws IOException if the request is truncated
+   */
+  private Character readFramedNode(DataInputStream request)
+                                   throws IOException {
+    this.requireCFGAndStack();
+    Character node = this.getNodeForId(request.readInt());
+    if(node == null)
+      errorAndAbort("missing node in framed constraint");
+    return(node);
+  }
+
+  /**
+   * readFramedObsYes() reads the groups of an obsYes constraint from a framed
+   * request, and builds the constraint automaton.
+   *
+   * @param request the request
+   * @return the obsYes automaton
+   * @throws IOException if the request is truncated
+   */
+  private SVPA<ICharPred, Character> readFramedObsYes(DataInputStream request)
+                                                      throws IOException {
+    List<List<Character>> groups = new ArrayList<List<Character>>();
+    int groupCount = request.readInt();
+    for(int k = 0; k < groupCount; k++){
+      List<Character> group = new ArrayList<Character>();
+      int count = request.readInt();
+      for(int m = 0; m < count; m++)
+        group.add(this.readFramedNode(request));
+      groups.add(group);
     }
+    return(this.getObsYesAutomaton(groups));
+  }
+
+  /**
+   * probeNodes() checks, for each node, whether the current automaton
+   * accepts any run that visits the node, and any run that does not.  The
+   * current automaton is left untouched (each probe intersects a fresh copy),
+   * so there is no need to stash and restore it between probes.
+   *
+   * @param nodes the nodes to probe
+   * @return for node k: [2k] is whether the yes-executed probe is empty, and
+   *         [2k+1] is whether the not-executed probe is empty
+   */
+  private boolean[] probeNodes(List<Character> nodes){
+    this.requireCFGAndStack();
+
+    boolean[] empty = new boolean[2 * nodes.size()];
+    int k = 0;
+    for(Character node : nodes){
+      List<List<Character>> groups = new ArrayList<List<Character>>();
+      groups.add(Arrays.asList(node));
+
+      empty[k++] = this.automaton.intersectionWith(
+                      this.getObsYesAutomaton(groups), this.ba).isEmpty;
+      empty[k++] = this.automaton.intersectionWith(
+                      this.getObsNoAutomaton(node), this.ba).isEmpty;
+    }
+    return(empty);
+  }
+
+  /**
+   * probeEmptiness() is the batch probing entry point for in-process (JPype)
+   * users: see probeNodes().
+   *
+   * @param nodeNames the names of the nodes to probe
+   * @return for node k: [2k] is whether the yes-executed probe is empty, and
+   *         [2k+1] is whether the not-executed probe is empty
+   */
+  public boolean[] probeEmptiness(String[] nodeNames){
+    List<Character> nodes = new ArrayList<Character>(nodeNames.length);
+    for(String name : nodeNames)
+      nodes.add(this.getOrAddNode(name));
+    return(this.probeNodes(nodes));
   }
 
   public void stash(){
@@ -155,36 +573,17 @@ public class SVPAServer {
   }
 
   private void readCFGAutomaton(Scanner s){
-    if(this.includesCFG)
-      errorAndAbort("multiple CFGs provided");
-    this.includesCFG = true;
+    this.startCFGAutomaton();
 
     Collection<SVPAMove<ICharPred, Character>> transitions =
        new LinkedList<SVPAMove<ICharPred, Character>>();
 
-    Integer initialState = null;
-    this.nodeStateMap = new HashMap<Character, Integer>();
-    this.nextState = 1;
-
     while(s.hasNextLine()){
       String line = s.nextLine().trim();
 
       boolean gotEnd = line.equalsIgnoreCase("END");
-      if(gotEnd && initialState != null){
-        SVPA<ICharPred, Character> cfgAutomaton = null;
-        try{
-          cfgAutomaton = SVPA.MkSVPA(transitions, Arrays.asList(initialState),
-                                     this.nodeStateMap.values(), this.ba);
-        }
-        catch(Exception e){
-          errorAndAbort("Couldn't make the CFG automaton!", e);
-        }
-
-        // clear the junk (these are meaningless outside this method)
-        this.nodeStateMap = null;
-        this.nextState = null;
-
-        this.updateAutomaton(cfgAutomaton);
+      if(gotEnd && this.cfgInitialState != null){
+        this.finishCFGAutomaton(transitions);
         return;
       }
       else if(gotEnd){
@@ -197,78 +596,330 @@ public class SVPAServer {
         errorAndAbort("invalid line in CFG data:\n" + line);
 
       Character from = null;
-      Integer fromState = null;
       Character to = null;
-      Integer toState = null;
       Character onStack = null;
-      Integer onStackState = null;
       switch(lineParts.length){
         case 4:
           onStack = this.getOrAddNode(lineParts[3].trim());
-          onStackState = this.getOrAddState(onStack);
         case 3:
           to = this.getOrAddNode(lineParts[2].trim());
-          toState = this.getOrAddState(to);
         case 2:
           from = this.getOrAddNode(lineParts[1].trim());
-          fromState = this.getOrAddState(from);
           break;
         default:
           errorAndAbort("critical late invalid CFG line:\n");
       }
 
-      switch(lineParts[0].trim().toLowerCase()){
-        case "e":
-          if(initialState != null)
-            errorAndAbort("multiple entry nodes defined!\nSecond was: " + line);
+      this.addCFGTransition(transitions, lineParts[0].trim().toLowerCase(),
+                            from, to, onStack, line);
+    }
 
-          if(from == null || to != null || onStack != null)
-            errorAndAbort("invalid 'entry' line in CFG:\n" + line);
+    errorAndAbort("end of input reached while reading cfg");
+  }
 
-          initialState = 0;
-          transitions.add(new Internal<ICharPred, Character>(0, fromState,
-                                                           new CharPred(from)));
-          break;
-        case "i":
-          if(from == null || to == null || onStack != null)
-            errorAndAbort("invalid 'internal' line in CFG:\n" + line);
+  /**
+   * startCFGAutomaton() prepares for reading the (one and only) CFG.
+   */
+  private void startCFGAutomaton(){
+    if(this.includesCFG)
+      errorAndAbort("multiple CFGs provided");
+    this.includesCFG = true;
 
-          transitions.add(new Internal<ICharPred, Character>(fromState, toState,
-                                                             new CharPred(to)));
-          break;
-        case "c":
-          if(from == null || to == null || onStack != null)
-            errorAndAbort("invalid 'call' line in CFG:\n" + line);
+    this.nodeStateMap = new HashMap<Character, Integer>();
+    this.nextState = 1;
+    this.cfgInitialState = null;
+    this.cfgRecords = new ArrayList<int[]>();
+  }
 
-          transitions.add(new Call<ICharPred, Character>(fromState, toState,
-                                                         0,
-                                                         new CharPred(from)));
-          break;
-        case "r":
-          if(from == null || to == null || onStack == null)
-            errorAndAbort("invalid 'return' line in CFG:\n" + line);
-
-          transitions.add(new Return<ICharPred, Character>(fromState,
-                                 toState,
-                                 0,
-                                 new BinaryCharPred(new CharPred(onStack,
-                                                                 true),
-                                                    true)));
-          
-          break;
-        default:
-          errorAndAbort("invalid cfg line (wrong # parts):\n" + line);
+  /**
+   * addCFGTransition() adds the transition for one CFG edge (or the entry).
+   * WARNING: This method should only be used between startCFGAutomaton() and
+   * finishCFGAutomaton().
+   *
+   * @param transitions the CFG transitions so far (will be extended)
+   * @param type the kind of edge: 'e' (entry), 'i' (internal), 'c' (call), or
+   *             'r' (return)
+   * @param from the source node (or the entry node for 'e')
+   * @param to the target node (null for 'e')
+   * @param onStack the call node for a return (null otherwise)
+   * @param description the edge as given by the user (for error messages)
+   */
+  private void addCFGTransition(
+       Collection<SVPAMove<ICharPred, Character>> transitions,
+       String type,
+       Character from,
+       Character to,
+       Character onStack,
+       String description){
+    Integer onStackState = (onStack == null) ? null :
+                                               this.getOrAddState(onStack);
+    Integer toState = (to == null) ? null : this.getOrAddState(to);
+    Integer fromState = (from == null) ? null : this.getOrAddState(from);
+
+    switch(type){
+      case "e":
+        if(this.cfgInitialState != null)
+          errorAndAbort("multiple entry nodes defined!\nSecond was: " +
+                        description);
+
+        if(from == null || to != null || onStack != null)
+          errorAndAbort("invalid 'entry' line in CFG:\n" + description);
+
+        this.cfgInitialState = 0;
+        this.addCFGRecord(transitions, 'i', 0, fromState, from, null);
+        break;
+      case "i":
+        if(from == null || to == null || onStack != null)
+          errorAndAbort("invalid 'internal' line in CFG:\n" + description);
+
+        this.addCFGRecord(transitions, 'i', fromState, toState, to, null);
+        break;
+      case "c":
+        if(from == null || to == null || onStack != null)
+          errorAndAbort("invalid 'call' line in CFG:\n" + description);
+
+        this.addCFGRecord(transitions, 'c', fromState, toState, from, null);
+        break;
+      case "r":
+        if(from == null || to == null || onStack == null)
+          errorAndAbort("invalid 'return' line in CFG:\n" + description);
+
+        this.addCFGRecord(transitions, 'r', fromState, toState, null, onStack);
+        break;
+      default:
+        errorAndAbort("invalid cfg line (wrong # parts):\n" + description);
+    }
+  }
+
+  /**
+   * addCFGRecord() adds one CFG transition, and remembers it (in a compact
+   * form) in case the CFG is to be cached.
+   *
+   * @param transitions the CFG transitions so far (will be extended)
+   * @param type 'i' (internal), 'c' (call), or 'r' (return)
+   * @param fromState the source state
+   * @param toState the target state
+   * @param node the node on the transition (null for returns)
+   * @param onStack the call node for a return (null otherwise)
+   */
+  private void addCFGRecord(
+       Collection<SVPAMove<ICharPred, Character>> transitions,
+       char type,
+       int fromState,
+       int toState,
+       Character node,
+       Character onStack){
+    int[] record = {type, fromState, toState,
+                    (node == null) ? -1 : node.charValue(),
+                    (onStack == null) ? -1 : onStack.charValue()};
+    this.cfgRecords.add(record);
+    transitions.add(SVPAServer.cfgMoveFromRecord(record));
+  }
+
+  /**
+   * cfgMoveFromRecord() builds the CFG transition described by a record (see
+   * addCFGRecord()).
+   *
+   * @param record the record
+   * @return the transition
+   */
+  private static SVPAMove<ICharPred, Character> cfgMoveFromRecord(
+       int[] record){
+    switch(record[0]){
+      case 'i':
+        return(new Internal<ICharPred, Character>(record[1], record[2],
+                   new CharPred((char)record[3])));
+      case 'c':
+        return(new Call<ICharPred, Character>(record[1], record[2], 0,
+                   new CharPred((char)record[3])));
+      case 'r':
+        return(new Return<ICharPred, Character>(record[1], record[2], 0,
+                   new BinaryCharPred(new CharPred((char)record[4], true),
+                                      true)));
+      default:
+        errorAndAbort("invalid CFG transition type '" + (char)record[0] + "'");
+        return(null);
+    }
+  }
+
+  /**
+   * finishCFGAutomaton() builds the CFG automaton from its transitions and
+   * intersects it in (saving it to the cache, if requested).
+   *
+   * @param transitions the CFG transitions
+   */
+  private void finishCFGAutomaton(
+       Collection<SVPAMove<ICharPred, Character>> transitions){
+    SVPA<ICharPred, Character> cfgAutomaton = null;
+    Collection<Integer> finalStates = this.nodeStateMap.values();
+    try{
+      cfgAutomaton = SVPA.MkSVPA(transitions,
+                                 Arrays.asList(this.cfgInitialState),
+                                 finalStates, this.ba);
+    }
+    catch(Exception e){
+      errorAndAbort("Couldn't make the CFG automaton!", e);
+    }
+
+    if(this.pendingCFGFingerprint != null)
+      this.saveCachedCFGAutomaton(this.pendingCFGFingerprint, finalStates);
+
+    // clear the junk (these are meaningless outside this context)
+    this.nodeStateMap = null;
+    this.nextState = null;
+    this.cfgInitialState = null;
+    this.cfgRecords = null;
+    this.pendingCFGFingerprint = null;
+
+    this.updateAutomaton(cfgAutomaton);
+  }
+
+  /**
+   * getCacheFile() gets the cache file for a CFG fingerprint.
+   *
+   * @param fingerprint the fingerprint (a hex digest)
+   * @return the file, or null if caching is disabled
+   */
+  private static File getCacheFile(String fingerprint){
+    String cacheDir = System.getenv(SVPAServer.CACHE_DIR_VARIABLE);
+    if(cacheDir == null || cacheDir.isEmpty())
+      return(null);
+    if(!fingerprint.matches("[0-9a-fA-F]+"))
+      errorAndAbort("invalid CFG fingerprint '" + fingerprint + "'");
+
+    return(new File(cacheDir, fingerprint + SVPAServer.CACHE_FILE_SUFFIX));
+  }
+
+  /**
+   * loadCachedCFGAutomaton() loads the CFG automaton for the given graph
+   * fingerprint from the cache directory (SVPA_CACHE_DIR), if it is there.
+   * If it is not, the CFG must be provided as usual next, and it will then be
+   * saved to the cache under this fingerprint.
+   * A cache entry holds the node table and the transitions of the CFG
+   * automaton in a compact binary form, so a hit skips sending, parsing, and
+   * numbering the CFG.
+   * NOTE: this must come before any other input (so that the cached node
+   *       table is the whole node table).
+   *
+   * @param fingerprint a hex digest identifying the CFG
+   * @return whether the CFG automaton was loaded
+   */
+  public boolean loadCachedCFGAutomaton(String fingerprint){
+    File cacheFile = SVPAServer.getCacheFile(fingerprint);
+    if(cacheFile == null || this.includesCFG || !this.nodeNameMap.isEmpty())
+      return(false);
+
+    this.pendingCFGFingerprint = fingerprint;
+    if(!cacheFile.exists())
+      return(false);
+
+    Collection<SVPAMove<ICharPred, Character>> transitions =
+       new LinkedList<SVPAMove<ICharPred, Character>>();
+    List<Integer> finalStates = new ArrayList<Integer>();
+    List<String> names = new ArrayList<String>();
+    int initialState;
+    try(DataInputStream in = new DataInputStream(new BufferedInputStream(
+                                new FileInputStream(cacheFile)))){
+      if(in.readInt() != SVPAServer.CACHE_FORMAT_VERSION)
+        return(false);
+
+      int nameCount = in.readInt();
+      for(int k = 0; k < nameCount; k++)
+        names.add(in.readUTF());
+
+      initialState = in.readInt();
+      int finalCount = in.readInt();
+      for(int k = 0; k < finalCount; k++)
+        finalStates.add(in.readInt());
+
+      int transitionCount = in.readInt();
+      for(int k = 0; k < transitionCount; k++){
+        int[] record = {in.readByte(), in.readInt(), in.readInt(),
+                        in.readInt(), in.readInt()};
+        transitions.add(SVPAServer.cfgMoveFromRecord(record));
       }
     }
+    catch(IOException e){
+      System.err.println("WARNING: ignoring unreadable cached CFG " +
+                         cacheFile + ": " + e);
+      return(false);
+    }
 
-    errorAndAbort("end of input reached while reading cfg");
+    SVPA<ICharPred, Character> cfgAutomaton = null;
+    try{
+      cfgAutomaton = SVPA.MkSVPA(transitions, Arrays.asList(initialState),
+                                 finalStates, this.ba);
+    }
+    catch(Exception e){
+      errorAndAbort("Couldn't make the cached CFG automaton!", e);
+    }
+
+    // node characters are handed out in order, so re-adding the names in
+    // order recreates exactly the same node table
+    for(String name : names){
+      Character thisChar = this.nextChar++;
+      this.nodeNameMap.put(name, thisChar);
+      this.nameNodeMap.put(thisChar, name);
+    }
+
+    this.includesCFG = true;
+    this.pendingCFGFingerprint = null;
+    this.updateAutomaton(cfgAutomaton);
+    return(true);
+  }
+
+  /**
+   * saveCachedCFGAutomaton() saves the CFG automaton being built to the cache
+   * (see loadCachedCFGAutomaton()).  Failing to save is not an error.
+   *
+   * @param fingerprint the fingerprint to save under
+   * @param finalStates the final states of the CFG automaton
+   */
+  private void saveCachedCFGAutomaton(String fingerprint,
+                                      Collection<Integer> finalStates){
+    File cacheFile = SVPAServer.getCacheFile(fingerprint);
+    if(cacheFile == null)
+      return;
+
+    try{
+      // write then rename, so concurrent sessions never see a partial file
+      File tempFile = File.createTempFile(fingerprint, ".tmp",
+                                          cacheFile.getParentFile());
+      try(DataOutputStream out = new DataOutputStream(new BufferedOutputStream(
+                                    new FileOutputStream(tempFile)))){
+        out.writeInt(SVPAServer.CACHE_FORMAT_VERSION);
+
+        out.writeInt(this.nameNodeMap.size());
+        for(char c = Character.MIN_VALUE; c != this.nextChar; c++)
+          out.writeUTF(this.nameNodeMap.get(c));
+
+        out.writeInt(this.cfgInitialState);
+        out.writeInt(finalStates.size());
+        for(Integer state : finalStates)
+          out.writeInt(state);
+
+        out.writeInt(this.cfgRecords.size());
+        for(int[] record : this.cfgRecords){
+          out.writeByte(record[0]);
+          for(int k = 1; k < record.length; k++)
+            out.writeInt(record[k]);
+        }
+      }
+      Files.move(tempFile.toPath(), cacheFile.toPath(),
+                 StandardCopyOption.ATOMIC_MOVE,
+                 StandardCopyOption.REPLACE_EXISTING);
+    }
+    catch(IOException e){
+      System.err.println("WARNING: could not cache CFG automaton in " +
+                         cacheFile + ": " + e);
+    }
   }
 
   /**
    * getOrAddState() gets the integer state number for the node specified
    * (adding it if "node" is new).
    * WARNING: This method should not be used by *anyone* except
-   * readCFGAutomaton().  It is specific to that context.
+   * addCFGTransition().  It is specific to that context.
    */
   private int getOrAddState(Character node){
     if(node == null)
@@ -281,9 +932,7 @@ public class SVPAServer {
   }
 
   private void readStackAutomaton(Scanner s){
-    if(this.includesCrashStack)
-      errorAndAbort("multiple crashing stacks provided");
-    this.includesCrashStack = true;
+    this.startStackAutomaton();
 
     List<Pair<Character, Character>> crashStack =
            new LinkedList<Pair<Character, Character>>();
@@ -294,18 +943,7 @@ public class SVPAServer {
 
       boolean gotEnd = line.equalsIgnoreCase("END");
       if(gotEnd && expectEnd){
-        SVPA<ICharPred, Character> stackAutomaton = null;
-        try{
-          BinaryCharPred equality = new BinaryCharPred(StdCharPred.TRUE, false);
-          stackAutomaton = getCrashStackAutomata(crashStack, StdCharPred.TRUE,
-                                                 StdCharPred.TRUE,
-                                                 equality, this.ba);
-        }
-        catch(Exception e){
-          errorAndAbort("Couldn't make the stack automaton!", e);
-        }
-
-        this.updateAutomaton(stackAutomaton);
+        this.finishStackAutomaton(crashStack);
         return;
       }
       else if(expectEnd){
@@ -337,6 +975,48 @@ public class SVPAServer {
     errorAndAbort("end of input reached while reading stack");
   }
 
+  /**
+   * startStackAutomaton() prepares for reading the (one and only) crash stack.
+   */
+  private void startStackAutomaton(){
+    if(this.includesCrashStack)
+      errorAndAbort("multiple crashing stacks provided");
+    this.includesCrashStack = true;
+  }
+
+  /**
+   * finishStackAutomaton() builds the automaton for the crash stack and
+   * intersects it in.
+   *
+   * @param crashStack the crashing stack (see getCrashStackAutomata())
+   */
+  private void finishStackAutomaton(
+       List<Pair<Character, Character>> crashStack){
+    SVPA<ICharPred, Character> stackAutomaton = null;
+    try{
+      BinaryCharPred equality = new BinaryCharPred(StdCharPred.TRUE, false);
+      stackAutomaton = getCrashStackAutomata(crashStack, StdCharPred.TRUE,
+                                             StdCharPred.TRUE,
+                                             equality, this.ba);
+    }
+    catch(Exception e){
+      errorAndAbort("Couldn't make the stack automaton!", e);
+    }
+
+    this.updateAutomaton(stackAutomaton);
+  }
+
+  /**
+   * requireCFGAndStack() checks that the CFG and crash stack were given (they
+   * must come before any other constraints).
+   */
+  private void requireCFGAndStack(){
+    if(!this.includesCFG || !this.includesCrashStack){
+      errorAndAbort("both CFG and crash stack must be provided before " +
+                    "other constraints");
+    }
+  }
+
   /**
    * readGenericAutomaton() reads a generic SVPA constraint from the input.
    *
@@ -358,10 +1038,7 @@ public class SVPAServer {
    * @param s the input Scanner to read from
    */
   private void readGenericAutomaton(Scanner s){
-    if(!this.includesCFG || !this.includesCrashStack){
-      errorAndAbort("both CFG and crash stack must be provided before " +
-                    "other constraints");
-    }
+    this.requireCFGAndStack();
 
     if(!s.hasNextLine())
       errorAndAbort("no input provided while reading generic automaton");
@@ -540,11 +1217,22 @@ public class SVPAServer {
     if(lineParts.length != 2)
       errorAndAbort("invalid obsNo entry:\n" + line);
 
+    this.updateAutomaton(this.getObsNoAutomaton(
+                            getOrAddNode(lineParts[1].trim())));
+  }
+
+  /**
+   * getObsNoAutomaton() builds the automaton accepting all runs that never
+   * visit the given node.
+   *
+   * @param entry the node that was not executed
+   * @return the obsNo automaton
+   */
+  private SVPA<ICharPred, Character> getObsNoAutomaton(Character entry){
     Collection<SVPAMove<ICharPred, Character>> transitions =
        new LinkedList<SVPAMove<ICharPred, Character>>();
 
     // predicates to accept all characters except the "obsNo" node
-    Character entry = getOrAddNode(lineParts[1].trim());
     final CharPred withoutEntry = allCharsExcept(entry, false);
     final CharPred withoutEntryRet = allCharsExcept(entry, true);
 
@@ -561,7 +1249,64 @@ public class SVPAServer {
       errorAndAbort("Couldn't make obsNo automaton!", e);
     }
 
-    this.updateAutomaton(obsNoAutomaton);
+    return(obsNoAutomaton);
+  }
+
+  /**
+   * getObsYesAutomaton() builds the automaton accepting all runs that visit
+   * at least one node of each group, in order (the same automaton that
+   * PexpectSvpaExecutionSolver.genObsYesSVPA() describes in text form).
+   *
+   * @param groups the possible matches for each observed entry
+   * @return the obsYes automaton
+   */
+  private SVPA<ICharPred, Character> getObsYesAutomaton(
+       List<List<Character>> groups){
+    Collection<SVPAMove<ICharPred, Character>> transitions =
+       new LinkedList<SVPAMove<ICharPred, Character>>();
+
+    int currentState = 0;
+    for(List<Character> group : groups){
+      addObsYesSelfLoops(transitions, currentState);
+      for(Character node : group){
+        // only need internal edges because of the special nodes for return
+        // targets and entry nodes in the CFG
+        transitions.add(new Internal<ICharPred, Character>(
+                               currentState, currentState+1,
+                               new CharPred(node, false)));
+      }
+      currentState++;
+    }
+    // no constraints after the final obsYes entry
+    addObsYesSelfLoops(transitions, currentState);
+
+    SVPA<ICharPred, Character> obsYesAutomaton = null;
+    try{
+      obsYesAutomaton = SVPA.MkSVPA(transitions, Arrays.asList(0),
+                                    Arrays.asList(currentState), this.ba);
+    }
+    catch(Exception e){
+      errorAndAbort("Couldn't make obsYes automaton!", e);
+    }
+
+    return(obsYesAutomaton);
+  }
+
+  /**
+   * addObsYesSelfLoops() adds '*' self-loops (internal, call, and return) on
+   * one state of an obsYes automaton.
+   *
+   * @param transitions the list of transitions (will be extended)
+   * @param state the state
+   */
+  private static void addObsYesSelfLoops(
+       Collection<SVPAMove<ICharPred, Character>> transitions, int state){
+    transitions.add(new Internal<ICharPred, Character>(
+                           state, state, allCharsExcept(null, false)));
+    transitions.add(new Call<ICharPred, Character>(
+                           state, state, 0, allCharsExcept(null, false)));
+    transitions.add(new Return<ICharPred, Character>(
+                           state, state, 0, allCharsExcept(null, true)));
   }
 
   /**
@@ -606,11 +1351,11 @@ public class SVPAServer {
 
 
   private void getAndPrintWitness(){
-    System.out.println(getWitness());
+    this.out.println(getWitness());
   }
 
   private void getAndPrintEmpty(){
-    System.out.println(this.isEmpty() ? "true" : "false");
+    this.out.println(this.isEmpty() ? "true" : "false");
   }
 
   public String getWitness(){
@@ -659,6 +1404,30 @@ public class SVPAServer {
     return(this.getNode(name));
   }
 
+  /**
+   * getNodeForId() gets (adding it if new) the node for an integer node id
+   * from the framed protocol.  Ids are named by their decimal strings, which
+   * never clash with keywords, so there is no need to check them.
+   *
+   * @param id the node id, or -1 for none
+   * @return the node, or null if id is -1
+   */
+  private Character getNodeForId(int id){
+    if(id == -1)
+      return(null);
+    else if(id < 0)
+      errorAndAbort("invalid node id " + id);
+
+    String name = Integer.toString(id);
+    Character result = this.nodeNameMap.get(name);
+    if(result == null){
+      result = this.nextChar++;
+      this.nodeNameMap.put(name, result);
+      this.nameNodeMap.put(result, name);
+    }
+    return(result);
+  }
+
   private Character getNode(String name){
     Character result = this.nodeNameMap.get(name);
     if(result == null){
@@ -835,6 +1604,9 @@ public class SVPAServer {
 
   private static void errorAndAbort(String message, Throwable e){
     assert(message != null);
+    if(!SVPAServer.errorsAreFatal)
+      throw new SessionAbortedException(message, e);
+
     System.err.println("ERROR: " + message);
 
     if(e != null)
@@ -0,0 +1,180 @@
+from collections import defaultdict
+from cProfile import Profile
+from signal import ITIMER_PROF, SIGPROF, setitimer, siginterrupt, signal
+from sys import stderr
+import atexit
+import os
+
+# the stages of an analysis that can be profiled
+PROFILE_STAGES = ["load", "preprocess", "encode", "solve"];
+# sample the stack this often (in seconds of CPU time) for collapsed stacks
+PROFILE_SAMPLE_INTERVAL = 0.005;
+
+# the profiler used by startStage() and stopStage() (if any)
+_profiler = None;
+
+class StageProfiler:
+  __slots__ = "__stages", "__outputPrefix", "__profile", "__samples", \
+              "__active", "__previousHandler";
+
+  """
+  __init__(): Set up profiling of some stages of the analysis.  Each profiled
+  stage is both traced by cProfile (for pstats output) and sampled (for
+  collapsed stack output, as read by flame graph tools).
+  @param stages the stages to profile (a subset of PROFILE_STAGES)
+  @param outputPrefix the prefix of the output files (see write())
+  """
+  def __init__(self, stages, outputPrefix):
+    for stage in stages:
+      if(stage not in PROFILE_STAGES):
+        print >> stderr, ("ERROR: invalid profile stage: '" + stage + \
+                          "' (expected one of " + ", ".join(PROFILE_STAGES) + \
+                          ")");
+        exit(1);
+      #end if
+    #end for
+    self.__stages = set(stages);
+    self.__outputPrefix = outputPrefix;
+    self.__profile = Profile();
+    self.__samples = defaultdict(int);
+    self.__active = [];
+    self.__previousHandler = None;
+  #end: __init__
+
+  # Record the stack of the frame interrupted by a sampling signal.
+  def __sample(self, signalNumber, frame):
+    if(not self.__active):
+      return;
+    #end if
+    stack = [];
+    while(frame != None):
+      code = frame.f_code;
+      stack.append(os.path.basename(code.co_filename) + ":" + code.co_name);
+      frame = frame.f_back;
+    #end while
+    self.__samples[";".join([self.__active[-1]] + stack[::-1])] += 1;
+  #end: __sample
+
+  """
+  start(): Start a stage, profiling it if it is one of the profiled stages.
+  Stages may nest; profiling continues until the outermost profiled stage
+  stops.
+  @param stage the stage
+  """
+  def start(self, stage):
+    if(stage not in self.__stages):
+      return;
+    #end if
+    self.__active.append(stage);
+    if(len(self.__active) == 1):
+      # (restart system calls interrupted by sampling, e.g. pipe reads)
+      self.__previousHandler = signal(SIGPROF, self.__sample);
+      siginterrupt(SIGPROF, False);
+      setitimer(ITIMER_PROF, PROFILE_SAMPLE_INTERVAL, PROFILE_SAMPLE_INTERVAL);
+      self.__profile.enable();
+    #end if
+  #end: start
+
+  """
+  stop(): Stop a stage started by start().
+  @param stage the stage
+  """
+  def stop(self, stage):
+    if(stage not in self.__stages):
+      return;
+    #end if
+    if(len(self.__active) == 1):
+      # (disarm the sampler before the last stage is gone)
+      setitimer(ITIMER_PROF, 0);
+      signal(SIGPROF, self.__previousHandler);
+      self.__profile.disable();
+    #end if
+    self.__active.pop();
+  #end: stop
+
+  """
+  forChild(): Get a profiler of the same stages for a child process (e.g., an
+  analysis run in parallel), which writes its own output files.
+  @param name the child's name, added to the output files' prefix
+  @return the profiler
+  """
+  def forChild(self, name):
+    return(StageProfiler(self.__stages, self.__outputPrefix + "." + name));
+  #end: forChild
+
+  """
+  write(): Write the profiles of all profiled stages so far: the cProfile
+  statistics to <outputPrefix>.pstats (see the pstats module), and the sampled
+  stacks, one "stage;file:function;...;file:function count" line per distinct
+  stack, to <outputPrefix>.collapsed.  Stages still active (e.g., after an
+  error) are stopped first.
+  """
+  def write(self):
+    while(self.__active):
+      self.stop(self.__active[-1]);
+    #end while
+    try:
+      self.__profile.dump_stats(self.__outputPrefix + ".pstats");
+      with open(self.__outputPrefix + ".collapsed", 'w') as openFile:
+        for (stack, count) in sorted(self.__samples.iteritems()):
+          openFile.write(stack + " " + str(count) + "\n");
+        #end for
+      #end with
+    except IOError as e:
+      print >> stderr, ("WARNING: could not write profile " + \
+                        self.__outputPrefix + ": " + str(e));
+    #end try
+  #end: write
+#end: class StageProfiler
+
+"""
+setProfiler(): Set the profiler used by startStage() and stopStage().
+@param profiler the profiler (or None, to profile nothing)
+"""
+def setProfiler(profiler):
+  global _profiler;
+  _profiler = profiler;
+#end: setProfiler
+
+"""
+getProfiler(): Get the profiler used by startStage() and stopStage().
+@return the profiler (or None)
+"""
+def getProfiler():
+  return(_profiler);
+#end: getProfiler
+
+"""
+writeProfile(): Write the output of the profiler used by startStage() and
+stopStage() (if any), and stop using it.  This also happens when the process
+exits, so that a profile is not lost when an analysis exits with an error.
+"""
+def writeProfile():
+  global _profiler;
+  if(_profiler != None):
+    _profiler.write();
+    _profiler = None;
+  #end if
+#end: writeProfile
+atexit.register(writeProfile);
+
+"""
+startStage(): Start a stage of the analysis, profiling it if it is to be
+profiled.
+@param stage the stage (one of PROFILE_STAGES)
+"""
+def startStage(stage):
+  if(_profiler != None):
+    _profiler.start(stage);
+  #end if
+#end: startStage
+
+"""
+stopStage(): Stop a stage of the analysis started by startStage().
+@param stage the stage
+"""
+def stopStage(stage):
+  if(_profiler != None):
+    _profiler.stop(stage);
+  #end if
+#end: stopStage
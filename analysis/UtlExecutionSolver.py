@@ -2,13 +2,16 @@
 
 from sys import stderr, stdout
 from collections import deque
+import time
 
 from ExecutionSolver import ExecutionSolver
+from ProbeMonitor import ProbeMonitor
 from utils import findEntryForNode, findGraphEntry
+from csilibs.clock import addStat, countStat
 from csilibs.graphlibs import is_cfg_node
 
 from networkx.classes.multidigraph import MultiDiGraph
-from networkx import condensation
+from networkx import condensation, strongly_connected_components
 
 class UtlExecutionSolver(ExecutionSolver):
   __slots__ = "__graph, __entryNode, __crashNode, __yesVectors, __allYes, __allNo";
@@ -504,54 +507,132 @@ class UtlExecutionSolver(ExecutionSolver):
     # it's probably better to just do this once, after all "no" observations
   #end: encodeObsNo
   
+  """
+  __probeNode(): Check whether a node may have executed, and whether it may
+  not have executed, given the encoded constraints.
+  @param n the node
+  @param baseSCCGraph the SCC graph of the whole (constrained) CFG
+  @return (possibleYes, possibleNo)
+  """
+  def __probeNode(self, n, baseSCCGraph):
+    prevInYesVectors = (tuple([n]) in self.__yesVectors);
+    self.__yesVectors.add(tuple([n]));
+    try:
+      possibleYes = self.__entryCrashPath(baseSCCGraph);
+    finally:
+      # (even if the probe is interrupted)
+      if(not prevInYesVectors):
+        self.__yesVectors.remove(tuple([n]));
+      #end if
+    #end try
+
+    if(n in [self.__entryNode, self.__crashNode]):
+      possibleNo = False;
+    else:
+      # make a shallow copy (so we can remove a node without wrecking the
+      # original)
+      noTestG = self.__graph.subgraph(self.__graph.nodes());
+      noTestG.remove_node(n);
+      noTestSCCGraph = self.__buildSCCGraph(noTestG);
+      possibleNo = self.__entryCrashPath(noTestSCCGraph);
+    #end if
+    return(possibleYes, possibleNo);
+  #end: __probeNode
+
   """
   @override
   findKnownExecution(): Figure out which nodes in the CFG (a) are known to have
   executed at least once, (b) are known to have not executed, and (c) may or may
   not have executed given the crash location.
+  @param queryNodes the nodes to classify (by default, all of them); other
+                    nodes are left out of the result
+                    => {G.nodes}
+  @param monitor a ProbeMonitor told about each node as it is classified
+                 (or None)
   @return (defYes, defNo, maybe)
              => ({G.nodes}, {G.nodes}, {G.nodes})
   """
-  def findKnownExecution(self):
+  def findKnownExecution(self, queryNodes=None, monitor=None):
+    if(monitor == None):
+      monitor = ProbeMonitor();
+    #end if
     defYes = set([]);
     defNo = self.__allNo.copy();
     maybe = set([]);
+    if(queryNodes != None):
+      defNo &= queryNodes;
+    #end if
+    probeNodes = [n for n in self.__graph.nodes_iter(False) \
+                    if queryNodes == None or n in queryNodes];
 
     # build the base SCC graph (which is re-used for each exeNo check)
     baseSCCGraph = self.__buildSCCGraph(self.__graph);
+    countStat("UtlExecutionSolver.sccs", baseSCCGraph.number_of_nodes());
+    # (the size of each node's SCC in the constrained CFG, to explain probe
+    # times)
+    sccSizes = {};
+    for scc in strongly_connected_components(self.__graph):
+      for member in scc:
+        sccSizes[member] = len(scc);
+      #end for
+    #end for
     
-    total = len(self.__graph);
-    soFar = 0;
-    for n in self.__graph.nodes_iter(False):
-      prevInYesVectors = (tuple([n]) in self.__yesVectors);
-      self.__yesVectors.add(tuple([n]));
-      possibleYes = self.__entryCrashPath(baseSCCGraph);
-      if(not prevInYesVectors):
-        self.__yesVectors.remove(tuple([n]));
+    # nodes that reachability alone classifies need no probes of their own,
+    # so they come first (and are classified even if probing stops early):
+    # those on no path from entry to crash, and those every such path visits
+    trivial = [];
+    if(self.__entryCrashPath(baseSCCGraph)):
+      live = set([]);
+      for (scc, data) in baseSCCGraph.nodes_iter(data=True):
+        live.update(data["members"]);
+      #end for
+      visited = set([self.__entryNode, self.__crashNode]);
+      for vector in self.__yesVectors:
+        visited.update(vector);
+      #end for
+      trivial = [n for n in probeNodes if n not in live or n in visited];
+      for n in trivial:
+        if(n not in live):
+          defNo.add(n);
+          monitor.probed(n, False, True);
+        else:
+          defYes.add(n);
+          monitor.probed(n, True, False);
+        #end if
+      #end for
+      countStat("UtlExecutionSolver.trivial", len(trivial));
+      trivial = set(trivial);
+    #end if
+    
+    total = len(probeNodes);
+    soFar = len(trivial);
+    for n in [m for m in probeNodes if m not in trivial]:
+      if(monitor.stopped()):
+        break;
       #end if
-
-      if(n in [self.__entryNode, self.__crashNode]):
-        possibleNo = False;
-      else:
-        # make a shallow copy (so we can remove a node without wrecking the
-        # original)
-        noTestG = self.__graph.subgraph(self.__graph.nodes());
-        noTestG.remove_node(n);
-        noTestSCCGraph = self.__buildSCCGraph(noTestG);
-        possibleNo = self.__entryCrashPath(noTestSCCGraph);
+      start = time.time();
+      probe = monitor.probe(n, self.__probeNode, n, baseSCCGraph);
+      addStat("UtlExecutionSolver.probes");
+      monitor.timed(n, time.time() - start,
+                    {"scc size" : sccSizes[n]} if probe != None \
+                                               else {"interrupted" : True});
+
+      # (interrupted probes leave the node unclassified)
+      if(probe != None):
+        (possibleYes, possibleNo) = probe;
+        if(not possibleYes and not possibleNo):
+          print >> stderr, ("ERROR: graph node " + n + " neither executed " + \
+                            "nor didn't execute!");
+          exit(1);
+        elif(possibleYes and possibleNo):
+          maybe.add(n);
+        elif(possibleYes):
+          defYes.add(n);
+        else:
+          defNo.add(n);
+        monitor.probed(n, possibleYes, possibleNo);
       #end if
       
-      if(not possibleYes and not possibleNo):
-        print >> stderr, ("ERROR: graph node " + n + " neither executed nor " +\
-                          "didn't execute!");
-        exit(1);
-      elif(possibleYes and possibleNo):
-        maybe.add(n);
-      elif(possibleYes):
-        defYes.add(n);
-      else:
-        defNo.add(n);
-      
       soFar += 1;
       if(soFar % 10 == 0):
         stdout.write("\r" + ("%.2f" % ((1.0*soFar)/(1.0*total)*100)) + "%: " + \
@@ -1,12 +1,139 @@
 #!/s/python-2.7.1/bin/python
 
 """
-A basic timer class used by the CSI analysis passes.
+A basic timer class used by the CSI analysis passes.  Named splits (spans) and
+counters are also recorded for the whole process, so that they can be written
+out as one record at the end of a run (see writeStats()).
 """
 
+import json
 import time
 from sys import stderr
 
+# the spans, counters, and reports recorded so far (by all clocks), and those
+# recorded for each group (e.g., each failure report of a batch)
+_stats = {"spans" : [], "counters" : {}, "reports" : {}, "groups" : {}};
+# the group being recorded (or None)
+_group = None;
+
+# Get the spans, counters, and reports of the group being recorded.
+def currentStats():
+  if(_group == None):
+    return(_stats);
+  #end if
+  return(_stats["groups"].setdefault(_group, {"spans" : [], "counters" : {},
+                                              "reports" : {}}));
+#end: currentStats
+
+# Copy some spans, counters, and reports.
+def copyStats(stats):
+  return({"spans" : list(stats["spans"]),
+          "counters" : dict(stats["counters"]),
+          "reports" : dict(stats["reports"])});
+#end: copyStats
+
+"""
+setStatsGroup(): Record all further spans, counters, and reports in a group of
+their own (e.g., for one failure report of a batch, so that those of the next
+report do not overwrite them).
+@param group the group's name (or None, to record them outside any group)
+"""
+def setStatsGroup(group):
+  global _group;
+  _group = group;
+#end: setStatsGroup
+
+"""
+countStat(): Record the value of a counter.
+@param name the counter's name
+@param value its value
+"""
+def countStat(name, value):
+  currentStats()["counters"][name] = value;
+#end: countStat
+
+"""
+addStat(): Add to the value of a counter (which starts at 0).
+@param name the counter's name
+@param amount the amount to add
+"""
+def addStat(name, amount=1):
+  counters = currentStats()["counters"];
+  counters[name] = counters.get(name, 0) + amount;
+#end: addStat
+
+"""
+addReport(): Record a more detailed report (e.g., a histogram).
+@param name the report's name
+@param report the report (anything that can be written as JSON)
+"""
+def addReport(name, report):
+  currentStats()["reports"][name] = report;
+#end: addReport
+
+"""
+getStats(): Get the spans, counters, and reports recorded so far.
+@return {"spans" : [[name, seconds]], "counters" : {name : value},
+         "reports" : {name : report}, "groups" : {group : {"spans" : ...,
+         "counters" : ..., "reports" : ...}}}
+"""
+def getStats():
+  stats = copyStats(_stats);
+  stats["groups"] = dict([(group, copyStats(groupStats)) \
+                          for (group, groupStats) \
+                          in _stats["groups"].iteritems()]);
+  return(stats);
+#end: getStats
+
+"""
+resetStats(): Forget all spans, counters, and reports recorded so far (e.g.,
+in a child process, which should only report its own).
+"""
+def resetStats():
+  _stats["spans"] = [];
+  _stats["counters"] = {};
+  _stats["reports"] = {};
+  _stats["groups"] = {};
+#end: resetStats
+
+"""
+mergeStats(): Add spans, counters, and reports recorded elsewhere (e.g., by a
+child process) to those recorded here.
+@param stats the spans, counters, and reports, as from getStats()
+"""
+def mergeStats(stats):
+  _stats["spans"].extend(stats["spans"]);
+  _stats["counters"].update(stats["counters"]);
+  _stats["reports"].update(stats["reports"]);
+  for (group, groupStats) in stats.get("groups", {}).iteritems():
+    merged = _stats["groups"].setdefault(group, {"spans" : [], "counters" : {},
+                                                 "reports" : {}});
+    merged["spans"].extend(groupStats["spans"]);
+    merged["counters"].update(groupStats["counters"]);
+    merged["reports"].update(groupStats["reports"]);
+  #end for
+#end: mergeStats
+
+"""
+writeStats(): Write all spans, counters, and reports recorded so far to a
+file, as one JSON record.
+@param path the file
+@param extra other fields of the record (a dictionary)
+"""
+def writeStats(path, extra={}):
+  record = dict(extra);
+  record.update(getStats());
+  try:
+    with open(path, 'w') as openFile:
+      json.dump(record, openFile, sort_keys=True);
+      openFile.write("\n");
+    #end with
+  except IOError as e:
+    print >> stderr, ("WARNING: could not write statistics to " + path + \
+                      ": " + str(e));
+  #end try
+#end: writeStats
+
 class CSIClock:
   __slots__ = "__lastTick";
   
@@ -18,8 +145,19 @@ class CSIClock:
     self.tick();
   #end: __init__
   
-  def takeSplit(self):
-    print("Took %0.3f s." % (time.time() - self.__lastTick));
+  """
+  takeSplit(): End the current split, and start the next one.
+  @param name the name to record the split under (if any)
+  @param show whether to print the split's time
+  """
+  def takeSplit(self, name=None, show=True):
+    elapsed = time.time() - self.__lastTick;
+    if(show):
+      print("Took %0.3f s." % elapsed);
+    #end if
+    if(name != None):
+      currentStats()["spans"].append([name, round(elapsed, 6)]);
+    #end if
     self.tick();
   #end: takeSplit
 #end: class CSIClock
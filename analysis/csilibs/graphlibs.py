@@ -103,7 +103,10 @@ possible, given that any nodes in "exclude" may not be combined with others.
 @param exclude nodes that may not be combined with others in their basic block
 @param combineCalls indicate whether or not call-site nodes may be combined with
                     others
-@return the collapsed graph
+@return (G, members, lineTable): the collapsed graph; a map from each node
+        that others were collapsed into to those nodes; and the lines of each
+        node of the original graph (as for "lines_from_node()")
+           => (G, {G.nodes : [nodes]}, {nodes : [int]})
 """
 def collapse_BB_nodes(G, exclude=[], combineCalls=False):
   # verify that we don't start with any edges to nowhere
@@ -115,6 +118,12 @@ def collapse_BB_nodes(G, exclude=[], combineCalls=False):
     #end if
   #end for
 
+  # (kept outside the graph's string attributes while collapsing, which are
+  # only updated at the end)
+  lineTable = dict([(n, lines_from_node(G, n)) for n in G.nodes_iter(False)]);
+  members = {};
+  mergedLines = {};
+
   # a sadly inefficient loop.  A reverse-topological ordering of nodes in basic
   # blocks would be more efficient, but this seems fast enough for now.
   changed = True;
@@ -163,18 +172,21 @@ def collapse_BB_nodes(G, exclude=[], combineCalls=False):
       #end for
 
       # add target's line numbers to source's line numbers
-      sourceLines = lines_from_node(G, src);
-      targetLines = lines_from_node(G, target);
+      sourceLines = mergedLines.get(src, lineTable[src]);
+      targetLines = mergedLines.pop(target, lineTable[target]);
       if(targetLines != None and len(targetLines) > 0):
-        newLines = ([] if sourceLines == None else sourceLines) + targetLines;
-        srcAttr["lines"] = "(" + " ".join(map(str, newLines)) + ")";
+        mergedLines[src] = ([] if sourceLines == None else sourceLines) + \
+                           targetLines;
       #end if
 
       # add target to the set of nodes collapsed into src
-      srcPriorNodes = collapsed_nodes_from_node(G, src);
-      targetPriorNodes = collapsed_nodes_from_node(G, target);
-      newNodes = srcPriorNodes + targetPriorNodes + [target];
-      srcAttr["collapsed-nodes"] = "(" + " ".join(newNodes) + ")";
+      srcPriorNodes = members.pop(src, None);
+      if(srcPriorNodes == None):
+        srcPriorNodes = collapsed_nodes_from_node(G, src);
+      targetPriorNodes = members.pop(target, None);
+      if(targetPriorNodes == None):
+        targetPriorNodes = collapsed_nodes_from_node(G, target);
+      members[src] = srcPriorNodes + targetPriorNodes + [target];
 
       G.remove_node(target);
       changed = True;
@@ -190,7 +202,15 @@ def collapse_BB_nodes(G, exclude=[], combineCalls=False):
     #end if
   #end for
 
-  return(G);
+  # record the result in the graph, too (see "collapsed_nodes_from_node()")
+  for (n, newLines) in mergedLines.iteritems():
+    G.node[n]["lines"] = "(" + " ".join(map(str, newLines)) + ")";
+  #end for
+  for (n, newNodes) in members.iteritems():
+    G.node[n]["collapsed-nodes"] = "(" + " ".join(newNodes) + ")";
+  #end for
+
+  return(G, members, lineTable);
 #end: collapse_BB_nodes
 
 """
@@ -416,6 +436,39 @@ def find_function_id(G, funcName):
   return(find_function_data(G, funcName)[0]);
 #end: find_function_id
 
+"""
+nodes_from_lines(): Find all nodes in G on the given range of lines of the
+given source file.  A file matches if it is the same as the path given, or ends
+in it (e.g., "src/foo.c" matches "foo.c").
+@param G the graph
+@param fileName the source file
+@param firstLine the first line of the range
+@param lastLine the last line of the range (inclusive)
+@return the set of matching nodes
+"""
+def nodes_from_lines(G, fileName, firstLine, lastLine):
+  # find the functions in the file
+  funcIds = set([]);
+  for (n, attr) in G.nodes_iter(data=True):
+    entryFile = attr.get("file", "");
+    if(attr.get("kind", "") == "entry" and entryFile and \
+       (entryFile == fileName or entryFile.endswith("/" + fileName))):
+      funcIds.add(function_id(n));
+    #end if
+  #end for
+
+  result = set([]);
+  for n in G.nodes_iter(False):
+    if(function_id(n) not in funcIds):
+      continue;
+    lines = lines_from_node(G, n);
+    if(lines and any(firstLine <= line <= lastLine for line in lines)):
+      result.add(n);
+    #end if
+  #end for
+  return(result);
+#end: nodes_from_lines
+
 """
 restrict_to_function(): Create a copy of the graph restricted to contain only
 nodes from the passed function.
@@ -742,7 +795,7 @@ def fix_graph(G):
   ############################################################################
   # PHASE 2: explode all auxiliary nodes
   ############################################################################
-  clock.takeSplit();
+  clock.takeSplit("fix_graph PHASE 1");
   print("PHASE 2");
   print("Starting at: " + str(datetime.now()));
   
@@ -792,7 +845,7 @@ def fix_graph(G):
   # PHASE 3: close all line numbers for nodes within call node line numbers and
   # ternary expressions
   ############################################################################
-  clock.takeSplit();
+  clock.takeSplit("fix_graph PHASE 2");
   print("PHASE 3");
   print("Starting at: " + str(datetime.now()));
   
@@ -840,7 +893,7 @@ def fix_graph(G):
   ############################################################################
   # PHASE 4: combine line numbers for multi-line statements (AMBIGUITY)
   ############################################################################
-  clock.takeSplit();
+  clock.takeSplit("fix_graph PHASE 3");
   print("PHASE 4");
   print("Starting at: " + str(datetime.now()));
   
@@ -891,7 +944,7 @@ def fix_graph(G):
   # (AMBIGUITY)
   # qwerty: what app:version:line and fault:test-case is this from?
   ############################################################################
-  clock.takeSplit();
+  clock.takeSplit("fix_graph PHASE 4");
   print("PHASE 5");
   print("Starting at: " + str(datetime.now()));
   
@@ -943,7 +996,7 @@ def fix_graph(G):
   # PHASE 6: check for any nodes that have no control parent
   # there should be none
   ############################################################################
-  clock.takeSplit();
+  clock.takeSplit("fix_graph PHASE 5");
   print("PHASE 6");
   print("Starting at: " + str(datetime.now()));
   
@@ -963,7 +1016,7 @@ def fix_graph(G):
   # PHASE 7: remove all "false" edges out of jump, return, and case nodes.
   # Remove all decl nodes.
   ############################################################################
-  clock.takeSplit();
+  clock.takeSplit("fix_graph PHASE 6");
   print("PHASE 7");
   print("Starting at: " + str(datetime.now()));
   
@@ -994,7 +1047,7 @@ def fix_graph(G):
   # we could also consider deleting any chains they start...whatever, dumb
   # TODO: perhaps we need to verify that these only correspond to dead code?
   ############################################################################
-  clock.takeSplit();
+  clock.takeSplit("fix_graph PHASE 7");
   print("PHASE 8");
   print("Starting at: " + str(datetime.now()));
   
@@ -1015,7 +1068,7 @@ def fix_graph(G):
   ############################################################################
   # PHASE 9: combine basic blocks
   ############################################################################
-  clock.takeSplit();
+  clock.takeSplit("fix_graph PHASE 8");
   print("PHASE 9");
   print("Starting at: " + str(datetime.now()));
   
@@ -1065,7 +1118,7 @@ def fix_graph(G):
   ############################################################################
   # PHASE 10: compute dominator/post-dominator information
   ############################################################################
-  clock.takeSplit();
+  clock.takeSplit("fix_graph PHASE 9");
   print("PHASE 10");
   print("Starting at: " + str(datetime.now()));
   
@@ -1075,7 +1128,7 @@ def fix_graph(G):
   ############################################################################
   # PHASE 11: mark implicit return nodes
   ############################################################################
-  clock.takeSplit();
+  clock.takeSplit("fix_graph PHASE 10");
   print("PHASE 11");
   print("Starting at: " + str(datetime.now()));
   
@@ -1140,6 +1193,6 @@ def fix_graph(G):
   #end for
   
   
-  clock.takeSplit();
+  clock.takeSplit("fix_graph PHASE 11");
   return G;
 #end: fix_graph
@@ -0,0 +1,148 @@
+#!/s/python-2.7.1/bin/python
+
+"""
+Memory accounting for the CSI analysis passes: the resident set size (RSS) of
+this process and of the processes it started (e.g., SVPA servers' JVMs), and
+an optional soft limit on it.  Child process sizes are read from /proc, so
+they are only known on Linux.
+"""
+
+import os
+import resource
+from sys import platform
+
+from clock import countStat
+
+# the soft memory limit (in KiloBytes), or None
+_memoryLimit = None;
+
+"""
+setMemoryLimit(): Set the soft memory limit, above which overMemoryLimit() is
+true.
+@param limit the limit (in MegaBytes), or None for no limit
+"""
+def setMemoryLimit(limit):
+  global _memoryLimit;
+  _memoryLimit = (limit * 1024) if limit != None else None;
+#end: setMemoryLimit
+
+"""
+getMemoryLimit(): Get the soft memory limit.
+@return the limit (in MegaBytes), or None
+"""
+def getMemoryLimit():
+  return((_memoryLimit / 1024) if _memoryLimit != None else None);
+#end: getMemoryLimit
+
+"""
+peakMemory(): Get the peak RSS of this process so far.
+@return the peak RSS (in KiloBytes)
+"""
+def peakMemory():
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss;
+  # (Mac OS reports bytes, rather than KiloBytes)
+  return(peak / 1024 if platform == "darwin" else peak);
+#end: peakMemory
+
+# Read a field (in KiloBytes) of /proc/<pid>/status, or None if unknown.
+def readStatusField(pid, field):
+  try:
+    with open("/proc/" + str(pid) + "/status", 'r') as openFile:
+      for line in openFile:
+        if(line.startswith(field + ":")):
+          return(int(line.split()[1]));
+      #end for
+    #end with
+  except (IOError, ValueError, IndexError):
+    pass;
+  #end try
+  return(None);
+#end: readStatusField
+
+"""
+getDescendants(): Find all running processes started (directly or not) by this
+one.
+@return their process ids (empty if /proc is not available)
+"""
+def getDescendants():
+  children = {};
+  try:
+    pids = [pid for pid in os.listdir("/proc") if pid.isdigit()];
+  except OSError:
+    return([]);
+  #end try
+  for pid in pids:
+    try:
+      with open("/proc/" + pid + "/stat", 'r') as openFile:
+        # (the command name, in parentheses, may contain spaces)
+        fields = openFile.read().rsplit(")", 1)[1].split();
+      #end with
+      children.setdefault(int(fields[1]), []).append(int(pid));
+    except (IOError, ValueError, IndexError):
+      continue;
+    #end try
+  #end for
+
+  descendants = [];
+  worklist = [os.getpid()];
+  while(worklist):
+    for child in children.get(worklist.pop(), []):
+      descendants.append(child);
+      worklist.append(child);
+    #end for
+  #end while
+  return(descendants);
+#end: getDescendants
+
+"""
+childPeakMemory(): Get the peak RSS of the processes started by this one: the
+sum of the peaks of those still running, and the largest peak of those that
+have finished (and been waited for).
+@return (running processes' peak, finished processes' peak) (in KiloBytes)
+"""
+def childPeakMemory():
+  running = sum([readStatusField(pid, "VmHWM") or 0 \
+                 for pid in getDescendants()]);
+  finished = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss;
+  if(platform == "darwin"):
+    finished /= 1024;
+  #end if
+  return(running, finished);
+#end: childPeakMemory
+
+"""
+currentMemory(): Get the current RSS of this process and all processes it
+started.
+@return the RSS (in KiloBytes)
+"""
+def currentMemory():
+  current = readStatusField(os.getpid(), "VmRSS");
+  if(current == None):
+    return(peakMemory());
+  #end if
+  return(current + sum([readStatusField(pid, "VmRSS") or 0 \
+                        for pid in getDescendants()]));
+#end: currentMemory
+
+"""
+overMemoryLimit(): Check whether this process and the processes it started
+use more memory than the soft memory limit.
+@return whether they do (False if there is no limit)
+"""
+def overMemoryLimit():
+  return(_memoryLimit != None and currentMemory() > _memoryLimit);
+#end: overMemoryLimit
+
+"""
+recordMemory(): Record the peak RSS so far as counters of the given stage:
+that of this process (over its whole lifetime, not just this stage), the sum
+of the peaks of the processes it started that are still running, and the
+largest peak of those that have finished.
+@param stage the stage's name
+"""
+def recordMemory(stage):
+  (running, finished) = childPeakMemory();
+  countStat(stage + ".lifetime peak rss kb", peakMemory());
+  countStat(stage + ".running children peak rss kb", running);
+  countStat(stage + ".finished children peak rss kb", finished);
+#end: recordMemory
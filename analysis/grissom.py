@@ -1,31 +1,66 @@
 #!/usr/bin/env python
 
 from argparse import ArgumentParser
-from os.path import expanduser
+from multiprocessing import Pipe, Process
+from os import killpg, setpgrp
+from os.path import dirname, expanduser, join
+from re import match
+from select import select
+from signal import SIGKILL
 from sys import stdout, stderr, argv
+from time import time
+import json
 
 from FsaExecutionSolver import FsaExecutionSolver
+from LazyFsaExecutionSolver import LazyFsaExecutionSolver
 from UtlExecutionSolver import UtlExecutionSolver
 from SvpaExecutionSolver import SvpaExecutionSolver
 from PexpectSvpaExecutionSolver import PexpectSvpaExecutionSolver
+from FramedSvpaExecutionSolver import FramedSvpaExecutionSolver
 
 from JSONFailureReport import JSONFailureReport
+from ProbeMonitor import CheckpointDirectory, DEFAULT_CHECKPOINT_INTERVAL, \
+                         ProbeBudget, ProbeLatency, ProbeMemoryLimit, \
+                         ProbeMonitors
+from ResultCache import ResultCache
+from ResultWriter import STREAMED_RESULT_STYLES, getFunctionInfo, \
+                         writeBinaryResult, writeJsonResult
+from StageProfiler import PROFILE_STAGES, StageProfiler, getProfiler, \
+                          setProfiler, startStage, stopStage, writeProfile
 from TextFailureReport import TextFailureReport
+from utils import canonicalFailureReport
 
-from csilibs.clock import CSIClock
-from csilibs.graphlibs import collapse_BB_nodes, collapsed_nodes_from_node, \
-                              function_id, lines_from_node, read_graph, \
-                              restrict_to_function
+from csilibs.clock import CSIClock, addReport, addStat, countStat, \
+                           getStats, mergeStats, resetStats, setStatsGroup, \
+                           writeStats
+from csilibs.memory import recordMemory, setMemoryLimit
+from csilibs.graphlibs import collapse_BB_nodes, find_function_id, \
+                              function_id, lines_from_node, nodes_from_lines, \
+                              read_graph, restrict_to_function
 
 ##########################################################
 # Analysis Options
 ##########################################################
 ANALYSIS_OPTIONS = {"FSA" : FsaExecutionSolver, \
+                    "LazyFSA" : LazyFsaExecutionSolver, \
                     "UTL" : UtlExecutionSolver, \
                     "SVPA" : SvpaExecutionSolver, \
-                    "Pexpect" : PexpectSvpaExecutionSolver}
-RESULT_STYLES = ["none", "compact", "full", "csiclipse", "standard"];
+                    "Pexpect" : PexpectSvpaExecutionSolver, \
+                    "Framed" : FramedSvpaExecutionSolver}
+# relative precision of the solvers' results (higher is more precise); solvers
+# with the same precision compute the same results
+SOLVER_PRECISION = {"FSA" : 0, \
+                    "LazyFSA" : 0, \
+                    "UTL" : 0, \
+                    "SVPA" : 1, \
+                    "Pexpect" : 1, \
+                    "Framed" : 1};
+PORTFOLIO = "portfolio";
+RESULT_STYLES = ["none", "compact", "full", "csiclipse", "standard"] + \
+                STREAMED_RESULT_STYLES;
 MARKER_FOR_RESULTS_START = "--- Begin results";
+MARKER_FOR_REPORT_START = "--- Report: ";
+MARKER_FOR_REPORT_FAILED = "--- Report failed: ";
 
 
 def nodeSortKey(n):
@@ -38,9 +73,11 @@ def nodeSortKey(n):
   return(tuple(key));
 #end: nodeSortKey
 
-def printResult(data, full=False, outStream=stdout):
+def printResult(data, full=False, outStream=stdout, unqueried=None,
+                partial=False):
   (defYes, defNo, maybe) = data;
-  totalSize = len(defYes) + len(defNo) + len(maybe);
+  totalSize = len(defYes) + len(defNo) + len(maybe) + \
+              (len(unqueried) if unqueried != None else 0);
   defYesPercent = 100 * (1.0 * len(defYes)) / (1.0 * totalSize);
   defNoPercent = 100 * (1.0 * len(defNo)) / (1.0 * totalSize);
   maybePercent = 100 * (1.0 * len(maybe)) / (1.0 * totalSize);
@@ -58,15 +95,27 @@ def printResult(data, full=False, outStream=stdout):
                        str(maybePercent) + "%) " + \
                        ("= " + str(sorted(maybe, key=nodeSortKey)) if full \
                                                                    else ""));
+  if(unqueried != None):
+    unqueriedPercent = 100 * (1.0 * len(unqueried)) / (1.0 * totalSize);
+    print >> outStream, ("unqueried (" + str(len(unqueried)) + " " + \
+                         str(unqueriedPercent) + "%) " + \
+                         ("= " + str(sorted(unqueried, key=nodeSortKey)) \
+                                 if full else ""));
+  #end if
+  if(partial):
+    print >> outStream, ("partial (unprobed nodes are counted as maybe)");
+  #end if
 #end: printResult
 
 def lineSetToString(lineSet):
   return ",".join([str(x) for x in sorted(list(lineSet)) if x not in ["0", 0]]);
 #end: lineSetToString
 
-def printLinesResult(data, G, csiclipse=False, intraprocedural=False, outStream=stdout):
+def printLinesResult(data, G, csiclipse=False, intraprocedural=False, outStream=stdout,
+                     unqueried=None, partial=False, lineTable=None):
   (defYes, defNo, maybe) = data;
   fileToResults = {};  # {file : (yesLines, noLines, maybeLines)}
+  fileToUnqueried = {};  # {file : unqueriedLines}
 
   # create a mapping from function ids to the file that contains them
   funcToFileMapping = {};  # {funcId : (file, procedureName)}
@@ -103,12 +152,15 @@ def printLinesResult(data, G, csiclipse=False, intraprocedural=False, outStream=
   allDataNodes.update(defYes);
   allDataNodes.update(defNo);
   allDataNodes.update(maybe);
+  if(unqueried != None):
+    allDataNodes.update(unqueried);
   for n in allDataNodes:
     nodeFile = funcToFileMapping.get(function_id(n), (None, None))[0];
     if(nodeFile != None):
       fileToResults[nodeFile] = fileToResults.get(nodeFile, \
                                                   (set([]), set([]), set([])));
-      thisNodeLines = lines_from_node(G, n);
+      thisNodeLines = lineTable.get(n, None) if lineTable != None \
+                                              else lines_from_node(G, n);
       if(not thisNodeLines):
         continue;
 
@@ -118,6 +170,8 @@ def printLinesResult(data, G, csiclipse=False, intraprocedural=False, outStream=
         fileToResults[nodeFile][1].update(thisNodeLines);
       if(n in maybe):
         fileToResults[nodeFile][2].update(thisNodeLines);
+      if(unqueried != None and n in unqueried):
+        fileToUnqueried.setdefault(nodeFile, set([])).update(thisNodeLines);
     #end if
   #end for
 
@@ -127,7 +181,15 @@ def printLinesResult(data, G, csiclipse=False, intraprocedural=False, outStream=
     exit(1);
   #end if
 
+  if(partial and csiclipse):
+    # (csiclipse output has no room for it)
+    print >> stderr, ("WARNING: partial result: unprobed nodes are " + \
+                      "reported as Maybe");
+  #end if
   print(MARKER_FOR_RESULTS_START);
+  if(partial and not csiclipse):
+    print("Partial result: unprobed nodes are reported as Maybe\n");
+  #end if
   for (fileName, fileData) in fileToResults.iteritems():
     writeThisFile = "";
 
@@ -154,45 +216,304 @@ def printLinesResult(data, G, csiclipse=False, intraprocedural=False, outStream=
       writeThisFile += "Yes: " + lineSetToString(yesLines) + "\n";
       writeThisFile += "No: " + lineSetToString(noLines) + "\n";
       writeThisFile += "Maybe: " + lineSetToString(maybeLines) + "\n";
+      if(unqueried != None):
+        writeThisFile += "Unqueried: " + \
+                         lineSetToString(fileToUnqueried.get(fileName, [])) + \
+                         "\n";
+      #end if
     #end if
 
     print(writeThisFile);
   #end for
 #end: printLinesResult
 
-# Add all collapsed nodes from nodes in nodeSet into nodeSet.
-def addCollapsedToSet(nodeSet, G):
+# Add all collapsed nodes from nodes in nodeSet into nodeSet.  "members" maps
+# nodes to the nodes collapsed into them (see collapse_BB_nodes()).
+def addCollapsedToSet(nodeSet, members):
   for n in nodeSet.copy():
-    nodeSet.update(collapsed_nodes_from_node(G, n));
+    nodeSet.update(members.get(n, ()));
   return(nodeSet);
 #end: addCollapsedToSet
 
-def getResult(solver, G, crashStack, obsYes, obsNo):
-  print("Adding crash constraint...");
-  solver.encodeCrash(crashStack);
-  print("Adding obsNo constraints...");
-  i = 0;
-  for obs in obsNo:
-    i+=1;
-    solver.encodeObsNo(obs);
-  #end for
-  print("Adding obsYes constraints...");
-  i = 0;
-  for obs in obsYes:
-    i+=1;
-    print(str(i) + "/" + str(len(obsYes)));
-    solver.encodeObsYes(obs);
-  #end for
+# Map queried nodes to the (collapsed) nodes of G that represent them.
+def getQueryRepresentatives(G, queryNodes, members):
+  return(set([n for n in G.nodes_iter(False) \
+                if n in queryNodes or \
+                   not queryNodes.isdisjoint(members.get(n, ()))]));
+#end: getQueryRepresentatives
+
+# Record the size of the graph after the given stage.
+def countGraphStats(stage, G):
+  countStat(stage + ".nodes", G.number_of_nodes());
+  countStat(stage + ".edges", G.number_of_edges());
+#end: countGraphStats
+
+# Export a graph to a new solver (timing the export).
+def startSolver(solverName, G):
+  print("Starting " + solverName + " version...");
+  print("Exporting graph as constraints...");
+  clock = CSIClock();
+  startStage("encode");
+  solver = ANALYSIS_OPTIONS[solverName](G);
+  stopStage("encode");
+  clock.takeSplit(solver.__class__.__name__ + ".export", show=False);
+  recordMemory(solver.__class__.__name__ + ".export");
+  return(solver);
+#end: startSolver
+
+def getResult(solver, G, members, crashStack, obsYes, obsNo, queryNodes=None,
+              monitor=None):
+  clock = CSIClock();
+  solverClass = solver.__class__.__name__;
+  startStage("encode");
+  solver.encodeFailureReport(crashStack, obsYes, obsNo);
   assert(solver.isSat());
+  stopStage("encode");
+  clock.takeSplit(solverClass + ".encode", show=False);
+  recordMemory(solverClass + ".encode");
   
   print("Getting defYes/No information...");
-  (defYes, defNo, maybe) = solver.findKnownExecution();
-  defYes = addCollapsedToSet(defYes, G);
-  defNo = addCollapsedToSet(defNo, G);
-  maybe = addCollapsedToSet(maybe, G);
+  if(queryNodes != None):
+    queryNodes = getQueryRepresentatives(G, queryNodes, members);
+
+  requested = queryNodes if queryNodes != None else set(G.nodes());
+
+  # skip the nodes classified before an earlier run was interrupted
+  done = {};
+  if(monitor != None):
+    done = dict([(n, probe) for (n, probe) in monitor.resume().iteritems() \
+                 if n in requested]);
+    if(done):
+      print("Resuming from checkpoint (" + str(len(done)) + \
+            " nodes already classified)...");
+      queryNodes = requested.difference(done);
+    #end if
+  #end if
+
+  startStage("solve");
+  (defYes, defNo, maybe) = solver.findKnownExecution(queryNodes, monitor);
+  stopStage("solve");
+  clock.takeSplit(solverClass + ".findKnownExecution", show=False);
+  recordMemory(solverClass + ".findKnownExecution");
+  addStat(solverClass + ".classified", len(defYes) + len(defNo) + len(maybe));
+  if(monitor != None):
+    monitor.finished();
+    if(monitor.isPartial()):
+      # not knowing is always sound
+      unprobed = requested.difference(defYes, defNo, maybe, done);
+      print >> stderr, ("WARNING: probing stopped early: " + \
+                        str(len(unprobed)) + " nodes left unprobed " + \
+                        "(reported as maybe)");
+      maybe.update(unprobed);
+    else:
+      monitor.completed();
+    #end if
+  #end if
+  for (n, (possibleYes, possibleNo)) in done.iteritems():
+    if(possibleYes and possibleNo):
+      maybe.add(n);
+    elif(possibleYes):
+      defYes.add(n);
+    else:
+      defNo.add(n);
+  #end for
+  defYes = addCollapsedToSet(defYes, members);
+  defNo = addCollapsedToSet(defNo, members);
+  maybe = addCollapsedToSet(maybe, members);
   return(defYes, defNo, maybe);
 #end: getResult
 
+# Run one analysis in a child process, sending its result, whether it is
+# partial, and its timing spans and counters back on "conn".
+# The child leads its own process group, so that it can be stopped along with
+# any processes it starts (e.g., SVPA servers).
+def runSolverProcess(solverName, G, members, crashStack, obsYes, obsNo,
+                     queryNodes, monitor, conn):
+  setpgrp();
+  # (only report this analysis' own spans and counters, and profile it apart)
+  resetStats();
+  if(getProfiler() != None):
+    setProfiler(getProfiler().forChild(solverName));
+  #end if
+  # (children do not run exit handlers, so write the profile here, even if the
+  # analysis fails)
+  try:
+    solver = startSolver(solverName, G);
+    result = getResult(solver, G, members, crashStack, obsYes, obsNo,
+                       queryNodes, monitor);
+  finally:
+    writeProfile();
+  #end try
+  conn.send((result, monitor != None and monitor.isPartial(), getStats()));
+  conn.close();
+#end: runSolverProcess
+
+# Start one analysis in a child process.  Returns (solverName, process, conn),
+# where the result can be read from "conn".
+def startSolverProcess(solverName, G, members, crashStack, obsYes, obsNo,
+                       queryNodes, monitor=None):
+  # don't let the children inherit (and re-print) our buffered output
+  stdout.flush();
+  (parentConn, childConn) = Pipe(False);
+  process = Process(target=runSolverProcess,
+                    args=(solverName, G, members, crashStack, obsYes, obsNo,
+                          queryNodes, monitor, childConn));
+  process.start();
+  # only the child writes: closing our copy lets us see EOF if it dies
+  childConn.close();
+  return(solverName, process, parentConn);
+#end: startSolverProcess
+
+# Wait for the next of the pending analyses (indices into "runs") to finish.
+# Returns (index, (result, partial)), or (index, None) if the analysis failed.
+# The analysis' timing spans and counters are added to ours.
+def waitForSolverProcess(runs, pending):
+  ready = select([runs[i][2] for i in pending], [], [])[0];
+  for i in sorted(pending):
+    (solverName, process, conn) = runs[i];
+    if(conn not in ready):
+      continue;
+
+    try:
+      (result, partial, stats) = conn.recv();
+      mergeStats(stats);
+      result = (result, partial);
+    except EOFError:
+      result = None;
+    #end try
+    process.join();
+    return(i, result);
+  #end for
+  assert(False);
+#end: waitForSolverProcess
+
+# Kill all analyses in "runs" that are still running (with everything they
+# started).
+def stopSolverProcesses(runs):
+  for (solverName, process, conn) in runs:
+    if(process.is_alive()):
+      try:
+        killpg(process.pid, SIGKILL);
+      except OSError:
+        pass;
+      process.join();
+    #end if
+  #end for
+#end: stopSolverProcesses
+
+# Run the first and second analyses at the same time, each in its own process,
+# and return both results.  If either analysis fails, stop the other one and
+# exit with an error.  "monitors" holds the ProbeMonitor (or None) of each.
+# Returns ((firstResult, firstPartial), (secondResult, secondPartial)).
+def getResultsInParallel(args, firstG, secondG, firstMembers, secondMembers,
+                         crashStack, obsYes, obsNo, queryNodes,
+                         monitors=(None, None)):
+  print("Starting " + args.first + " and " + args.second + \
+        " versions in parallel...");
+  runs = [];
+  results = [None, None];
+  try:
+    for (solverName, G, members, monitor) in zip((args.first, args.second),
+                                                 (firstG, secondG),
+                                                 (firstMembers, secondMembers),
+                                                 monitors):
+      runs.append(startSolverProcess(solverName, G, members, crashStack,
+                                     obsYes, obsNo, queryNodes, monitor));
+    #end for
+
+    pending = set([0, 1]);
+    while(pending):
+      (i, results[i]) = waitForSolverProcess(runs, pending);
+      pending.remove(i);
+      if(results[i] == None):
+        print >> stderr, ("ERROR: " + runs[i][0] + " analysis failed " + \
+                          "(exit code " + str(runs[i][1].exitcode) + ")");
+        exit(1);
+      #end if
+    #end while
+  finally:
+    stopSolverProcesses(runs);
+  #end try
+
+  return(results[0], results[1]);
+#end: getResultsInParallel
+
+# Get the solvers a portfolio races: those listed with -portfolio that are at
+# least as precise as -portfolio-precision.
+def getPortfolioSolvers(args):
+  requested = SOLVER_PRECISION[args.portfolio_precision];
+  solverNames = [];
+  for solverName in args.portfolio.split(","):
+    solverName = solverName.strip();
+    if(solverName not in ANALYSIS_OPTIONS):
+      print >> stderr, ("ERROR: invalid portfolio solver: '" + solverName + \
+                        "'");
+      exit(1);
+    elif(SOLVER_PRECISION[solverName] >= requested and \
+         solverName not in solverNames):
+      solverNames.append(solverName);
+    #end if
+  #end for
+  if(not solverNames):
+    print >> stderr, ("ERROR: no portfolio solver is at least as precise " + \
+                      "as " + args.portfolio_precision);
+    exit(1);
+  #end if
+  return(solverNames);
+#end: getPortfolioSolvers
+
+# Race the portfolio solvers (those at least as precise as the requested one)
+# in parallel processes.  Returns (winner, (result, partial)) for the first one
+# to finish successfully with a complete result, after killing the others (or,
+# if every solver's result is partial, for the first of those).  "getMonitor"
+# maps a solver name to its ProbeMonitor (or None) for the first stage.  The
+# winner is also recorded as the "portfolio" report.
+def getPortfolioResult(args, G, members, crashStack, obsYes, obsNo, queryNodes,
+                       getMonitor=lambda solverName: None):
+  solverNames = getPortfolioSolvers(args);
+  print("Racing " + ", ".join(solverNames) + " versions...");
+  runs = [];
+  try:
+    for solverName in solverNames:
+      runs.append(startSolverProcess(solverName, G, members, crashStack,
+                                     obsYes, obsNo, queryNodes,
+                                     getMonitor(solverName)));
+    #end for
+
+    winner = None;
+    pending = set(range(len(runs)));
+    while(pending):
+      (i, result) = waitForSolverProcess(runs, pending);
+      pending.remove(i);
+      if(result == None):
+        print >> stderr, ("WARNING: " + runs[i][0] + " analysis failed " + \
+                          "(exit code " + str(runs[i][1].exitcode) + ")");
+        continue;
+      elif(result[1]):
+        # (a partial result only wins if no complete one comes)
+        if(winner == None):
+          winner = (runs[i][0], result);
+        #end if
+        continue;
+      #end if
+
+      winner = (runs[i][0], result);
+      break;
+    #end while
+  finally:
+    stopSolverProcesses(runs);
+  #end try
+
+  if(winner == None):
+    print >> stderr, ("ERROR: all portfolio analyses failed");
+    exit(1);
+  #end if
+  print("Portfolio winner: " + winner[0]);
+  addReport("portfolio", {"winner" : winner[0], "partial" : winner[1][1],
+                          "cached" : False});
+  return(winner);
+#end: getPortfolioResult
+
 # Compare results, return True if they compare as expected.  If "eq" is true,
 # they should be the same.  Otherwise, we expect firstResult to be "better" than
 # secondResult (i.e., have less "maybe").
@@ -209,6 +530,177 @@ def compareResults(firstResult, secondResult, eq=True):
   assert(False);
 #end: compareResults
 
+"""
+resolveQuery(): Find the nodes selected by a query.  A query is either a
+comma-separated list of node ids, a source range "file:line" or
+"file:first-last", or a function name.
+@param G the (uncollapsed) graph
+@param query the query
+@return the set of selected nodes
+"""
+def resolveQuery(G, query):
+  items = [item.strip() for item in query.split(",") if item.strip()];
+  if(items and all(item in G for item in items)):
+    return(set(items));
+  #end if
+
+  lineRange = match(r"^(.+):(\d+)(?:-(\d+))?$", query.strip());
+  if(lineRange):
+    (fileName, firstLine, lastLine) = lineRange.groups();
+    queryNodes = nodes_from_lines(G, fileName, int(firstLine),
+                                  int(lastLine if lastLine else firstLine));
+  else:
+    funcId = find_function_id(G, query.strip());
+    if(funcId == None):
+      print >> stderr, ("ERROR: query '" + query + "' is not a node list, " + \
+                        "source range, or function name");
+      exit(1);
+    #end if
+    queryNodes = set([n for n in G.nodes_iter(False) \
+                        if function_id(n) == funcId]);
+  #end if
+
+  if(not queryNodes):
+    print >> stderr, ("ERROR: query '" + query + "' matches no nodes");
+    exit(1);
+  #end if
+  return(queryNodes);
+#end: resolveQuery
+
+"""
+saveResult(): Save a result (and the failure report it is for) to a file, for
+later incremental re-analysis with -previous-result.
+@param resultFile the file to write
+@param report the canonical failure report (see canonicalFailureReport())
+@param result the (defYes, defNo, maybe) result
+@param solverName the solver that computed it (for a portfolio, the winner)
+@param options the analysis options that affect results (see
+               getResultOptions())
+"""
+def saveResult(resultFile, report, result, solverName, options):
+  (defYes, defNo, maybe) = result;
+  with open(expanduser(resultFile), 'w') as openFile:
+    json.dump({"report" : report, \
+               "solver" : solverName, \
+               "options" : options, \
+               "defYes" : sorted(defYes, key=nodeSortKey), \
+               "defNo" : sorted(defNo, key=nodeSortKey), \
+               "maybe" : sorted(maybe, key=nodeSortKey)}, openFile);
+  #end with
+#end: saveResult
+
+"""
+readPreviousResult(): Read a result saved by saveResult().
+@param resultFile the file to read
+@return (report, result, solverName, options), where the report, solver, and
+        options are None if the file has none
+"""
+def readPreviousResult(resultFile):
+  try:
+    with open(expanduser(resultFile), 'r') as openFile:
+      data = json.load(openFile);
+    #end with
+    result = (set(map(str, data["defYes"])), set(map(str, data["defNo"])), \
+              set(map(str, data["maybe"])));
+  except (IOError, ValueError, KeyError) as e:
+    print >> stderr, ("ERROR: invalid previous result '" + resultFile + \
+                      "': " + str(e));
+    exit(1);
+  #end try
+  return(data.get("report", None), result, data.get("solver", None),
+         data.get("options", None));
+#end: readPreviousResult
+
+"""
+checkPreviousResult(): Check that a previous result can be re-used by this
+analysis: it must have been computed with the same options that affect
+results, and by a solver that computes the same results as this analysis'
+(first) solver, or as every solver of its portfolio.
+@param args the parsed arguments
+@param solverName the solver of the previous result (or None, if unknown)
+@param options the options of the previous result (or None, if unknown)
+"""
+def checkPreviousResult(args, solverName, options):
+  current = getResultOptions(args);
+  if(options == None or solverName == None):
+    print >> stderr, ("ERROR: previous result does not record its solver " + \
+                      "and options; save it again with -save-result");
+    exit(1);
+  #end if
+  differing = sorted([name for name in set(options) | set(current) \
+                           if options.get(name) != current.get(name)]);
+  if(differing):
+    print >> stderr, ("ERROR: previous result was computed with different " + \
+                      "options (" + ", ".join(differing) + ")");
+    exit(1);
+  #end if
+
+  # (solvers of the same precision compute the same results)
+  solverNames = getPortfolioSolvers(args) if args.first == PORTFOLIO \
+                                          else [args.first];
+  if(solverName not in SOLVER_PRECISION or \
+     any([SOLVER_PRECISION[name] != SOLVER_PRECISION[solverName] \
+          for name in solverNames])):
+    print >> stderr, ("ERROR: previous result was computed by " + \
+                      solverName + ", whose results differ from " + \
+                      args.first + "'s");
+    exit(1);
+  #end if
+#end: checkPreviousResult
+
+"""
+getReprobeNodes(): Find the nodes whose classification may differ from the
+previous result, given how the failure report changed.  Adding observations
+only removes possible executions, so yes and no nodes stay as they are, and
+only maybe nodes need re-probing; dropping observations only adds executions,
+so maybe nodes stay maybe.  Any other change re-probes everything.
+@param oldReport the canonical failure report of the previous result
+@param newReport the canonical failure report now
+@param previousResult the previous (defYes, defNo, maybe) result
+@param allNodes all nodes of the (uncollapsed) graph
+@return the set of nodes to re-probe
+"""
+def getReprobeNodes(oldReport, newReport, previousResult, allNodes):
+  (prevYes, prevNo, prevMaybe) = previousResult;
+  # normalize tuples to lists, as they would be after saving
+  (oldStack, oldYes, oldNo) = json.loads(json.dumps(oldReport));
+  (newStack, newYes, newNo) = json.loads(json.dumps(newReport));
+  # nodes the previous result doesn't know about must always be probed
+  reprobe = allNodes - prevYes - prevNo - prevMaybe;
+
+  oldObs = set([json.dumps(["yes", v]) for v in oldYes] + \
+               [json.dumps(["no", v]) for v in oldNo]);
+  newObs = set([json.dumps(["yes", v]) for v in newYes] + \
+               [json.dumps(["no", v]) for v in newNo]);
+  added = newObs - oldObs;
+  removed = oldObs - newObs;
+  if(oldStack != newStack):
+    print("Crash stack changed: re-probing all nodes...");
+    return(allNodes);
+  elif(not added and not removed):
+    print("Failure report unchanged: re-using the previous result...");
+  elif(not removed):
+    print("Failure report only adds observations: re-probing maybe nodes...");
+    reprobe |= prevMaybe;
+  elif(not added):
+    print("Failure report only drops observations: re-probing yes/no " + \
+          "nodes...");
+    reprobe |= prevYes | prevNo;
+  else:
+    print("Failure report adds and drops observations: re-probing all " + \
+          "nodes...");
+    return(allNodes);
+  #end if
+  return(reprobe & allNodes);
+#end: getReprobeNodes
+
+# Combine a previous result with a new one for (at least) the re-probed nodes.
+def mergeResults(previousResult, result):
+  probed = set([]).union(*result);
+  return(tuple([new | (old - probed) \
+                for (old, new) in zip(previousResult, result)]));
+#end: mergeResults
+
 def getFuncIdForCrashes(G, crashNodes):
   funcId = None;
   for n in crashNodes:
@@ -262,6 +754,15 @@ def parseArguments(argList):
                            "(rather than specifying each on the command " + \
                             "line).  Note that this will completely " + \
                             "override options for -c, -y, and -n.");
+  parser.add_argument("-batch", "--batch", action="store", dest="batch",
+                      help="Batch manifest file.  Analyze each JSON " + \
+                           "failure report listed in this file (one path " + \
+                           "per line, relative to the manifest; blank " + \
+                           "lines and lines starting with # are ignored) " + \
+                           "against the graph, reading the graph only " + \
+                           "once.  Each report's output starts with a \"" + \
+                           MARKER_FOR_REPORT_START + "path\" line.  This " + \
+                           "overrides -json, -c, -y, and -n.");
   parser.add_argument("-c", "--crash", action="store", dest="crash_nodes",
                       default=None,
                       help="String of possible crash nodes.  " + \
@@ -302,43 +803,197 @@ def parseArguments(argList):
                       default="compact",
                       help="Indicate how results should be written out " +\
                            "after analysis completes.");
+  parser.add_argument("-result-file", "--result-file", action="store",
+                      dest="result_file", default=None,
+                      help="Write json or binary results (see " + \
+                           "-result-style) to this file, rather than to " + \
+                           "stdout.");
+  parser.add_argument("-query", "--query", action="store", dest="query",
+                      default=None,
+                      help="Only classify the nodes selected by this " + \
+                           "query: a comma-separated list of node ids, a " + \
+                           "source range (\"file:line\" or " + \
+                           "\"file:first-last\"), or a function name.  " + \
+                           "All other nodes are reported as unqueried.");
+  parser.add_argument("-time-budget", "--time-budget", action="store",
+                      type=float, dest="time_budget", default=None,
+                      help="Time budget for each solver's analysis, in " + \
+                           "seconds.  When it runs out, probing stops, and " + \
+                           "all unprobed nodes are reported as maybe (in a " + \
+                           "result marked as partial).");
+  parser.add_argument("-probe-timeout", "--probe-timeout", action="store",
+                      type=float, dest="probe_timeout", default=None,
+                      help="Time limit for probing each node, in seconds " + \
+                           "(UTL and LazyFSA only); nodes whose probes run " + \
+                           "out of time are reported as maybe.  FSA " + \
+                           "probes cannot be interrupted inside an " + \
+                           "automaton intersection, so for FSA this only " + \
+                           "takes effect between intersections.");
+  parser.add_argument("-memory-limit", "--memory-limit", action="store",
+                      type=int, dest="memory_limit", default=None,
+                      help="Soft memory limit, in MegaBytes, for the " + \
+                           "analysis and any processes it starts (e.g., " + \
+                           "SVPA servers).  Above it, the FSA solver " + \
+                           "compacts its automaton, and probing stops with " + \
+                           "a partial result (as for -time-budget).");
+  parser.add_argument("-slow-probes", "--slow-probes", action="store",
+                      type=int, dest="slow_probes", default=None,
+                      help="Time each node's probes, and print a histogram " + \
+                           "of the probe times and this many of the " + \
+                           "slowest nodes (with their function and size " + \
+                           "details) for each solver.  These are also " + \
+                           "written to the -stats record.");
+  parser.add_argument("-profile", "--profile", action="store", dest="profile",
+                      default=None,
+                      help="Profile the given stages of the analysis " + \
+                           "(comma-separated, from " + \
+                           ", ".join(PROFILE_STAGES) + "; or \"all\"), " + \
+                           "writing cProfile statistics to " + \
+                           "<-profile-output>.pstats and sampled stacks " + \
+                           "(for flame graphs) to " + \
+                           "<-profile-output>.collapsed.");
+  parser.add_argument("-profile-output", "--profile-output", action="store",
+                      dest="profile_output", default="csi-grissom-profile",
+                      help="Prefix of the -profile output files.  " + \
+                           "Analyses run in their own processes (with " + \
+                           "-parallel or -first " + PORTFOLIO + ") add " + \
+                           "\".<solver>\" to it.");
+  parser.add_argument("-checkpoint-dir", "--checkpoint-dir", action="store",
+                      dest="checkpoint_dir", default=None,
+                      help="Directory of checkpoints: each solver " + \
+                           "periodically saves the nodes it has classified " + \
+                           "there (keyed like -result-cache), and a " + \
+                           "re-run of an interrupted analysis skips them.");
+  parser.add_argument("-checkpoint-interval", "--checkpoint-interval",
+                      action="store", type=float, dest="checkpoint_interval",
+                      default=DEFAULT_CHECKPOINT_INTERVAL,
+                      help="Minimum time between checkpoint saves, in " + \
+                           "seconds. (default: " + \
+                           str(DEFAULT_CHECKPOINT_INTERVAL) + ")");
+  parser.add_argument("-result-cache", "--result-cache", action="store",
+                      dest="result_cache", default=None,
+                      help="Directory caching analysis results.  Results " + \
+                           "are keyed by the graph file, the (canonical) " + \
+                           "failure report, the solver, the analysis " + \
+                           "options, and the tool version; a cached result " + \
+                           "is used instead of running the solver.");
+  parser.add_argument("-save-result", "--save-result", action="store",
+                      dest="save_result", default=None,
+                      help="Save the result (and its failure report) to " + \
+                           "this file, for use with -previous-result.");
+  parser.add_argument("-previous-result", "--previous-result",
+                      action="store", dest="previous_result", default=None,
+                      help="Re-analyze incrementally: start from this " + \
+                           "result (saved with -save-result), and only " + \
+                           "re-probe the nodes whose classification the " + \
+                           "changes to the failure report may affect.  " + \
+                           "The result must be from a solver computing " + \
+                           "the same results, with the same -collapse, " + \
+                           "-intra, and -stackonly options.  This cannot " + \
+                           "be used with -second.");
+  parser.add_argument("-previous-json", "--previous-json", action="store",
+                      dest="previous_json", default=None,
+                      help="With -previous-result, the failure report " + \
+                           "that the previous result is for (by default, " + \
+                           "the one saved with it).");
   parser.add_argument("-first", "--first", action="store", dest="first",
-                      choices=ANALYSIS_OPTIONS.keys(), default="UTL",
-                      help="The first analysis version to run.");
+                      choices=ANALYSIS_OPTIONS.keys() + [PORTFOLIO],
+                      default="UTL",
+                      help="The first analysis version to run.  Use " + \
+                           "\"" + PORTFOLIO + "\" to race the -portfolio " + \
+                           "solvers and take the first result.");
   parser.add_argument("-second", "--second", action="store", dest="second",
                       choices=ANALYSIS_OPTIONS.keys() + ["None"],
                       default="None",
                       help="The second analysis version to run.  Use " + \
                            "\"None\" to run only one analysis and not " + 
                            "compare.");
+  parser.add_argument("-portfolio", "--portfolio", action="store",
+                      dest="portfolio", default="UTL,FSA,SVPA",
+                      help="Comma-separated solvers to race for " + \
+                           "\"-first " + PORTFOLIO + "\".");
+  parser.add_argument("-portfolio-precision", "--portfolio-precision",
+                      action="store", dest="portfolio_precision",
+                      choices=ANALYSIS_OPTIONS.keys(), default="UTL",
+                      help="With \"-first " + PORTFOLIO + "\", only race " + \
+                           "solvers at least as precise as this one.");
+  parser.add_argument("-parallel", "--parallel", action="store_true",
+                      dest="parallel", default=False,
+                      help="Run the first and second analyses at the same " + \
+                           "time, in separate processes.");
+  parser.add_argument("-stats", "--stats", action="store", dest="stats",
+                      default=None,
+                      help="Write the time of each analysis stage, and " + \
+                           "counters such as graph sizes, as a JSON " + \
+                           "record to this file.");
   return(parser.parse_args(argList));
 #end: parseArguments
 
 """
-solve(): This is the main solver function (which should be called directly, if
-used from an import).  It calls all the other functions for a while and then
-exits.
+getCacheSolverName(): Get the name to cache a solver's results under.  A
+portfolio's results depend on which solvers race.
+@param args the parsed arguments
+@param solverName the solver (as given on the command line)
+@return the name for the cache
 """
-def solve(argList):
-  args = parseArguments(argList);
-  
-  clock = CSIClock();
-  print("Reading graph...");
-  G = read_graph(args.graph_filename, cfgOnly=True);
-  
-  clock.takeSplit();
-  print("Reading failure data...");
-  failureData = None;
-  if(args.json):
-    failureData = JSONFailureReport(G, expanduser(args.json));
-  elif(args.crash_nodes):
-    failureData = TextFailureReport(G, args.crash_nodes, args.yes, args.no);
-  else:
-    print >> stderr, ("ERROR: you must specify either JSON or command-line " + \
-                      "input data.  Use --help for more information.");
+def getCacheSolverName(args, solverName):
+  if(solverName == PORTFOLIO):
+    return(PORTFOLIO + ":" + args.portfolio + ":" + args.portfolio_precision);
+  return(solverName);
+#end: getCacheSolverName
+
+"""
+getResultOptions(): Get the analysis options that affect results (e.g., for
+keying cached results and checkpoints).
+@param args the parsed arguments
+@return the options (a dictionary)
+"""
+def getResultOptions(args):
+  return({"collapse" : args.collapse,
+          "intraprocedural" : args.intraprocedural,
+          "stackonly" : args.stackonly,
+          "query" : args.query});
+#end: getResultOptions
+
+"""
+readManifest(): Read the list of JSON failure reports from a batch manifest.
+@param manifestFile the manifest file
+@return the paths of the reports (relative paths are taken as relative to the
+        manifest)
+"""
+def readManifest(manifestFile):
+  manifestFile = expanduser(manifestFile);
+  reports = [];
+  with open(manifestFile, 'r') as openFile:
+    for line in openFile:
+      line = line.strip();
+      if(not line or line.startswith("#")):
+        continue;
+      reports.append(join(dirname(manifestFile), expanduser(line)));
+    #end for
+  #end with
+
+  if(not reports):
+    print >> stderr, ("ERROR: no failure reports in batch manifest '" + \
+                      manifestFile + "'");
     exit(1);
   #end if
+  return(reports);
+#end: readManifest
 
+"""
+analyzeReport(): Run the analysis (or analyses) for one failure report, and
+print its results.
+@param args the parsed arguments
+@param G the graph (which may be modified)
+@param failureData the failure report
+@param clock the clock for timing splits
+@param resultCache the cache of analysis results (or None)
+@param checkpointDir the directory of checkpoints (or None)
+"""
+def analyzeReport(args, G, failureData, clock, resultCache=None,
+                  checkpointDir=None):
+  startStage("preprocess");
   if(args.stackonly):
     print("Ignoring obsYes and obsNo data...");
     failureData.clearObsYesAndNo();
@@ -355,52 +1010,200 @@ def solve(argList):
 
     funcId = getFuncIdForCrashes(G, crashNodes);
     G = restrict_to_function(G, funcId);
+    countGraphStats("restrict", G);
   #end if
 
+  # (before the crash stack is fixed up below)
+  report = canonicalFailureReport(failureData.getCrashStack(),
+                                  failureData.getObsYes(),
+                                  failureData.getObsNo());
+
   # get (and fix up) failure data
   # NOTE: this could also modify the graph (G) as necessary for matching!
   crashStack = failureData.getCrashStack();
   cleanStackAndGraph(G, crashStack);
   obsYes = failureData.getObsYes();
   obsNo = failureData.getObsNo();
+  countGraphStats("clean", G);
+
+  # find the queried nodes (if any) before collapsing
+  allNodes = set(G.nodes());
+  queryNodes = resolveQuery(G, args.query) if args.query else None;
+
+  # with a previous result, only probe the nodes that may have changed
+  previousResult = None;
+  probeNodes = queryNodes;
+  if(args.previous_result):
+    (oldReport, previousResult, oldSolver, oldOptions) = \
+      readPreviousResult(args.previous_result);
+    checkPreviousResult(args, oldSolver, oldOptions);
+    if(args.previous_json):
+      oldData = JSONFailureReport(G, expanduser(args.previous_json));
+      oldReport = canonicalFailureReport(oldData.getCrashStack(),
+                                         oldData.getObsYes(),
+                                         oldData.getObsNo());
+    elif(oldReport == None):
+      print >> stderr, ("ERROR: previous result has no failure report; " + \
+                        "use -previous-json");
+      exit(1);
+    #end if
+    probeNodes = getReprobeNodes(oldReport, report, previousResult, allNodes);
+  #end if
 
   # collapse as much as possible into basic blocks
-  uncollapsedG = G;
+  # (the lines of collapsed nodes come from the line table, rather than from a
+  # copy of the uncollapsed graph)
   firstG = G;
   secondG = G;
+  firstMembers = {};
+  secondMembers = {};
+  lineTable = None;
+  clock.takeSplit("prepare report", show=False);
+  recordMemory("prepare report");
   if(args.collapse != "none"):
     print("Collapsing basic blocks (excluding failure report nodes)...");
-    if(args.result_style in ("csiclipse", "standard")):
-      # copy the old graph, but only if we'll actually use it later
-      uncollapsedG = G.copy();
-    #end if
   if(args.collapse == "both"):
-    collapse_BB_nodes(G, exclude=failureData.getAllNodesInFailureReport());
+    (G, firstMembers, lineTable) = \
+      collapse_BB_nodes(G, exclude=failureData.getAllNodesInFailureReport());
+    secondMembers = firstMembers;
   elif(args.collapse == "first"):
     firstG = G.copy();
-    collapse_BB_nodes(firstG, exclude=failureData.getAllNodesInFailureReport());
+    firstMembers = collapse_BB_nodes(firstG,
+                     exclude=failureData.getAllNodesInFailureReport())[1];
   elif(args.collapse == "second"):
     secondG = G.copy();
-    collapse_BB_nodes(secondG, exclude=failureData.getAllNodesInFailureReport());
+    secondMembers = collapse_BB_nodes(secondG,
+                      exclude=failureData.getAllNodesInFailureReport())[1];
+  #end if
+  if(args.collapse != "none"):
+    countGraphStats("collapse", G if args.collapse == "both" else \
+                                (firstG if args.collapse == "first" \
+                                        else secondG));
   #end if
+  stopStage("preprocess");
 
 
-  clock.takeSplit();
-  print("Starting " + args.first + " version...");
-  print("Exporting graph as constraints...");
-  firstSolver = ANALYSIS_OPTIONS[args.first](firstG);
-  firstResult = getResult(firstSolver, firstG, crashStack, obsYes, obsNo);
+  clock.takeSplit("collapse");
+  recordMemory("collapse");
+  firstName = args.first;
+  firstResult = None;
+  secondResult = None;
+  if(resultCache != None):
+    entry = resultCache.lookupEntry(getCacheSolverName(args, args.first),
+                                    crashStack, obsYes, obsNo);
+    if(entry != None):
+      (firstResult, details) = entry;
+      firstName = details.get("winner", firstName);
+    #end if
+    if(args.second != "None"):
+      secondResult = resultCache.lookup(getCacheSolverName(args, args.second),
+                                        crashStack, obsYes, obsNo);
+      if(secondResult != None):
+        print("Using cached " + args.second + " result...");
+      #end if
+    #end if
+  #end if
+  firstCached = (firstResult != None);
+  secondCached = (secondResult != None);
+
+  firstPartial = False;
+  secondPartial = False;
+  analysisSpan = "first analysis";
+
+  # get the monitors for a solver's probes (or None), starting its time budget
+  # (a solver's checkpoints depend on whether its graph is collapsed)
+  firstCollapsed = args.collapse in ("both", "first");
+  secondCollapsed = args.collapse in ("both", "second");
+  functionInfo = getFunctionInfo(G) if args.slow_probes != None else {};
+  # (probe latencies are reported by stage, as both may use the same solver)
+  def getMonitor(solverName, collapsed=firstCollapsed, stage="first"):
+    monitors = [];
+    if(checkpointDir != None):
+      monitors.append(checkpointDir.getCheckpoint(solverName + \
+                                                  ("" if collapsed \
+                                                      else ":uncollapsed"),
+                                                  crashStack, obsYes, obsNo));
+    #end if
+    if(args.time_budget != None or args.probe_timeout != None):
+      monitors.append(ProbeBudget(args.time_budget, args.probe_timeout));
+    #end if
+    if(args.memory_limit != None):
+      monitors.append(ProbeMemoryLimit());
+    #end if
+    if(args.slow_probes != None):
+      monitors.append(ProbeLatency(stage + ":" + solverName, functionInfo,
+                                   args.slow_probes));
+    #end if
+    if(not monitors):
+      return(None);
+    return(monitors[0] if len(monitors) == 1 else ProbeMonitors(monitors));
+  #end: getMonitor
+
+  if(firstCached):
+    print("Using cached " + args.first + " result...");
+    if(args.first == PORTFOLIO):
+      print("Portfolio winner: " + firstName);
+      addReport("portfolio", {"winner" : firstName, "partial" : False,
+                              "cached" : True});
+    #end if
+  elif(probeNodes != None and not probeNodes):
+    # nothing to re-probe
+    firstResult = previousResult;
+  elif(args.first == PORTFOLIO):
+    (firstName, (firstResult, firstPartial)) = \
+      getPortfolioResult(args, firstG, firstMembers, crashStack, obsYes, obsNo,
+                         probeNodes, getMonitor);
+  elif(args.parallel and args.second != "None" and not secondCached):
+    monitors = (getMonitor(args.first),
+                getMonitor(args.second, secondCollapsed, "second"));
+    analysisSpan = "parallel analyses";
+    ((firstResult, firstPartial), (secondResult, secondPartial)) = \
+      getResultsInParallel(args, firstG, secondG, firstMembers, secondMembers,
+                           crashStack, obsYes, obsNo, probeNodes, monitors);
+  else:
+    firstMonitor = getMonitor(args.first);
+    firstSolver = startSolver(args.first, firstG);
+    firstResult = getResult(firstSolver, firstG, firstMembers, crashStack,
+                            obsYes, obsNo, probeNodes, firstMonitor);
+    firstPartial = (firstMonitor != None and firstMonitor.isPartial());
+  #end if
   
-  if(args.second != "None"):
-    clock.takeSplit();
-    print("Starting " + args.second + " version...");
-    print("Exporting graph as constraints...");
-    secondSolver = ANALYSIS_OPTIONS[args.second](secondG);
-    secondResult = getResult(secondSolver, secondG, crashStack, obsYes, obsNo);
+  # (the second analysis has already run if it ran in parallel)
+  if(args.second != "None" and secondResult == None):
+    clock.takeSplit(analysisSpan);
+    recordMemory(analysisSpan);
+    analysisSpan = "second analysis";
+    secondMonitor = getMonitor(args.second, secondCollapsed, "second");
+    secondSolver = startSolver(args.second, secondG);
+    secondResult = getResult(secondSolver, secondG, secondMembers, crashStack,
+                             obsYes, obsNo, probeNodes, secondMonitor);
+    secondPartial = (secondMonitor != None and secondMonitor.isPartial());
+  #end if
+
+  # (merging leaves complete results, e.g. cached ones, as they are)
+  if(previousResult != None):
+    firstResult = mergeResults(previousResult, firstResult);
   #end if
   
-  clock.takeSplit();
-  if(args.second != "None" and firstResult != secondResult):
+  # (partial results are not worth keeping)
+  if(resultCache != None):
+    if(not firstCached and not firstPartial):
+      resultCache.store(getCacheSolverName(args, args.first), crashStack,
+                        obsYes, obsNo, firstResult,
+                        {"winner" : firstName} \
+                        if args.first == PORTFOLIO else {});
+    #end if
+    if(args.second != "None" and not secondCached and not secondPartial):
+      resultCache.store(getCacheSolverName(args, args.second), crashStack,
+                        obsYes, obsNo, secondResult);
+    #end if
+  #end if
+
+  clock.takeSplit(analysisSpan);
+  recordMemory(analysisSpan);
+  if(args.second != "None" and (firstPartial or secondPartial)):
+    print >> stderr, ("WARNING: not comparing partial results");
+  elif(args.second != "None" and firstResult != secondResult):
     if(args.comparator == "eq"):
       compareOK = compareResults(firstResult, secondResult, True);
     elif(args.comparator == "gt"):
@@ -411,7 +1214,7 @@ def solve(argList):
 
     if(not compareOK):
       print >> stderr, ("ERROR: first and second results don't match!");
-      print >> stderr, (args.first + ":");
+      print >> stderr, (firstName + ":");
       printResult(firstResult, True, stderr);
       print >> stderr, (args.second + ":");
       printResult(secondResult, True, stderr);
@@ -419,18 +1222,193 @@ def solve(argList):
     #end if
   #end if
   
+  if(args.save_result):
+    saveResult(args.save_result, report, firstResult, firstName,
+               getResultOptions(args));
+  #end if
+
+  unqueried = None;
+  if(queryNodes != None):
+    unqueried = allNodes.difference(*firstResult);
+  #end if
+
   if(not args.result_style or args.result_style == "none"):
     pass;
   elif(args.result_style in ("compact", "full")):
-    printResult(firstResult, (args.result_style == "full"));
+    printResult(firstResult, (args.result_style == "full"), unqueried=unqueried,
+                partial=firstPartial);
   elif(args.result_style in ("csiclipse", "standard")):
-    printLinesResult(firstResult, uncollapsedG, \
-                     (args.result_style == "csiclipse"));
+    printLinesResult(firstResult, G, (args.result_style == "csiclipse"),
+                     unqueried=unqueried, partial=firstPartial,
+                     lineTable=lineTable);
+  elif(args.result_style in STREAMED_RESULT_STYLES):
+    writeResult = writeJsonResult if args.result_style == "json" \
+                                  else writeBinaryResult;
+    if(args.result_file):
+      with open(expanduser(args.result_file), 'wb') as outFile:
+        writeResult(firstResult, G, outFile, unqueried, firstPartial,
+                    lineTable);
+      #end with
+    else:
+      print(MARKER_FOR_RESULTS_START);
+      writeResult(firstResult, G, stdout, unqueried, firstPartial, lineTable);
+    #end if
   else:
     print >> stderr, ("ERROR: invalid result style specified: '" + \
                       args.result_style + "'");
     exit(1);
   #end if
+  clock.takeSplit("results", show=False);
+  recordMemory("results");
+#end: analyzeReport
+
+"""
+analyzeBatch(): Analyze each failure report of a batch manifest against the
+graph.  A report whose analysis fails gets a MARKER_FOR_REPORT_FAILED line
+(and an error message), and the remaining reports are still analyzed.  Each
+report's spans, counters, and reports are recorded in a group named by its
+path.
+@param args the parsed arguments
+@param G the graph (which is left unchanged)
+@param clock the clock for timing splits
+@param resultCache the cache of analysis results (or None)
+@param checkpointDir the directory of checkpoints (or None)
+@return the number of reports whose analysis failed
+"""
+def analyzeBatch(args, G, clock, resultCache=None, checkpointDir=None):
+  # collapsing both analyses' graph changes it throughout, so each report then
+  # needs its own copy; otherwise, only the crash node added for each report
+  # (see cleanStackAndGraph()) is removed again afterwards
+  copyGraph = (args.collapse == "both" and not args.intraprocedural);
+  graphNodes = set(G.nodes_iter(False));
+  failed = 0;
+  for reportFile in readManifest(args.batch):
+    print(MARKER_FOR_REPORT_START + reportFile);
+    reportG = G.copy() if copyGraph else G;
+    setStatsGroup(reportFile);
+    try:
+      print("Reading failure data...");
+      startStage("load");
+      failureData = JSONFailureReport(reportG, reportFile);
+      stopStage("load");
+      clock.takeSplit("read failure data", show=False);
+      recordMemory("read failure data");
+      analyzeReport(args, reportG, failureData, clock, resultCache,
+                    checkpointDir);
+    except (Exception, SystemExit) as e:
+      # (errors are usually reported before exit(); other exceptions are not)
+      message = str(e) if not isinstance(e, SystemExit) \
+                       else "exit status " + str(e.code);
+      print >> stderr, ("ERROR: analysis of report '" + reportFile + \
+                        "' failed: " + message);
+      stdout.flush();
+      print(MARKER_FOR_REPORT_FAILED + reportFile + ": " + message);
+      failed += 1;
+    finally:
+      setStatsGroup(None);
+      if(not copyGraph):
+        G.remove_nodes_from([n for n in G.nodes_iter(False) \
+                               if n not in graphNodes]);
+      #end if
+    #end try
+  #end for
+  countStat("batch.failed reports", failed);
+  return(failed);
+#end: analyzeBatch
+
+"""
+solve(): This is the main solver function (which should be called directly, if
+used from an import).  It calls all the other functions for a while and then
+exits.
+In batch mode, the graph is read once, and each report is analyzed against it
+(with its own solvers); see analyzeBatch().
+"""
+def solve(argList):
+  args = parseArguments(argList);
+  if(args.batch and (args.save_result or args.previous_result)):
+    print >> stderr, ("ERROR: -save-result and -previous-result cannot be " + \
+                      "used with -batch");
+    exit(1);
+  elif(args.query and args.previous_result):
+    print >> stderr, ("ERROR: -query cannot be used with -previous-result");
+    exit(1);
+  elif(args.second != "None" and args.previous_result):
+    # (the second analysis would only re-use the first one's previous result)
+    print >> stderr, ("ERROR: -second cannot be used with -previous-result");
+    exit(1);
+  elif(args.result_style == "binary" and not args.result_file):
+    print >> stderr, ("ERROR: binary results need a -result-file");
+    exit(1);
+  elif(args.batch and args.result_file):
+    print >> stderr, ("ERROR: -result-file cannot be used with -batch");
+    exit(1);
+  #end if
+  
+  startTime = time();
+  setMemoryLimit(args.memory_limit);
+  if(args.profile):
+    stages = PROFILE_STAGES if args.profile == "all" \
+                            else [stage.strip() \
+                                  for stage in args.profile.split(",")];
+    setProfiler(StageProfiler(stages, expanduser(args.profile_output)));
+  #end if
+  clock = CSIClock();
+  print("Reading graph...");
+  startStage("load");
+  G = read_graph(args.graph_filename, cfgOnly=True);
+  stopStage("load");
+  countGraphStats("read graph", G);
+  
+  options = getResultOptions(args);
+  resultCache = None;
+  if(args.result_cache):
+    resultCache = ResultCache(expanduser(args.result_cache),
+                              args.graph_filename, options);
+  #end if
+  checkpointDir = None;
+  if(args.checkpoint_dir):
+    checkpointDir = CheckpointDirectory(expanduser(args.checkpoint_dir),
+                                        args.graph_filename, options,
+                                        args.checkpoint_interval);
+  #end if
+
+  clock.takeSplit("read graph");
+  recordMemory("read graph");
+  failed = 0;
+  if(args.batch):
+    failed = analyzeBatch(args, G, clock, resultCache, checkpointDir);
+  else:
+    print("Reading failure data...");
+    startStage("load");
+    failureData = None;
+    if(args.json):
+      failureData = JSONFailureReport(G, expanduser(args.json));
+    elif(args.crash_nodes):
+      failureData = TextFailureReport(G, args.crash_nodes, args.yes, args.no);
+    else:
+      print >> stderr, ("ERROR: you must specify either JSON or " + \
+                        "command-line input data.  Use --help for more " + \
+                        "information.");
+      exit(1);
+    #end if
+    stopStage("load");
+    clock.takeSplit("read failure data", show=False);
+    recordMemory("read failure data");
+
+    analyzeReport(args, G, failureData, clock, resultCache, checkpointDir);
+  #end if
+
+  writeProfile();
+  if(args.stats):
+    writeStats(expanduser(args.stats), {"command" : argList,
+                                        "total" : round(time() - startTime,
+                                                        6)});
+  #end if
+  if(failed):
+    print >> stderr, ("ERROR: the analysis of " + str(failed) + \
+                      " failure report(s) failed");
+    exit(1);
+  #end if
 #end: solve
 
 def main():
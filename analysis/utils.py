@@ -1,5 +1,8 @@
 from csilibs.graphlibs import function_id
 
+from hashlib import sha1
+import json
+
 """
 findGraphEntry(): Search through the graph for its "entry" node.  If the graph
 is intraprocedural, this is the entry of that function.  If the graph is
@@ -74,3 +77,36 @@ def findEntryForNode(G, searchNode):
   #end if
   return theEntry;
 #end: findEntryForNode
+
+"""
+canonicalFailureReport(): Put failure report data into a canonical (sorted,
+JSON-serializable) form, so that equivalent reports compare (and hash) equal
+regardless of set ordering or string types.
+@param crashStack the crashing stack
+            => [({G.nodes}, {G.nodes}), ..., ({G.nodes}, None)]
+@param obsYes the obsYes observations
+            => {[{G.nodes}]}
+@param obsNo the obsNo observations
+            => {{G.nodes}}
+@return a (crashstack, obsYes, obsNo) tuple of nested sorted lists
+"""
+def canonicalFailureReport(crashStack, obsYes, obsNo):
+  canonStack = [[sorted(callNodes), \
+                 (sorted(entryNodes) if entryNodes != None else None)] \
+                for (callNodes, entryNodes) in crashStack];
+  canonYes = sorted([[sorted(group) for group in vector] for vector in obsYes]);
+  canonNo = sorted([sorted(possibleNo) for possibleNo in obsNo]);
+  return(canonStack, canonYes, canonNo);
+#end: canonicalFailureReport
+
+"""
+failureReportDigest(): Compute a content hash of the failure report data.
+@param crashStack the crashing stack
+@param obsYes the obsYes observations
+@param obsNo the obsNo observations
+@return the hex digest
+"""
+def failureReportDigest(crashStack, obsYes, obsNo):
+  canonical = canonicalFailureReport(crashStack, obsYes, obsNo);
+  return(sha1(json.dumps(canonical, sort_keys=True)).hexdigest());
+#end: failureReportDigest